@@ -5,197 +5,324 @@ Provides REST API access to the learning system data and real-time updates.
 """
 
 import asyncio
+import csv
+import hashlib
+import io
 import json
 import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from flask import Blueprint, jsonify, request
+from typing import Dict, Any, List, Optional, Callable, Hashable
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 import websockets
 from websockets.server import WebSocketServerProtocol
 
-from agent_learning import AgentLearningSystem
 from agent_learning.evolution_engine import EvolutionEngine
-from api.websocket_manager import get_websocket_manager
+from api.websocket_manager import get_websocket_manager, SubmissionQueueFull
+from api.shared_metrics import get_shared_metrics
+from api.learning_ingest import LearningIngestService, IngestQueueFull
+from api.status_snapshot import StatusSnapshot
+from api.learning_store import attach_sqlite_store
+from api.learning_retention import LearningRollups, LearningRetentionJob
+from api.learning_index import (
+    IndexedLearningSystem, LearningAnalytics, TimelineIndex, ErrorPatternIndex, LearningColumns, StoreColumns
+)
 from claude_langgraph_bridge import get_claude_bridge
 
 logger = logging.getLogger(__name__)
 
+class VersionedResponseCache:
+    """
+    Serialized response bodies cached per data version.
+
+    A payload is rebuilt only when the version of the data behind it
+    changes. ETags are derived from the content (excluding the generation
+    timestamp), so If-None-Match gets a 304 for as long as the content
+    stays the same, even across rebuilds.
+    """
+    
+    def __init__(self):
+        self.entries: Dict[str, tuple] = {}  # name -> (version, body, etag)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "rebuilds": 0, "not_modified": 0}
+    
+    def respond(self, name: str, version: Hashable, build: Callable[[], Dict[str, Any]]) -> Response:
+        """Serve the cached body for this version, rebuilding it if stale"""
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != version:
+            payload = build()
+            etag = hashlib.blake2b(json.dumps(payload).encode(), digest_size=16).hexdigest()
+            if entry is not None and entry[2] == etag:
+                entry = (version, entry[1], etag)
+            else:
+                payload["timestamp"] = datetime.now().isoformat()
+                entry = (version, json.dumps(payload).encode(), etag)
+            with self.lock:
+                self.entries[name] = entry
+                self.stats["rebuilds"] += 1
+        else:
+            with self.lock:
+                self.stats["hits"] += 1
+        
+        _, body, etag = entry
+        if request.if_none_match.contains(etag):
+            with self.lock:
+                self.stats["not_modified"] += 1
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response
+
 # Create Flask blueprint
 learning_api = Blueprint('learning_api', __name__, url_prefix='/api/learning')
 
 # Global instances
-learning_system = AgentLearningSystem()
+learning_system = IndexedLearningSystem(
+    resync_interval=float(os.environ.get("LEARNING_RESYNC_INTERVAL_SECONDS", "300"))
+)
 evolution_engine = EvolutionEngine()
 
+# Storage backend: "memory" (default) or "sqlite" for a durable, shared store
+learning_store = None
+if os.environ.get("LEARNING_STORE", "memory") == "sqlite":
+    learning_store = attach_sqlite_store(learning_system.db, os.environ.get("LEARNING_DB_PATH", "learning.db"))
+
+# Retention (opt-in): learnings older than LEARNING_RETENTION_DAYS are rolled
+# up into daily, then weekly, aggregates that the indexes read transparently
+retention_job = None
+if os.environ.get("LEARNING_RETENTION_DAYS"):
+    learning_system.rollups = LearningRollups(learning_store)
+    retention_job = LearningRetentionJob(
+        learning_system,
+        learning_system.rollups,
+        raw_retention=timedelta(days=float(os.environ["LEARNING_RETENTION_DAYS"])),
+        daily_retention=timedelta(days=float(os.environ.get("LEARNING_DAILY_ROLLUP_DAYS", "180"))),
+        interval=float(os.environ.get("LEARNING_COMPACTION_INTERVAL_SECONDS", "3600"))
+    )
+    retention_job.start()
+
+# The evolution engine has no change counter, so its reports are
+# revalidated after this many seconds; unchanged content still gets a 304
+EVOLUTION_REVALIDATE_SECONDS = 5.0
+response_cache = VersionedResponseCache()
+
+# Incrementally maintained read models
+learning_analytics = learning_system.add_index(LearningAnalytics())
+# With SQLite the indexes on disk serve time-ordered reads and range
+# histograms, so memory does not grow with the number of learnings
+learning_timeline = learning_store.timeline if learning_store else learning_system.add_index(TimelineIndex())
+error_pattern_index = learning_system.add_index(ErrorPatternIndex())
+learning_columns = StoreColumns(learning_store) if learning_store else learning_system.add_index(LearningColumns())
+# Indexes are resynced with the database off the request path
+learning_system.start_resync()
+
 @learning_api.route('/error-patterns', methods=['GET'])
 def get_error_patterns():
     """Get all learned error patterns"""
     try:
-        patterns = []
-        
-        for error_id, learning in learning_system.db.error_learnings.items():
-            pattern = {
-                "pattern": learning.error_type,
-                "occurrences": 1,  # Simplified - in real impl, count occurrences
-                "lastSeen": learning.timestamp.isoformat(),
-                "rootCause": learning.root_cause.get("description", "Unknown"),
-                "prevention": learning.prevention_rule.get("prevention_strategy", {}).get("name", "Unknown"),
-                "effectiveness": (learning.prevented_count / max(learning.prevented_count + 1, 1)) * 100
-            }
-            patterns.append(pattern)
-        
-        # Sort by most recent
-        patterns.sort(key=lambda x: x["lastSeen"], reverse=True)
-        
-        return jsonify({
-            "patterns": patterns,
-            "total": len(patterns),
-            "timestamp": datetime.now().isoformat()
-        })
+        return response_cache.respond("error-patterns", learning_system.version, _build_error_patterns)
         
     except Exception as e:
         logger.error(f"Failed to get error patterns: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _build_error_patterns() -> Dict[str, Any]:
+    """Error patterns payload, one row per error fingerprint"""
+    patterns = error_pattern_index.patterns()
+    
+    return {
+        "patterns": patterns,
+        "total": len(patterns),
+        # Counted from the same groups as the patterns, so compacted learnings are included
+        "total_occurrences": sum(pattern["occurrences"] for pattern in patterns)
+    }
+
 @learning_api.route('/success-patterns', methods=['GET'])
 def get_success_patterns():
     """Get all discovered success patterns"""
     try:
-        patterns = []
-        
-        for pattern_id, pattern in learning_system.db.success_patterns.items():
-            success_pattern = {
-                "pattern": pattern.pattern_name,
-                "reliability": pattern.success_rate,
-                "conditions": pattern.conditions,
-                "recommendation": f"Use {pattern.pattern_name} strategy for optimal results"
-            }
-            patterns.append(success_pattern)
-        
-        # Sort by reliability
-        patterns.sort(key=lambda x: x["reliability"], reverse=True)
-        
-        return jsonify({
-            "patterns": patterns,
-            "total": len(patterns),
-            "timestamp": datetime.now().isoformat()
-        })
+        return response_cache.respond("success-patterns", _success_patterns_version(), _build_success_patterns)
         
     except Exception as e:
         logger.error(f"Failed to get success patterns: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _success_patterns_version() -> str:
+    """
+    Digest of the fields the payload is built from. Success patterns are
+    updated in place (success rates, conditions) without a version bump, so
+    their count alone cannot tell a stale body.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for pattern_id, pattern in learning_system.db.success_patterns.items():
+        digest.update(json.dumps([pattern_id, pattern.pattern_name, pattern.success_rate, pattern.conditions],
+                                 sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def _build_success_patterns() -> Dict[str, Any]:
+    """Success patterns payload"""
+    patterns = []
+    
+    for pattern_id, pattern in learning_system.db.success_patterns.items():
+        success_pattern = {
+            "pattern": pattern.pattern_name,
+            "reliability": pattern.success_rate,
+            "conditions": pattern.conditions,
+            "recommendation": f"Use {pattern.pattern_name} strategy for optimal results"
+        }
+        patterns.append(success_pattern)
+    
+    # Sort by reliability
+    patterns.sort(key=lambda x: x["reliability"], reverse=True)
+    
+    return {
+        "patterns": patterns,
+        "total": len(patterns)
+    }
+
 @learning_api.route('/evolution-metrics', methods=['GET'])
 def get_evolution_metrics():
     """Get evolution and learning metrics"""
     try:
-        # Get learning stats
-        learning_stats = learning_system.get_learning_stats()
-        
-        # Get evolution report
-        evolution_report = evolution_engine.get_evolution_report()
-        
-        # Calculate knowledge growth (simplified)
-        knowledge_growth = [
-            learning_stats.get("errors_learned", 0),
-            learning_stats.get("success_patterns", 0),
-            evolution_report.get("total_evolutions", 0)
-        ]
-        
-        # Get agent improvements
-        agent_improvements = []
-        for agent, evolutions in evolution_report.get("evolutions_by_agent", {}).items():
-            agent_improvements.append({
-                "agent": agent,
-                "improvement": min(evolutions * 10, 100)  # Simplified calculation
-            })
-        
-        metrics = {
-            "errorsLearned": learning_stats.get("errors_learned", 0),
-            "preventionRate": learning_stats.get("prevention_rate", 0.0),
-            "knowledgeGrowth": knowledge_growth,
-            "agentImprovement": agent_improvements
-        }
-        
-        return jsonify({
-            "metrics": metrics,
-            "timestamp": datetime.now().isoformat()
-        })
+        version = (learning_system.version, _evolution_revalidation_bucket())
+        return response_cache.respond("evolution-metrics", version, _build_evolution_metrics)
         
     except Exception as e:
         logger.error(f"Failed to get evolution metrics: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _build_evolution_metrics() -> Dict[str, Any]:
+    """Evolution metrics payload"""
+    # Get learning stats
+    learning_stats = learning_system.get_learning_stats()
+    
+    # Get evolution report
+    evolution_report = evolution_engine.get_evolution_report()
+    
+    # Calculate knowledge growth (simplified)
+    knowledge_growth = [
+        learning_stats.get("errors_learned", 0),
+        learning_stats.get("success_patterns", 0),
+        evolution_report.get("total_evolutions", 0)
+    ]
+    
+    # Get agent improvements
+    agent_improvements = []
+    for agent, evolutions in evolution_report.get("evolutions_by_agent", {}).items():
+        agent_improvements.append({
+            "agent": agent,
+            "improvement": min(evolutions * 10, 100)  # Simplified calculation
+        })
+    
+    metrics = {
+        "errorsLearned": learning_stats.get("errors_learned", 0),
+        "preventionRate": learning_stats.get("prevention_rate", 0.0),
+        "knowledgeGrowth": knowledge_growth,
+        "agentImprovement": agent_improvements
+    }
+    
+    return {
+        "metrics": metrics
+    }
+
 @learning_api.route('/recent-evolutions', methods=['GET'])
 def get_recent_evolutions():
     """Get recent agent evolutions"""
     try:
-        evolution_report = evolution_engine.get_evolution_report()
-        recent_evolutions = evolution_report.get("recent_evolutions", [])
-        
-        # Format for frontend
-        formatted_evolutions = []
-        for evolution in recent_evolutions:
-            formatted_evolutions.append({
-                "agent": evolution.get("agent", "unknown"),
-                "type": evolution.get("type", "unknown"),
-                "improvement": evolution.get("improvement", 0),
-                "timestamp": evolution.get("timestamp", datetime.now().isoformat())
-            })
-        
-        return jsonify({
-            "evolutions": formatted_evolutions,
-            "total": len(formatted_evolutions),
-            "timestamp": datetime.now().isoformat()
-        })
+        return response_cache.respond("recent-evolutions", _evolution_revalidation_bucket(), _build_recent_evolutions)
         
     except Exception as e:
         logger.error(f"Failed to get recent evolutions: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _build_recent_evolutions() -> Dict[str, Any]:
+    """Recent evolutions payload"""
+    evolution_report = evolution_engine.get_evolution_report()
+    recent_evolutions = evolution_report.get("recent_evolutions", [])
+    
+    # Format for frontend
+    formatted_evolutions = []
+    for evolution in recent_evolutions:
+        formatted_evolutions.append({
+            "agent": evolution.get("agent", "unknown"),
+            "type": evolution.get("type", "unknown"),
+            "improvement": evolution.get("improvement", 0),
+            "timestamp": evolution.get("timestamp", datetime.now().isoformat())
+        })
+    
+    return {
+        "evolutions": formatted_evolutions,
+        "total": len(formatted_evolutions)
+    }
+
+def _evolution_revalidation_bucket() -> int:
+    return int(time.monotonic() // EVOLUTION_REVALIDATE_SECONDS)
+
+# Slow status sources, gathered concurrently in the background
+STATUS_COMPONENT_TIMEOUT = float(os.environ.get("LEARNING_STATUS_COMPONENT_TIMEOUT", "2"))
+system_status_snapshot = StatusSnapshot(
+    {
+        "learning_system": lambda: learning_system.get_learning_stats(),
+        # Collected on the manager's own event loop, never from this thread
+        "websocket_manager": lambda: get_websocket_manager().get_manager_status_threadsafe(STATUS_COMPONENT_TIMEOUT),
+        "claude_bridge": lambda: get_claude_bridge().get_bridge_status(),
+        "evolution_engine": lambda: evolution_engine.get_evolution_report()
+    },
+    refresh_interval=float(os.environ.get("LEARNING_STATUS_REFRESH_SECONDS", "5")),
+    component_timeout=STATUS_COMPONENT_TIMEOUT
+)
+
 @learning_api.route('/system-status', methods=['GET'])
 def get_system_status():
     """Get overall learning system status"""
     try:
-        # Get learning system stats
-        learning_stats = learning_system.get_learning_stats()
-        
-        # Get WebSocket manager status
-        websocket_manager = get_websocket_manager()
-        ws_status = websocket_manager.get_manager_status()
+        # Served from the background snapshot; each component reports its age
+        components = system_status_snapshot.get()
+        learning_stats = components["learning_system"]["data"]
+        ws_status = components["websocket_manager"]["data"]
+        bridge_status = components["claude_bridge"]["data"]
+        evolution_report = components["evolution_engine"]["data"]
         
-        # Get bridge status
-        bridge = get_claude_bridge()
-        bridge_status = bridge.get_bridge_status()
-        
-        # Get evolution engine status
-        evolution_report = evolution_engine.get_evolution_report()
+        def freshness(name: str) -> Dict[str, Any]:
+            component = components[name]
+            return {"age_seconds": component["age_seconds"], "stale": component["stale"], "error": component["error"]}
         
         status = {
             "learning_system": {
                 "active": True,
                 "errors_learned": learning_stats.get("errors_learned", 0),
                 "prevention_rate": learning_stats.get("prevention_rate", 0.0),
-                "knowledge_base_size": learning_stats.get("errors_learned", 0) + learning_stats.get("success_patterns", 0)
+                "knowledge_base_size": learning_stats.get("errors_learned", 0) + learning_stats.get("success_patterns", 0),
+                **freshness("learning_system")
             },
             "websocket_manager": {
                 "active": ws_status.get("server_running", False),
                 "connections": ws_status.get("active_connections", 0),
-                "patterns_learned": ws_status.get("failure_patterns", 0)
+                "patterns_learned": ws_status.get("failure_patterns", 0),
+                **freshness("websocket_manager")
             },
             "claude_bridge": {
                 "active": True,
                 "active_tasks": bridge_status.get("active_tasks", 0),
-                "success_rate": self._calculate_bridge_success_rate(bridge_status),
-                "learning_applications": bridge_status.get("performance_metrics", {}).get("learning_applications", 0)
+                "success_rate": _calculate_bridge_success_rate(bridge_status),
+                "learning_applications": bridge_status.get("performance_metrics", {}).get("learning_applications", 0),
+                **freshness("claude_bridge")
             },
             "evolution_engine": {
                 "active": True,
                 "total_evolutions": evolution_report.get("total_evolutions", 0),
                 "average_improvement": evolution_report.get("average_improvement", 0.0),
-                "agents_evolved": len(evolution_report.get("agent_versions", {}))
+                "agents_evolved": len(evolution_report.get("agent_versions", {})),
+                **freshness("evolution_engine")
             },
-            "overall_health": "healthy"  # Would be calculated based on various factors
+            "ingest": learning_ingest.get_stats(),
+            "retention": retention_job.get_stats() if retention_job else None,
+            "overall_health": "degraded" if any(c["stale"] for c in components.values()) else "healthy",
+            # Totals across all worker processes, read from shared memory
+            "cluster": get_shared_metrics().snapshot() if get_shared_metrics() else None
         }
         
         return jsonify({
@@ -218,6 +345,32 @@ def _calculate_bridge_success_rate(bridge_status: Dict[str, Any]) -> float:
     
     return successful / total
 
+def _injection_context(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Error context for one injected learning scenario"""
+    scenario_type = data['scenario_type']
+    description = data.get('description', f'Manual injection: {scenario_type}')
+    
+    # Create a mock error for learning
+    mock_error = Exception(f"Injected learning scenario: {scenario_type}")
+    
+    return {
+        "error": mock_error,
+        "task": {
+            "type": "manual_injection",
+            "scenario": scenario_type,
+            "description": description
+        },
+        "agent_name": "learning_api",
+        "timestamp": datetime.now(),
+        "context": {"manual_injection": True}
+    }
+
+def _ingest_backpressure_response(e: IngestQueueFull):
+    """429 telling the client to retry once the ingest queue drains"""
+    response = jsonify({"error": str(e), "ingest": learning_ingest.get_stats()})
+    response.headers["Retry-After"] = "1"
+    return response, 429
+
 @learning_api.route('/inject-learning', methods=['POST'])
 def inject_learning():
     """Manually inject a learning scenario (for testing)"""
@@ -227,87 +380,108 @@ def inject_learning():
         if not data or 'scenario_type' not in data:
             return jsonify({"error": "scenario_type required"}), 400
         
-        scenario_type = data['scenario_type']
-        description = data.get('description', f'Manual injection: {scenario_type}')
+        # Process through learning system on the ingest event loop
+        try:
+            learning_ingest.submit(_injection_context(data))
+        except IngestQueueFull as e:
+            return _ingest_backpressure_response(e)
         
-        # Create a mock error for learning
-        mock_error = Exception(f"Injected learning scenario: {scenario_type}")
+        return jsonify({
+            "success": True,
+            "message": f"Learning scenario '{data['scenario_type']}' injected",
+            "timestamp": datetime.now().isoformat()
+        })
         
-        error_context = {
-            "error": mock_error,
-            "task": {
-                "type": "manual_injection",
-                "scenario": scenario_type,
-                "description": description
-            },
-            "agent_name": "learning_api",
-            "timestamp": datetime.now(),
-            "context": {"manual_injection": True}
-        }
+    except Exception as e:
+        logger.error(f"Failed to inject learning: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@learning_api.route('/inject-learning/batch', methods=['POST'])
+def inject_learning_batch():
+    """Inject many learning scenarios in one request"""
+    try:
+        data = request.get_json()
+        scenarios = data.get('scenarios') if isinstance(data, dict) else None
         
-        # Process through learning system
-        asyncio.create_task(_process_injected_learning(error_context))
+        if not isinstance(scenarios, list) or not scenarios:
+            return jsonify({"error": "scenarios list required"}), 400
+        if len(scenarios) > MAX_INJECTION_BATCH:
+            return jsonify({"error": f"At most {MAX_INJECTION_BATCH} scenarios per batch"}), 400
+        if not all(isinstance(scenario, dict) and 'scenario_type' in scenario for scenario in scenarios):
+            return jsonify({"error": "scenario_type required for every scenario"}), 400
+        
+        # The batch is queued all-or-nothing
+        try:
+            learning_ingest.submit_many([_injection_context(scenario) for scenario in scenarios])
+        except IngestQueueFull as e:
+            return _ingest_backpressure_response(e)
         
         return jsonify({
             "success": True,
-            "message": f"Learning scenario '{scenario_type}' injected",
+            "accepted": len(scenarios),
+            "message": f"{len(scenarios)} learning scenarios injected",
             "timestamp": datetime.now().isoformat()
         })
         
     except Exception as e:
-        logger.error(f"Failed to inject learning: {e}")
+        logger.error(f"Failed to inject learning batch: {e}")
         return jsonify({"error": str(e)}), 500
 
 async def _process_injected_learning(error_context: Dict[str, Any]):
-    """Process injected learning scenario"""
+    """Process injected learning scenario; failures propagate so the ingest service logs and counts them"""
+    learning = await learning_system.capture_error(error_context)
+    shared_metrics = get_shared_metrics()
+    if shared_metrics:
+        shared_metrics.increment("learnings_captured")
+    logger.info(f"Processed injected learning: {learning.get('error_id', 'unknown')}")
+    
+    # Broadcast to WebSocket clients on the manager's own event loop
     try:
-        learning = await learning_system.capture_error(error_context)
-        logger.info(f"Processed injected learning: {learning.get('error_id', 'unknown')}")
-        
-        # Broadcast to WebSocket clients
-        websocket_manager = get_websocket_manager()
-        await websocket_manager.broadcast_with_learning({
+        get_websocket_manager().submit_broadcast({
             "type": "learning_in_progress",
             "description": f"Processing {error_context['task']['scenario']} scenario"
         })
-        
-    except Exception as e:
-        logger.error(f"Failed to process injected learning: {e}")
+    except (SubmissionQueueFull, RuntimeError) as e:
+        logger.debug(f"Skipped learning broadcast: {e}")
+    
+    return learning
+
+# Background ingest of injected learnings
+MAX_INJECTION_BATCH = 500
+learning_ingest = LearningIngestService(
+    _process_injected_learning,
+    max_queue=int(os.environ.get("LEARNING_INGEST_QUEUE_SIZE", "1000")),
+    concurrency=int(os.environ.get("LEARNING_INGEST_CONCURRENCY", "8"))
+)
 
 @learning_api.route('/learning-history', methods=['GET'])
 def get_learning_history():
     """Get historical learning data"""
     try:
-        # Get query parameters
+        # Get query parameters; a cursor from a previous page takes precedence over offset
         limit = request.args.get('limit', 50, type=int)
         offset = request.args.get('offset', 0, type=int)
+        cursor = request.args.get('cursor')
         
-        # Get all error learnings
-        all_learnings = list(learning_system.db.error_learnings.values())
-        all_learnings.sort(key=lambda x: x.timestamp, reverse=True)
+        try:
+            error_ids, next_cursor = learning_timeline.page(limit, offset, cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Apply pagination
-        paginated_learnings = all_learnings[offset:offset + limit]
+        paginated_learnings = [
+            learning_system.db.error_learnings[error_id] for error_id in error_ids
+            if error_id in learning_system.db.error_learnings
+        ]
         
         # Format for response
-        history = []
-        for learning in paginated_learnings:
-            history.append({
-                "id": learning.error_id,
-                "type": learning.error_type,
-                "message": learning.error_message,
-                "root_cause": learning.root_cause.get("description", "Unknown"),
-                "fix_applied": learning.fix_applied.get("successful", False),
-                "prevented_count": learning.prevented_count,
-                "timestamp": learning.timestamp.isoformat(),
-                "agent": learning.agent_name
-            })
+        history = [_format_learning(learning) for learning in paginated_learnings]
         
         return jsonify({
             "history": history,
-            "total": len(all_learnings),
+            "total": len(learning_timeline),
             "limit": limit,
             "offset": offset,
+            "next_cursor": next_cursor,
             "timestamp": datetime.now().isoformat()
         })
         
@@ -315,59 +489,87 @@ def get_learning_history():
         logger.error(f"Failed to get learning history: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _format_learning(learning: Any) -> Dict[str, Any]:
+    """Public representation of one error learning"""
+    return {
+        "id": learning.error_id,
+        "type": learning.error_type,
+        "message": learning.error_message,
+        "root_cause": learning.root_cause.get("description", "Unknown"),
+        "fix_applied": learning.fix_applied.get("successful", False),
+        "prevented_count": learning.prevented_count,
+        "timestamp": learning.timestamp.isoformat(),
+        "agent": learning.agent_name
+    }
+
+EXPORT_FIELDS = ["id", "type", "message", "root_cause", "fix_applied", "prevented_count", "timestamp", "agent"]
+
+@learning_api.route('/export', methods=['GET'])
+def export_learnings():
+    """Stream error learnings as NDJSON or CSV, oldest first"""
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return jsonify({"error": "format must be 'ndjson' or 'csv'"}), 400
+        
+        try:
+            since = request.args.get('since')
+            until = request.args.get('until')
+            start = datetime.fromisoformat(since).timestamp() if since else float("-inf")
+            end = datetime.fromisoformat(until).timestamp() if until else float("inf")
+        except ValueError as e:
+            return jsonify({"error": f"since/until must be ISO 8601 timestamps: {e}"}), 400
+        agent = request.args.get('agent')
+        
+        def generate():
+            if export_format == 'csv':
+                yield ",".join(EXPORT_FIELDS) + "\r\n"
+            
+            # One chunk of rows is rendered and sent at a time
+            for error_ids in learning_timeline.iter_range(start, end):
+                rows = []
+                for error_id in error_ids:
+                    learning = learning_system.db.error_learnings.get(error_id)
+                    if learning is None or (agent and learning.agent_name != agent):
+                        continue
+                    rows.append(_format_learning(learning))
+                if not rows:
+                    continue
+                
+                if export_format == 'csv':
+                    buffer = io.StringIO()
+                    csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS).writerows(rows)
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(json.dumps(row) + "\n" for row in rows)
+        
+        mimetype = "text/csv" if export_format == 'csv' else "application/x-ndjson"
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        response.headers["Content-Disposition"] = f"attachment; filename=learnings.{export_format}"
+        return response
+        
+    except Exception as e:
+        logger.error(f"Failed to export learnings: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @learning_api.route('/analytics', methods=['GET'])
 def get_learning_analytics():
     """Get advanced learning analytics"""
     try:
-        # Calculate analytics
-        all_learnings = list(learning_system.db.error_learnings.values())
-        
-        # Time-based analytics
-        now = datetime.now()
-        last_24h = [l for l in all_learnings if (now - l.timestamp).total_seconds() < 86400]
-        last_week = [l for l in all_learnings if (now - l.timestamp).total_seconds() < 604800]
-        
-        # Error type distribution
-        error_types = {}
-        for learning in all_learnings:
-            error_type = learning.error_type
-            error_types[error_type] = error_types.get(error_type, 0) + 1
-        
-        # Agent performance
-        agent_stats = {}
-        for learning in all_learnings:
-            agent = learning.agent_name
-            if agent not in agent_stats:
-                agent_stats[agent] = {"errors": 0, "prevented": 0}
-            agent_stats[agent]["errors"] += 1
-            agent_stats[agent]["prevented"] += learning.prevented_count
-        
-        # Calculate prevention rates per agent
-        for agent in agent_stats:
-            stats = agent_stats[agent]
-            total = stats["errors"] + stats["prevented"]
-            stats["prevention_rate"] = stats["prevented"] / max(total, 1)
-        
-        analytics = {
-            "overview": {
-                "total_learnings": len(all_learnings),
-                "last_24h": len(last_24h),
-                "last_week": len(last_week),
-                "overall_prevention_rate": sum(l.prevented_count for l in all_learnings) / max(len(all_learnings), 1)
-            },
-            "error_distribution": [
-                {"type": error_type, "count": count}
-                for error_type, count in sorted(error_types.items(), key=lambda x: x[1], reverse=True)
-            ],
-            "agent_performance": [
-                {"agent": agent, **stats}
-                for agent, stats in sorted(agent_stats.items(), key=lambda x: x[1]["prevention_rate"], reverse=True)
-            ],
-            "trends": {
-                "daily_learnings": self._calculate_daily_learnings(all_learnings),
-                "prevention_trend": self._calculate_prevention_trend(all_learnings)
-            }
-        }
+        # Custom ranges are bucketed from the column store; the default
+        # view comes from the running totals
+        since = request.args.get('since')
+        until = request.args.get('until')
+        bucket = request.args.get('bucket')
+        if since or until or bucket:
+            try:
+                end = datetime.fromisoformat(until) if until else datetime.now()
+                start = datetime.fromisoformat(since) if since else end - timedelta(days=30)
+                analytics = learning_columns.histogram(start, end, bucket or "day")
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            analytics = learning_analytics.snapshot()
         
         return jsonify({
             "analytics": analytics,
@@ -378,57 +580,6 @@ def get_learning_analytics():
         logger.error(f"Failed to get learning analytics: {e}")
         return jsonify({"error": str(e)}), 500
 
-def _calculate_daily_learnings(learnings: List[Any]) -> List[Dict[str, Any]]:
-    """Calculate daily learning counts for the last 7 days"""
-    daily_counts = {}
-    now = datetime.now()
-    
-    for learning in learnings:
-        # Only include last 7 days
-        if (now - learning.timestamp).days <= 7:
-            date_key = learning.timestamp.strftime('%Y-%m-%d')
-            daily_counts[date_key] = daily_counts.get(date_key, 0) + 1
-    
-    # Fill in missing days with 0
-    result = []
-    for i in range(7):
-        date = (now - timedelta(days=i)).strftime('%Y-%m-%d')
-        result.append({
-            "date": date,
-            "count": daily_counts.get(date, 0)
-        })
-    
-    return sorted(result, key=lambda x: x["date"])
-
-def _calculate_prevention_trend(learnings: List[Any]) -> List[Dict[str, Any]]:
-    """Calculate prevention rate trend over time"""
-    # Simplified calculation - in real implementation would be more sophisticated
-    if not learnings:
-        return []
-    
-    # Group by week
-    weekly_prevention = {}
-    for learning in learnings:
-        week_start = learning.timestamp - timedelta(days=learning.timestamp.weekday())
-        week_key = week_start.strftime('%Y-%m-%d')
-        
-        if week_key not in weekly_prevention:
-            weekly_prevention[week_key] = {"total": 0, "prevented": 0}
-        
-        weekly_prevention[week_key]["total"] += 1
-        weekly_prevention[week_key]["prevented"] += learning.prevented_count
-    
-    # Calculate rates
-    result = []
-    for week, data in sorted(weekly_prevention.items()):
-        rate = data["prevented"] / max(data["total"], 1)
-        result.append({
-            "week": week,
-            "prevention_rate": rate
-        })
-    
-    return result[-8:]  # Last 8 weeks
-
 # WebSocket handlers for real-time updates
 class LearningWebSocketHandler:
     """Handle WebSocket connections for real-time learning updates"""
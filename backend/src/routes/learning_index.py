@@ -0,0 +1,741 @@
+"""
+Learning Indexes
+
+Incrementally maintained views over the learning database. Indexes are fed
+every learning captured through IndexedLearningSystem, so read endpoints
+answer from small precomputed structures instead of scanning every learning.
+"""
+
+import base64
+import bisect
+import copy
+from array import array
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Iterable, Optional, Callable, Tuple
+
+from agent_learning import AgentLearningSystem
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional; column scans fall back to pure Python
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Variable parts of error messages, masked to form the message template
+_MESSAGE_MASKS = [
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<uuid>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b"), "<ip>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<hex>"),
+    (re.compile(r"\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}\b"), "<id>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<n>"),
+]
+
+def message_template(message: str) -> str:
+    """Error message with UUIDs, IP addresses, hex IDs and numbers masked"""
+    for pattern, mask in _MESSAGE_MASKS:
+        message = pattern.sub(mask, message)
+    return message
+
+class LearningIndex:
+    """Base class for views maintained from captured learnings"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def add(self, learning: Any):
+        """Index one newly captured learning"""
+        raise NotImplementedError
+
+    def reset(self):
+        """Drop all indexed state"""
+        raise NotImplementedError
+
+    def add_rollup(self, rollup: Any):
+        """Index one aggregate row of compacted learnings; ignored by default"""
+
+    def empty_copy(self) -> "LearningIndex":
+        """An empty index of the same kind, to be built off to the side"""
+        built = copy.copy(self)
+        built.lock = threading.Lock()
+        built.reset()
+        return built
+
+    def swap_in(self, built: "LearningIndex"):
+        """Take over the state of a fully built index in one step"""
+        state = {name: value for name, value in vars(built).items() if name != "lock"}
+        with self.lock:
+            self.__dict__.update(state)
+
+    def rebuild(self, learnings: Iterable[Any], rollups: Iterable[Any] = ()):
+        """Re-index from scratch; readers keep the old state until the new one is complete"""
+        built = self.empty_copy()
+        for rollup in rollups:
+            built.add_rollup(rollup)
+        for learning in learnings:
+            built.add(learning)
+        self.swap_in(built)
+
+class LearningAnalytics(LearningIndex):
+    """
+    Running totals behind /api/learning/analytics.
+
+    Keeps type counts, per-agent counts, prevention totals and hourly, daily
+    and weekly buckets, so a snapshot costs O(types + agents + buckets).
+    The 24h and weekly windows are resolved to the hour.
+    """
+
+    HOURLY_RETENTION = 7 * 24  # hours
+    DAILY_RETENTION = 8  # days
+    WEEKLY_RETENTION = 52  # weeks
+
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def reset(self):
+        self.total = 0
+        self.prevented_total = 0
+        self.type_counts: Counter = Counter()
+        self.agent_stats: Dict[str, Dict[str, int]] = {}
+        self.hourly: Dict[int, int] = {}
+        self.daily: Dict[str, int] = {}
+        self.weekly: Dict[str, Dict[str, int]] = {}
+
+    def add(self, learning: Any):
+        timestamp = learning.timestamp
+        prevented = learning.prevented_count
+        hour = int(timestamp.timestamp() // 3600)
+        day_key = timestamp.strftime('%Y-%m-%d')
+        week_key = (timestamp - timedelta(days=timestamp.weekday())).strftime('%Y-%m-%d')
+
+        with self.lock:
+            self.total += 1
+            self.prevented_total += prevented
+            self.type_counts[learning.error_type] += 1
+
+            stats = self.agent_stats.setdefault(learning.agent_name, {"errors": 0, "prevented": 0})
+            stats["errors"] += 1
+            stats["prevented"] += prevented
+
+            if hour not in self.hourly:
+                self._prune(hour)
+            self.hourly[hour] = self.hourly.get(hour, 0) + 1
+            self.daily[day_key] = self.daily.get(day_key, 0) + 1
+            week = self.weekly.setdefault(week_key, {"total": 0, "prevented": 0})
+            week["total"] += 1
+            week["prevented"] += prevented
+
+    def add_rollup(self, rollup: Any):
+        """
+        Count compacted learnings. Compaction only rolls up learnings older
+        than the hourly windows, so no hourly buckets are involved.
+        """
+        week_key = (rollup.bucket_start - timedelta(days=rollup.bucket_start.weekday())).strftime('%Y-%m-%d')
+
+        with self.lock:
+            self.total += rollup.count
+            self.prevented_total += rollup.prevented
+            self.type_counts[rollup.error_type] += rollup.count
+
+            stats = self.agent_stats.setdefault(rollup.agent_name, {"errors": 0, "prevented": 0})
+            stats["errors"] += rollup.count
+            stats["prevented"] += rollup.prevented
+
+            if rollup.period == "day":
+                day_key = rollup.bucket_start.strftime('%Y-%m-%d')
+                self.daily[day_key] = self.daily.get(day_key, 0) + rollup.count
+            week = self.weekly.setdefault(week_key, {"total": 0, "prevented": 0})
+            week["total"] += rollup.count
+            week["prevented"] += rollup.prevented
+
+    def _prune(self, newest_hour: int):
+        """Drop buckets that have aged out of every window; runs once per new hour"""
+        oldest_hour = newest_hour - self.HOURLY_RETENTION
+        for hour in [h for h in self.hourly if h < oldest_hour]:
+            del self.hourly[hour]
+        if len(self.daily) > self.DAILY_RETENTION * 2:
+            for day in sorted(self.daily)[:-self.DAILY_RETENTION]:
+                del self.daily[day]
+        if len(self.weekly) > self.WEEKLY_RETENTION:
+            for week in sorted(self.weekly)[:-self.WEEKLY_RETENTION]:
+                del self.weekly[week]
+
+    def snapshot(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Analytics payload computed from the running totals"""
+        now = now or datetime.now()
+        current_hour = int(now.timestamp() // 3600)
+
+        with self.lock:
+            hourly = list(self.hourly.items())
+            type_counts = list(self.type_counts.items())
+            agent_stats = {agent: dict(stats) for agent, stats in self.agent_stats.items()}
+            daily = dict(self.daily)
+            weekly = sorted(self.weekly.items())
+            total, prevented_total = self.total, self.prevented_total
+
+        for stats in agent_stats.values():
+            stats["prevention_rate"] = stats["prevented"] / max(stats["errors"] + stats["prevented"], 1)
+
+        daily_learnings = [
+            {"date": date, "count": daily.get(date, 0)}
+            for date in sorted((now - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7))
+        ]
+
+        return {
+            "overview": {
+                "total_learnings": total,
+                "last_24h": sum(count for hour, count in hourly if current_hour - hour < 24),
+                "last_week": sum(count for hour, count in hourly if current_hour - hour < 168),
+                "overall_prevention_rate": prevented_total / max(total, 1)
+            },
+            "error_distribution": [
+                {"type": error_type, "count": count}
+                for error_type, count in sorted(type_counts, key=lambda x: x[1], reverse=True)
+            ],
+            "agent_performance": [
+                {"agent": agent, **stats}
+                for agent, stats in sorted(agent_stats.items(), key=lambda x: x[1]["prevention_rate"], reverse=True)
+            ],
+            "trends": {
+                "daily_learnings": daily_learnings,
+                "prevention_trend": [
+                    {"week": week, "prevention_rate": data["prevented"] / max(data["total"], 1)}
+                    for week, data in weekly
+                ][-8:]  # Last 8 weeks
+            }
+        }
+
+class TimelineIndex(LearningIndex):
+    """
+    Learnings ordered by (timestamp, error_id), maintained with bisect.
+
+    Pages are read newest first, either by offset or by an opaque cursor
+    naming the last learning of the previous page (keyset pagination), in
+    O(log n + limit).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def reset(self):
+        self.keys: List[Tuple[float, str]] = []
+
+    def add(self, learning: Any):
+        key = (learning.timestamp.timestamp(), learning.error_id)
+        with self.lock:
+            if not self.keys or key > self.keys[-1]:
+                self.keys.append(key)  # Common case: learnings arrive in time order
+            else:
+                bisect.insort(self.keys, key)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def encode_cursor(key: Tuple[float, str]) -> str:
+        return base64.urlsafe_b64encode(f"{key[0]!r}|{key[1]}".encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[float, str]:
+        """Parse a cursor; raises ValueError if it is malformed"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            timestamp, error_id = raw.split("|", 1)
+            return float(timestamp), error_id
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    def page(self, limit: int, offset: int = 0, cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Error IDs of one page, newest first, and the cursor of the next page"""
+        limit = max(limit, 0)
+        with self.lock:
+            if cursor is not None:
+                end = bisect.bisect_left(self.keys, self.decode_cursor(cursor))
+            else:
+                end = max(len(self.keys) - max(offset, 0), 0)
+            start = max(end - limit, 0)
+            page = self.keys[start:end][::-1]
+
+        next_cursor = self.encode_cursor(page[-1]) if page and start > 0 else None
+        return [error_id for _, error_id in page], next_cursor
+
+    def iter_range(self, start: float = float("-inf"), end: float = float("inf"),
+                   chunk_size: int = 500) -> Iterable[List[str]]:
+        """
+        Error IDs with start <= timestamp < end, oldest first, in chunks.
+
+        Each chunk is located by bisecting from the last key seen, so only
+        one chunk of keys is held at a time and concurrent inserts are safe.
+        """
+        position_key: Tuple[float, str] = (start, "")
+        while True:
+            with self.lock:
+                position = bisect.bisect_left(self.keys, position_key)
+                chunk = self.keys[position:position + chunk_size]
+            chunk = [key for key in chunk if key[0] < end]
+            if not chunk:
+                return
+            yield [error_id for _, error_id in chunk]
+            position_key = (chunk[-1][0], chunk[-1][1] + "\0")  # Just after the last key
+
+class ErrorPatternIndex(LearningIndex):
+    """
+    Learnings grouped by fingerprint: error type, agent and message template.
+
+    Each group keeps its occurrence count, first and last seen times, total
+    preventions and the root cause and prevention of its latest learning.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def reset(self):
+        self.groups: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def add(self, learning: Any):
+        key = (learning.error_type, learning.agent_name, message_template(learning.error_message))
+        with self.lock:
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = {
+                    "occurrences": 0,
+                    "prevented": 0,
+                    "first_seen": learning.timestamp,
+                    "last_seen": learning.timestamp,
+                    "exemplar": learning
+                }
+            group["occurrences"] += 1
+            group["prevented"] += learning.prevented_count
+            group["first_seen"] = min(group["first_seen"], learning.timestamp)
+            if learning.timestamp >= group["last_seen"] or group["exemplar"] is None:
+                group["last_seen"] = max(group["last_seen"], learning.timestamp)
+                group["exemplar"] = learning
+
+    def add_rollup(self, rollup: Any):
+        key = (rollup.error_type, rollup.agent_name, rollup.template)
+        with self.lock:
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = {
+                    "occurrences": 0,
+                    "prevented": 0,
+                    "first_seen": rollup.bucket_start,
+                    "last_seen": rollup.bucket_start,
+                    "exemplar": None
+                }
+            group["occurrences"] += rollup.count
+            group["prevented"] += rollup.prevented
+            group["first_seen"] = min(group["first_seen"], rollup.bucket_start)
+            group["last_seen"] = max(group["last_seen"], rollup.bucket_start)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def patterns(self) -> List[Dict[str, Any]]:
+        """One row per fingerprint, most recently seen first"""
+        with self.lock:
+            groups = [(key, dict(group)) for key, group in self.groups.items()]
+
+        rows = []
+        for (error_type, agent_name, template), group in groups:
+            exemplar = group["exemplar"]
+            root_cause = exemplar.root_cause if exemplar is not None else {}
+            prevention_rule = exemplar.prevention_rule if exemplar is not None else {}
+            rows.append({
+                "pattern": error_type,
+                "agent": agent_name,
+                "template": template,
+                "occurrences": group["occurrences"],
+                "firstSeen": group["first_seen"].isoformat(),
+                "lastSeen": group["last_seen"].isoformat(),
+                "rootCause": root_cause.get("description", "Unknown"),
+                "prevention": prevention_rule.get("prevention_strategy", {}).get("name", "Unknown"),
+                "effectiveness": group["prevented"] / max(group["prevented"] + group["occurrences"], 1) * 100
+            })
+        rows.sort(key=lambda x: x["lastSeen"], reverse=True)
+        return rows
+
+_WALL_CLOCK_EPOCH = datetime(1970, 1, 1)
+
+def wall_clock_seconds(timestamp: datetime) -> float:
+    """Seconds since 1970-01-01 on the learning's own (naive) clock, so days split at local midnight"""
+    return (timestamp.replace(tzinfo=None) - _WALL_CLOCK_EPOCH).total_seconds()
+
+class LearningColumns(LearningIndex):
+    """
+    Column store of the fields analytics bucket on.
+
+    Timestamps (wall-clock seconds), interned type and agent ids,
+    prevented counts and weights live in typed arrays, about 28 bytes per
+    learning. A compacted rollup row is one entry weighted by its count.
+    Range histograms and distributions are computed with NumPy when it is
+    installed, and with a single pure-Python pass otherwise.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def reset(self):
+        self.timestamps = array("d")
+        self.type_ids = array("I")
+        self.agent_ids = array("I")
+        self.prevented = array("q")
+        self.weights = array("I")
+        self.type_names: List[str] = []
+        self.agent_names: List[str] = []
+        self._type_lookup: Dict[str, int] = {}
+        self._agent_lookup: Dict[str, int] = {}
+
+    @staticmethod
+    def _intern(lookup: Dict[str, int], names: List[str], value: str) -> int:
+        interned = lookup.get(value)
+        if interned is None:
+            interned = lookup[value] = len(names)
+            names.append(value)
+        return interned
+
+    def add(self, learning: Any):
+        with self.lock:
+            self.timestamps.append(wall_clock_seconds(learning.timestamp))
+            self.type_ids.append(self._intern(self._type_lookup, self.type_names, learning.error_type))
+            self.agent_ids.append(self._intern(self._agent_lookup, self.agent_names, learning.agent_name))
+            self.prevented.append(learning.prevented_count)
+            self.weights.append(1)
+
+    def add_rollup(self, rollup: Any):
+        with self.lock:
+            self.timestamps.append(wall_clock_seconds(rollup.bucket_start))
+            self.type_ids.append(self._intern(self._type_lookup, self.type_names, rollup.error_type))
+            self.agent_ids.append(self._intern(self._agent_lookup, self.agent_names, rollup.agent_name))
+            self.prevented.append(rollup.prevented)
+            self.weights.append(rollup.count)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def histogram(self, since: datetime, until: datetime, bucket: str = "day") -> Dict[str, Any]:
+        """
+        Learnings with since <= timestamp < until, bucketed by day or by
+        week (starting Monday), with type and agent distributions.
+        """
+        if bucket not in ("day", "week"):
+            raise ValueError("bucket must be 'day' or 'week'")
+        start, end = wall_clock_seconds(since), wall_clock_seconds(until)
+
+        # The arrays cannot grow while NumPy views of them exist, so the scan
+        # runs under the lock and returns plain Python values
+        with self.lock:
+            scan = self._scan_numpy if np is not None else self._scan_python
+            buckets, type_counts, agent_counts, agent_prevented = scan(start, end, bucket == "week")
+            type_names, agent_names = list(self.type_names), list(self.agent_names)
+
+        return _histogram_payload(
+            bucket, buckets,
+            {type_names[type_id]: count for type_id, count in enumerate(type_counts) if count},
+            {agent_names[agent_id]: (errors, agent_prevented[agent_id])
+             for agent_id, errors in enumerate(agent_counts) if errors}
+        )
+
+    def _scan_numpy(self, start: float, end: float, weekly: bool) -> tuple:
+        timestamps = np.frombuffer(self.timestamps, dtype=np.float64)
+        in_range = (timestamps >= start) & (timestamps < end)
+        prevented = np.frombuffer(self.prevented, dtype=np.int64)[in_range]
+        type_ids = np.frombuffer(self.type_ids, dtype=np.dtype(self.type_ids.typecode))[in_range]
+        agent_ids = np.frombuffer(self.agent_ids, dtype=np.dtype(self.agent_ids.typecode))[in_range]
+        weights = np.frombuffer(self.weights, dtype=np.dtype(self.weights.typecode))[in_range]
+
+        days = np.floor(timestamps[in_range] * (1 / 86400)).astype(np.int64)
+        if weekly:
+            days = (days + 3) // 7 * 7 - 3  # 1970-01-01 was a Thursday; weeks start on Monday
+        first_day = int(days.min()) if len(days) else 0
+        offsets = days - first_day
+        counts = np.bincount(offsets, weights=weights).astype(np.int64)
+        bucket_prevented = np.bincount(offsets, weights=prevented, minlength=len(counts)).astype(np.int64)
+        occupied = np.flatnonzero(counts)
+
+        return (
+            list(zip((occupied + first_day).tolist(), counts[occupied].tolist(), bucket_prevented[occupied].tolist())),
+            np.bincount(type_ids, weights=weights, minlength=len(self.type_names)).astype(np.int64).tolist(),
+            np.bincount(agent_ids, weights=weights, minlength=len(self.agent_names)).astype(np.int64).tolist(),
+            np.bincount(agent_ids, weights=prevented, minlength=len(self.agent_names)).astype(np.int64).tolist()
+        )
+
+    def _scan_python(self, start: float, end: float, weekly: bool) -> tuple:
+        buckets: Dict[int, List[int]] = {}
+        type_counts = [0] * len(self.type_names)
+        agent_counts = [0] * len(self.agent_names)
+        agent_prevented = [0] * len(self.agent_names)
+
+        for timestamp, type_id, agent_id, prevented, weight in zip(self.timestamps, self.type_ids, self.agent_ids,
+                                                                   self.prevented, self.weights):
+            if not start <= timestamp < end:
+                continue
+            day = int(timestamp // 86400)
+            if weekly:
+                day = (day + 3) // 7 * 7 - 3
+            bucket = buckets.setdefault(day, [0, 0])
+            bucket[0] += weight
+            bucket[1] += prevented
+            type_counts[type_id] += weight
+            agent_counts[agent_id] += weight
+            agent_prevented[agent_id] += prevented
+
+        return (
+            [(day, count, prevented) for day, (count, prevented) in sorted(buckets.items())],
+            type_counts, agent_counts, agent_prevented
+        )
+
+class StoreColumns:
+    """
+    LearningColumns.histogram answered by a SQLite learning store from its
+    timestamp index and rollup table, so nothing is held per learning.
+    """
+
+    def __init__(self, store: Any):
+        self.store = store
+
+    def histogram(self, since: datetime, until: datetime, bucket: str = "day") -> Dict[str, Any]:
+        if bucket not in ("day", "week"):
+            raise ValueError("bucket must be 'day' or 'week'")
+
+        buckets: Dict[int, List[int]] = {}
+        type_counts: Counter = Counter()
+        agent_totals: Dict[str, List[int]] = {}
+        for day, error_type, agent_name, count, prevented in self.store.day_totals(
+                wall_clock_seconds(since), wall_clock_seconds(until)):
+            if bucket == "week":
+                day = (day + 3) // 7 * 7 - 3
+            for totals in (buckets.setdefault(day, [0, 0]), agent_totals.setdefault(agent_name, [0, 0])):
+                totals[0] += count
+                totals[1] += prevented
+            type_counts[error_type] += count
+
+        return _histogram_payload(
+            bucket, [(day, count, prevented) for day, (count, prevented) in sorted(buckets.items())],
+            type_counts, agent_totals
+        )
+
+def _histogram_payload(bucket: str, buckets: List[Tuple[int, int, int]], type_counts: Dict[str, int],
+                       agent_totals: Dict[str, Tuple[int, int]]) -> Dict[str, Any]:
+    """Histogram response from (day, count, prevented) buckets and per-type and per-agent totals"""
+    total = sum(count for _, count, _ in buckets)
+    prevented_total = sum(prevented for _, _, prevented in buckets)
+    agent_performance = [
+        {
+            "agent": agent,
+            "errors": errors,
+            "prevented": prevented,
+            "prevention_rate": prevented / max(errors + prevented, 1)
+        }
+        for agent, (errors, prevented) in agent_totals.items()
+    ]
+
+    return {
+        "overview": {
+            "total_learnings": total,
+            "overall_prevention_rate": prevented_total / max(total, 1)
+        },
+        "error_distribution": sorted(
+            ({"type": error_type, "count": count} for error_type, count in type_counts.items()),
+            key=lambda x: x["count"], reverse=True
+        ),
+        "agent_performance": sorted(agent_performance, key=lambda x: x["prevention_rate"], reverse=True),
+        "trends": {
+            "bucket": bucket,
+            "buckets": [
+                {
+                    "start": (_WALL_CLOCK_EPOCH + timedelta(days=day)).strftime('%Y-%m-%d'),
+                    "count": count,
+                    "prevention_rate": prevented / max(count, 1)
+                }
+                for day, count, prevented in buckets
+            ]
+        }
+    }
+
+class IndexedLearningSystem(AgentLearningSystem):
+    """
+    Learning system that keeps registered indexes up to date.
+
+    Every learning captured through capture_error is handed to the indexes.
+    Prevention counts can grow after capture and learnings can reach the
+    database by other paths (or from other processes sharing a store), so a
+    background thread started by start_resync rebuilds the indexes when the
+    database size no longer matches or after resync_interval seconds,
+    checking every min_resync_interval seconds. Requests never pay for a
+    rebuild. version is bumped whenever indexed data changes, for response
+    caching.
+
+    When retention compaction is enabled, rollups holds the aggregates of
+    compacted learnings; indexes are seeded from them before raw learnings
+    so read endpoints include compacted history transparently.
+    """
+
+    def __init__(self, *args, resync_interval: float = 300.0, min_resync_interval: float = 5.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.indexes: List[LearningIndex] = []
+        self.indexed_count = 0
+        self.version = 0
+        self.resync_interval = resync_interval
+        self.min_resync_interval = min_resync_interval  # bounds rebuilds when other writers share the store
+        self.last_resync = time.monotonic()
+        self.rollups = None
+
+        # Captures are indexed under _capture_lock, which also orders them
+        # against rebuild snapshots so no learning is indexed twice
+        self._capture_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._snapshots = 0  # rebuild snapshots taken so far
+        self._in_flight = 0  # captures between their database write and indexing
+        self._pending: Optional[List[Any]] = None  # captured while a rebuild is in progress
+        self._swapped_snapshot = 0  # snapshot behind the live indexes
+        self._swapped_contains: Optional[Callable[[str], bool]] = None
+        self._resync_thread: Optional[threading.Thread] = None
+
+    def _all_learnings(self) -> Iterable[Any]:
+        """Every stored learning; dicts are copied, other stores are streamed"""
+        learnings = self.db.error_learnings
+        return list(learnings.values()) if isinstance(learnings, dict) else learnings.values()
+
+    def _all_rollups(self) -> Iterable[Any]:
+        return list(self.rollups.values()) if self.rollups is not None else ()
+
+    def _snapshot(self) -> Tuple[Iterable[Any], Callable[[str], bool]]:
+        """Stored learnings as of now and a test of whether an error ID was among them"""
+        learnings = self.db.error_learnings
+        if hasattr(learnings, "snapshot"):
+            return learnings.snapshot()
+        copied = dict(learnings)
+        return list(copied.values()), copied.__contains__
+
+    def add_index(self, index: LearningIndex) -> LearningIndex:
+        """Register an index at startup and backfill it from the current database"""
+        index.rebuild(self._all_learnings(), self._all_rollups())
+        self.indexes.append(index)
+        self.indexed_count = len(self.db.error_learnings)
+        return index
+
+    async def capture_error(self, error_context: Dict[str, Any]) -> Dict[str, Any]:
+        with self._capture_lock:
+            self._in_flight += 1
+            snapshots = self._snapshots
+        learning = None
+        try:
+            learning = await super().capture_error(error_context)
+        finally:
+            record = self.db.error_learnings.get(learning.get("error_id")) if isinstance(learning, dict) else None
+            with self._capture_lock:
+                self._in_flight -= 1
+                if record is not None:
+                    self._index_captured(record, snapshots)
+                if not self._in_flight:
+                    self._swapped_contains = None
+        return learning
+
+    def _index_captured(self, record: Any, snapshots: int):
+        """Index one captured learning; called with _capture_lock held"""
+        # A rebuild that snapshotted the database after this capture began
+        # may already have indexed the record
+        if snapshots < self._swapped_snapshot and self._swapped_contains(record.error_id):
+            return
+        for index in self.indexes:
+            try:
+                index.add(record)
+            except Exception as e:
+                logger.error(f"Failed to index learning {record.error_id}: {e}")
+        if self._pending is not None:
+            self._pending.append(record)
+        self.indexed_count += 1
+        self.version += 1
+
+    def start_resync(self):
+        """Start the background thread that keeps the indexes in sync"""
+        if self._resync_thread is None:
+            self._resync_thread = threading.Thread(target=self._run_resync, name="learning-resync", daemon=True)
+            self._resync_thread.start()
+
+    def _run_resync(self):
+        while True:
+            time.sleep(self.min_resync_interval)
+            try:
+                self.resync_if_stale()
+            except Exception as e:
+                logger.error(f"Failed to resync learning indexes: {e}")
+
+    def resync_if_stale(self) -> bool:
+        """Rebuild the indexes if they may have drifted from the database; False if nothing was rebuilt"""
+        since_resync = time.monotonic() - self.last_resync
+        if since_resync < self.min_resync_interval:
+            return False
+        if len(self.db.error_learnings) == self.indexed_count and since_resync < self.resync_interval:
+            return False
+        return self.reindex(blocking=False)
+
+    def reindex(self, blocking: bool = True) -> bool:
+        """
+        Rebuild every index from the database and rollups.
+
+        The new indexes are built off to the side and swapped in together,
+        so readers never see a partial rebuild. Learnings captured during
+        the rebuild are added to the new indexes unless the snapshot already
+        held them. Returns False if blocking is False and another rebuild is
+        running.
+        """
+        if not self._rebuild_lock.acquire(blocking=blocking):
+            return False
+        try:
+            if self.rollups is not None:
+                self.rollups.reload()
+            built = [index.empty_copy() for index in self.indexes]
+            for rollup in self._all_rollups():
+                for index in built:
+                    index.add_rollup(rollup)
+
+            with self._capture_lock:
+                self._snapshots += 1
+                snapshot = self._snapshots
+                self._pending = []
+                learnings, contains = self._snapshot()
+            count = 0
+            for learning in learnings:
+                for index in built:
+                    index.add(learning)
+                count += 1
+
+            with self._capture_lock:
+                for record in self._pending:
+                    if not contains(record.error_id):
+                        for index in built:
+                            index.add(record)
+                        count += 1
+                for index, fresh in zip(self.indexes, built):
+                    index.swap_in(fresh)
+                self._swapped_snapshot = snapshot
+                self._swapped_contains = contains if self._in_flight else None
+                self.indexed_count = count
+                self.version += 1
+            self.last_resync = time.monotonic()
+            return True
+        finally:
+            with self._capture_lock:
+                self._pending = None
+            self._rebuild_lock.release()
+
+    def get_learning_stats(self) -> Dict[str, Any]:
+        """Learning stats counting compacted learnings as well"""
+        stats = super().get_learning_stats()
+        if self.rollups is not None:
+            compacted = self.rollups.total_count()
+            stats["errors_learned"] = stats.get("errors_learned", 0) + compacted
+            stats["compacted_learnings"] = compacted
+        return stats
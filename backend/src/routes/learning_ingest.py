@@ -0,0 +1,158 @@
+"""
+Learning Ingest Service
+
+Runs learning capture on a long-lived background event loop, fed from
+synchronous request threads through a bounded queue. A full queue is
+reported to the caller immediately so the API can apply backpressure.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+class IngestQueueFull(Exception):
+    """Raised when the ingest queue cannot take the submitted items"""
+
+class LearningIngestService:
+    """
+    Bounded queue drained by worker tasks on a dedicated event loop thread.
+
+    The thread and loop are started on first submission. Every item is
+    passed to process(item) on the loop; the returned future resolves to
+    its result.
+    """
+
+    def __init__(self, process: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 max_queue: int = 1000, concurrency: int = 8):
+        self.process = process
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.concurrency = concurrency
+        self.stats = {"submitted": 0, "rejected": 0, "processed": 0, "failed": 0}
+        self.latencies: deque = deque(maxlen=1000)  # (queue wait ms, processing ms)
+
+        self.running = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._item_ready: Optional[asyncio.Event] = None
+        self._lock = threading.Lock()
+        self._wakeup_scheduled = False
+
+    def start(self):
+        """Start the background loop thread if it is not running"""
+        with self._lock:
+            if self.running:
+                return
+            self._loop = asyncio.new_event_loop()
+            started = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(started,),
+                                            name="learning-ingest", daemon=True)
+            self.running = True
+            self._thread.start()
+        started.wait()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the loop; items still queued are dropped"""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+        self._loop.call_soon_threadsafe(self._item_ready.set)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+    def _run(self, started: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._item_ready = asyncio.Event()
+        for _ in range(self.concurrency):
+            self._loop.create_task(self._worker())
+        self._loop.call_soon(started.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def submit(self, item: Dict[str, Any]) -> concurrent.futures.Future:
+        """Queue one item from any thread; raises IngestQueueFull at capacity"""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items: List[Dict[str, Any]]) -> List[concurrent.futures.Future]:
+        """Queue a batch all-or-nothing; raises IngestQueueFull if it does not fit"""
+        self.start()
+        futures = [concurrent.futures.Future() for _ in items]
+        enqueued_at = time.perf_counter()
+
+        with self._lock:
+            if self.queue.qsize() + len(items) > self.queue.maxsize:
+                self.stats["rejected"] += len(items)
+                raise IngestQueueFull(
+                    f"Ingest queue full ({self.queue.qsize()} of {self.queue.maxsize} pending, "
+                    f"{len(items)} submitted)"
+                )
+            for item, future in zip(items, futures):
+                self.queue.put_nowait((item, future, enqueued_at))
+            self.stats["submitted"] += len(items)
+
+            # Coalesce wakeups: at most one pending call_soon_threadsafe at a time
+            if not self._wakeup_scheduled:
+                self._wakeup_scheduled = True
+                self._loop.call_soon_threadsafe(self._wake_workers)
+        return futures
+
+    def _wake_workers(self):
+        with self._lock:
+            self._wakeup_scheduled = False
+        self._item_ready.set()
+
+    async def _worker(self):
+        """Take items off the queue until the service stops"""
+        while self.running:
+            try:
+                item, future, enqueued_at = self.queue.get_nowait()
+            except queue.Empty:
+                self._item_ready.clear()
+                if self.queue.empty():
+                    await self._item_ready.wait()
+                continue
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started_at = time.perf_counter()
+            try:
+                result = await self.process(item)
+                self.stats["processed"] += 1
+                future.set_result(result)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Learning ingest failed: {e}")
+                future.set_exception(e)
+            finished_at = time.perf_counter()
+            self.latencies.append(((started_at - enqueued_at) * 1000, (finished_at - started_at) * 1000))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, counters and recent latency percentiles"""
+        depth = self.queue.qsize()
+        waits = sorted(wait for wait, _ in self.latencies)
+        processing = sorted(duration for _, duration in self.latencies)
+
+        def percentile(values: List[float], q: float) -> Optional[float]:
+            return values[min(int(len(values) * q), len(values) - 1)] if values else None
+
+        return {
+            "running": self.running,
+            "depth": depth,
+            "capacity": self.queue.maxsize,
+            "utilization": depth / self.queue.maxsize,
+            **self.stats,
+            "queue_wait_p50_ms": percentile(waits, 0.5),
+            "queue_wait_p99_ms": percentile(waits, 0.99),
+            "processing_p50_ms": percentile(processing, 0.5),
+            "processing_p99_ms": percentile(processing, 0.99)
+        }
@@ -0,0 +1,248 @@
+"""
+Learning Retention and Rollup Compaction
+
+Learnings older than a retention age are rolled up into daily aggregate
+rows per error type, agent and message template, and daily rows older than
+a second age are merged into weekly rows. The most recent aged learning of
+each fingerprint is kept as an exemplar. Memory and scan cost then grow
+with elapsed time rather than with event volume.
+"""
+
+import fcntl
+import logging
+import threading
+import time
+from dataclasses import dataclass, astuple
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+from api.learning_index import message_template, wall_clock_seconds
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class LearningRollup:
+    """Aggregate of compacted learnings for one period bucket and fingerprint"""
+    period: str  # "day" or "week"
+    bucket_start: datetime
+    error_type: str
+    agent_name: str
+    template: str
+    count: int = 0
+    prevented: int = 0
+
+    @property
+    def key(self) -> Tuple[str, datetime, str, str, str]:
+        return (self.period, self.bucket_start, self.error_type, self.agent_name, self.template)
+
+class LearningRollups:
+    """
+    Rollup rows of compacted learnings, persisted through the learning
+    store when one is configured.
+    """
+
+    def __init__(self, store: Optional[Any] = None):
+        self.store = store
+        self.rows: Dict[tuple, LearningRollup] = {}
+        self._changed: Dict[tuple, LearningRollup] = {}
+        self._removed: Dict[tuple, LearningRollup] = {}
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Re-read the rows from the store; other processes may have compacted"""
+        if self.store is None:
+            return
+        rows = {rollup.key: rollup for rollup in (LearningRollup(*row) for row in self.store.load_rollups())}
+        with self.lock:
+            self.rows = rows
+
+    def values(self) -> Iterable[LearningRollup]:
+        with self.lock:
+            return list(self.rows.values())
+
+    def total_count(self) -> int:
+        with self.lock:
+            return sum(rollup.count for rollup in self.rows.values())
+
+    def add(self, period: str, bucket_start: datetime, error_type: str, agent_name: str,
+            template: str, count: int, prevented: int):
+        key = (period, bucket_start, error_type, agent_name, template)
+        with self.lock:
+            rollup = self.rows.get(key)
+            if rollup is None:
+                rollup = self.rows[key] = LearningRollup(period, bucket_start, error_type, agent_name, template)
+            rollup.count += count
+            rollup.prevented += prevented
+            self._changed[key] = rollup
+            self._removed.pop(key, None)
+
+    def remove(self, rollup: LearningRollup):
+        with self.lock:
+            self.rows.pop(rollup.key, None)
+            self._changed.pop(rollup.key, None)
+            self._removed[rollup.key] = rollup
+
+    def commit(self, error_learnings: Any, deleted_ids: List[str]):
+        """Persist pending rollup changes and delete the learnings they absorbed"""
+        with self.lock:
+            changed = [astuple(rollup) for rollup in self._changed.values()]
+            removed = [astuple(rollup)[:5] for rollup in self._removed.values()]
+            self._changed.clear()
+            self._removed.clear()
+
+        if self.store is not None:
+            self.store.apply_compaction(changed, removed, deleted_ids)
+        else:
+            for error_id in deleted_ids:
+                error_learnings.pop(error_id, None)
+
+def _day_start(timestamp: datetime) -> datetime:
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+def compact_learnings(learning_system: Any, rollups: LearningRollups, raw_retention: timedelta,
+                      daily_retention: timedelta, now: Optional[datetime] = None,
+                      batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Roll learnings older than raw_retention into daily rows, keeping the
+    latest aged learning of each fingerprint, then merge daily rows older
+    than daily_retention into weekly rows.
+    """
+    if raw_retention < timedelta(days=7):
+        raise ValueError("raw_retention must be at least 7 days; hourly analytics windows read raw learnings")
+    if daily_retention < raw_retention:
+        raise ValueError("daily_retention must not be shorter than raw_retention")
+
+    now = now or datetime.now()
+    cutoff = now - raw_retention
+    error_learnings = learning_system.db.error_learnings
+
+    def aged() -> Iterable[Any]:
+        if hasattr(error_learnings, "select"):
+            return error_learnings.select("timestamp < ?", (wall_clock_seconds(cutoff),))
+        return [learning for learning in list(error_learnings.values()) if learning.timestamp < cutoff]
+
+    def fingerprint(learning: Any) -> tuple:
+        return (learning.error_type, learning.agent_name, message_template(learning.error_message))
+
+    # Pass 1: the latest aged learning of every fingerprint stays as its exemplar
+    exemplars: Dict[tuple, Tuple[datetime, str]] = {}
+    for learning in aged():
+        key = fingerprint(learning)
+        current = exemplars.get(key)
+        if current is None or learning.timestamp > current[0]:
+            exemplars[key] = (learning.timestamp, learning.error_id)
+    keep = {error_id for _, error_id in exemplars.values()}
+
+    # Pass 2: roll the rest up, committing in batches
+    compacted = 0
+    batch: List[str] = []
+    for learning in aged():
+        if learning.error_id in keep:
+            continue
+        rollups.add("day", _day_start(learning.timestamp), *fingerprint(learning), 1, learning.prevented_count)
+        batch.append(learning.error_id)
+        if len(batch) >= batch_size:
+            rollups.commit(error_learnings, batch)
+            compacted += len(batch)
+            batch = []
+    rollups.commit(error_learnings, batch)
+    compacted += len(batch)
+
+    # Daily rows that have aged out are merged into weekly rows
+    daily_cutoff = _day_start(now - daily_retention)
+    merged = 0
+    for rollup in rollups.values():
+        if rollup.period == "day" and rollup.bucket_start < daily_cutoff:
+            week_start = rollup.bucket_start - timedelta(days=rollup.bucket_start.weekday())
+            rollups.add("week", week_start, rollup.error_type, rollup.agent_name, rollup.template,
+                        rollup.count, rollup.prevented)
+            rollups.remove(rollup)
+            merged += 1
+    rollups.commit(error_learnings, [])
+
+    return {"compacted": compacted, "exemplars": len(keep), "merged_daily_rows": merged}
+
+class LearningRetentionJob:
+    """
+    Background thread that compacts aged learnings every interval seconds
+    and reindexes the learning system afterwards. A file lock next to the
+    SQLite database keeps processes sharing it from compacting at the same
+    time; rollups kept in memory are private to the process and only need a
+    thread lock.
+    """
+
+    def __init__(self, learning_system: Any, rollups: LearningRollups, raw_retention: timedelta,
+                 daily_retention: timedelta, interval: float = 3600.0, lock_path: Optional[str] = None):
+        self.learning_system = learning_system
+        self.rollups = rollups
+        self.raw_retention = raw_retention
+        self.daily_retention = daily_retention
+        self.interval = interval
+        store_path = getattr(rollups.store, "path", None)
+        self.lock_path = lock_path or (f"{store_path}.compact.lock" if store_path else None)
+        self.stats: Dict[str, Any] = {"runs": 0, "skipped": 0, "compacted": 0, "last_run": None, "last_error": None}
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="learning-retention", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+                logger.error(f"Learning compaction run failed: {e}")
+
+    def run_once(self) -> Optional[Dict[str, int]]:
+        """Compact now unless another run holds the compaction lock"""
+        if not self._run_lock.acquire(blocking=False):
+            self.stats["skipped"] += 1
+            return None
+        try:
+            if self.lock_path is None:
+                return self._compact()
+
+            with open(self.lock_path, "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self.stats["skipped"] += 1
+                    return None
+
+                try:
+                    return self._compact()
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            self._run_lock.release()
+
+    def _compact(self) -> Optional[Dict[str, int]]:
+        try:
+            self.rollups.reload()
+            result = compact_learnings(self.learning_system, self.rollups,
+                                       self.raw_retention, self.daily_retention)
+            self.learning_system.reindex()
+            self.stats["runs"] += 1
+            self.stats["compacted"] += result["compacted"]
+            self.stats["last_run"] = datetime.now().isoformat()
+            self.stats["last_error"] = None
+            logger.info(f"Learning compaction: {result}")
+            return result
+        except Exception as e:
+            self.stats["last_error"] = str(e)
+            logger.error(f"Learning compaction failed: {e}")
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "raw_retention_days": self.raw_retention.total_seconds() / 86400,
+            "daily_retention_days": self.daily_retention.total_seconds() / 86400,
+            "rollup_rows": len(self.rollups.values()),
+            **self.stats
+        }
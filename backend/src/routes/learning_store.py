@@ -0,0 +1,464 @@
+"""
+SQLite Learning Store
+
+Durable storage for the learning database in SQLite (WAL mode). It is a
+drop-in replacement for the in-memory `error_learnings` and
+`success_patterns` dicts: both become mappings over indexed tables, writes
+are batched, and stored records come back as lazily decoded views, so a
+process holds only what it is using rather than the whole history.
+"""
+
+import base64
+import json
+import logging
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _to_seconds(timestamp: datetime) -> float:
+    return (timestamp.replace(tzinfo=None) - _EPOCH).total_seconds()
+
+def _from_seconds(seconds: float) -> datetime:
+    return _EPOCH + timedelta(seconds=seconds)
+
+def _encode(value: Any) -> Any:
+    """JSON default hook that round-trips datetimes and flattens objects"""
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if hasattr(value, "__dict__"):
+        return vars(value)
+    return str(value)
+
+def _decode(value: Dict[str, Any]) -> Any:
+    if "__datetime__" in value and len(value) == 1:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+class RecordView:
+    """
+    Stand-in for a stored object.
+
+    Indexed columns are available immediately; the JSON payload holding the
+    remaining attributes is decoded on first access. Setting an attribute
+    queues the record to be written back.
+    """
+
+    def __init__(self, table: "SQLiteTable", key: str, columns: Dict[str, Any], payload: str):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_columns", columns)
+        object.__setattr__(self, "_payload", payload)
+        object.__setattr__(self, "_fields", None)
+
+    def _decoded(self) -> Dict[str, Any]:
+        fields = object.__getattribute__(self, "_fields")
+        if fields is None:
+            fields = json.loads(object.__getattribute__(self, "_payload"), object_hook=_decode)
+            object.__setattr__(self, "_fields", fields)
+        return fields
+
+    def __getattr__(self, name: str) -> Any:
+        columns = object.__getattribute__(self, "_columns")
+        if name in columns:
+            return columns[name]
+        fields = self._decoded()
+        if name in fields:
+            return fields[name]
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value: Any):
+        columns = object.__getattribute__(self, "_columns")
+        if name in columns:
+            columns[name] = value
+        self._decoded()[name] = value
+        self._table[self._key] = self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self._decoded(), **object.__getattribute__(self, "_columns")}
+
+class SQLiteTable(MutableMapping):
+    """
+    Mapping of key -> record over one table.
+
+    Assignments are buffered and written in batches of batch_size, after
+    flush_interval seconds, or before any query that needs them. Pending
+    objects are returned as-is until flushed.
+    """
+
+    def __init__(self, store: "SQLiteLearningStore", table: str, key_column: str,
+                 columns: Tuple[str, ...] = ()):
+        self.store = store
+        self.table = table
+        self.key_column = key_column
+        self.columns = columns
+        self.pending: Dict[str, Any] = {}
+        # Rows on disk, counted once and then maintained on every write
+        self._count: Optional[int] = None
+        self._counted_version: Optional[int] = None
+        self._select = f"SELECT {', '.join((key_column,) + columns + ('payload',))} FROM {table}"
+        placeholders = ", ".join("?" * (len(columns) + 2))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns + ("payload",))
+        # An upsert keeps the rowid stable, which rows() paginates on
+        self._upsert = (f"INSERT INTO {table} ({', '.join((key_column,) + columns + ('payload',))}) "
+                        f"VALUES ({placeholders}) ON CONFLICT ({key_column}) DO UPDATE SET {updates}")
+
+    def _row(self, key: str, record: Any) -> tuple:
+        fields = record.to_dict() if isinstance(record, RecordView) else vars(record)
+        values = []
+        for column in self.columns:
+            value = fields.get(column)
+            values.append(_to_seconds(value) if isinstance(value, datetime) else value)
+        return (key, *values, json.dumps(fields, default=_encode))
+
+    def _view(self, row: tuple) -> RecordView:
+        key, *values, payload = row
+        columns = dict(zip(self.columns, values))
+        columns[self.key_column] = key
+        if "timestamp" in columns and columns["timestamp"] is not None:
+            columns["timestamp"] = _from_seconds(columns["timestamp"])
+        return RecordView(self, key, columns, payload)
+
+    def _existing(self, keys: List[str]) -> int:
+        """How many of keys already have a row; call with the store lock held"""
+        existing = 0
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            existing += self.store.conn.execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE {self.key_column} IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ).fetchone()[0]
+        return existing
+
+    def _stored_rows(self) -> int:
+        """
+        Rows on disk. The table is only counted again after another
+        connection commits to the database; call with the store lock held.
+        """
+        version = self.store.data_version()
+        if self._count is None or version != self._counted_version:
+            self._count = self.store.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            self._counted_version = version
+        return self._count
+
+    def _removed(self, count: int):
+        """Account for rows deleted by this connection; call with the store lock held"""
+        self._count -= count
+
+    def flush(self):
+        """Write pending records in one transaction"""
+        with self.store.lock:
+            if not self.pending:
+                return
+            keys = list(self.pending)
+            rows = [self._row(key, record) for key, record in self.pending.items()]
+            stored = self._stored_rows()
+            inserted = len(keys) - self._existing(keys)
+            with self.store.conn:
+                self.store.conn.executemany(self._upsert, rows)
+            self._count = stored + inserted
+            self.pending.clear()
+
+    def __setitem__(self, key: str, record: Any):
+        with self.store.lock:
+            self.pending[key] = record
+            full = len(self.pending) >= self.store.batch_size
+        if full:
+            self.flush()
+        else:
+            self.store.schedule_flush()
+
+    def __getitem__(self, key: str) -> Any:
+        with self.store.lock:
+            if key in self.pending:
+                return self.pending[key]
+            row = self.store.conn.execute(f"{self._select} WHERE {self.key_column} = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self._view(row)
+
+    def __delitem__(self, key: str):
+        self.flush()
+        with self.store.lock:
+            self._stored_rows()
+            with self.store.conn:
+                deleted = self.store.conn.execute(f"DELETE FROM {self.table} WHERE {self.key_column} = ?", (key,))
+            self._removed(deleted.rowcount)
+        if deleted.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        with self.store.lock:
+            if key in self.pending:
+                return True
+            return self.store.conn.execute(
+                f"SELECT 1 FROM {self.table} WHERE {self.key_column} = ?", (key,)
+            ).fetchone() is not None
+
+    def __len__(self) -> int:
+        """Maintained row count plus pending records that are not on disk yet; never scans the table"""
+        with self.store.lock:
+            pending = list(self.pending)
+            return self._stored_rows() + len(pending) - self._existing(pending)
+
+    def __iter__(self) -> Iterator[str]:
+        for row in self.rows():
+            yield row[0]
+
+    def rows(self, where: str = "", params: tuple = (), chunk_size: int = 500) -> Iterator[tuple]:
+        """Stream raw rows in chunks using keyset pagination on rowid"""
+        self.flush()
+        last_rowid = -1
+        condition = f"({where}) AND " if where else ""
+        while True:
+            with self.store.lock:
+                chunk = self.store.conn.execute(
+                    f"SELECT rowid, {self._select[len('SELECT '):]} WHERE {condition}rowid > ? "
+                    f"ORDER BY rowid LIMIT ?", (*params, last_rowid, chunk_size)
+                ).fetchall()
+            if not chunk:
+                return
+            last_rowid = chunk[-1][0]
+            for row in chunk:
+                yield row[1:]
+
+    def values(self) -> Iterator[Any]:
+        for row in self.rows():
+            yield self._view(row)
+
+    def snapshot(self) -> Tuple[Iterator[Any], Callable[[str], bool]]:
+        """
+        Stream the records stored as of now, and a test of whether a key was
+        among them. Rows inserted later get higher rowids and are left out.
+        """
+        self.flush()
+        with self.store.lock:
+            last_rowid = self.store.conn.execute(f"SELECT MAX(rowid) FROM {self.table}").fetchone()[0]
+        last_rowid = -1 if last_rowid is None else last_rowid
+
+        def contains(key: str) -> bool:
+            with self.store.lock:
+                row = self.store.conn.execute(
+                    f"SELECT rowid FROM {self.table} WHERE {self.key_column} = ?", (key,)
+                ).fetchone()
+            return row is not None and row[0] <= last_rowid
+
+        return (self._view(row) for row in self.rows("rowid <= ?", (last_rowid,))), contains
+
+    def select(self, where: str, params: tuple = ()) -> Iterator[Any]:
+        """Stream the records matching a SQL condition on the table's columns"""
+        for row in self.rows(where, params):
+            yield self._view(row)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for row in self.rows():
+            yield row[0], self._view(row)
+
+class SQLiteTimeline:
+    """
+    Time-ordered access to error learnings straight from the timestamp index.
+
+    Offers the page/iter_range interface of TimelineIndex without holding
+    any keys in memory.
+    """
+
+    def __init__(self, table: SQLiteTable):
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @staticmethod
+    def encode_cursor(key: Tuple[float, str]) -> str:
+        return base64.urlsafe_b64encode(f"{key[0]!r}|{key[1]}".encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[float, str]:
+        """Parse a cursor; raises ValueError if it is malformed"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            timestamp, error_id = raw.split("|", 1)
+            return float(timestamp), error_id
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    def page(self, limit: int, offset: int = 0, cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Error IDs of one page, newest first, and the cursor of the next page"""
+        self.table.flush()
+        store = self.table.store
+        limit = max(limit, 0)
+        with store.lock:
+            if cursor is not None:
+                rows = store.conn.execute(
+                    "SELECT timestamp, error_id FROM error_learnings WHERE (timestamp, error_id) < (?, ?) "
+                    "ORDER BY timestamp DESC, error_id DESC LIMIT ?", (*self.decode_cursor(cursor), limit + 1)
+                ).fetchall()
+            else:
+                rows = store.conn.execute(
+                    "SELECT timestamp, error_id FROM error_learnings "
+                    "ORDER BY timestamp DESC, error_id DESC LIMIT ? OFFSET ?", (limit + 1, max(offset, 0))
+                ).fetchall()
+
+        page = rows[:limit]
+        next_cursor = self.encode_cursor(page[-1]) if page and len(rows) > limit else None
+        return [error_id for _, error_id in page], next_cursor
+
+    def iter_range(self, start: float = float("-inf"), end: float = float("inf"),
+                   chunk_size: int = 500) -> Iterable[List[str]]:
+        """Error IDs with start <= timestamp < end, oldest first, in chunks"""
+        self.table.flush()
+        store = self.table.store
+        # start/end are epoch seconds (datetime.timestamp()); the table stores wall-clock seconds
+        position = (_to_seconds(datetime.fromtimestamp(start)) if start != float("-inf") else start, "")
+        end = _to_seconds(datetime.fromtimestamp(end)) if end != float("inf") else end
+        while True:
+            with store.lock:
+                rows = store.conn.execute(
+                    "SELECT timestamp, error_id FROM error_learnings WHERE (timestamp, error_id) > (?, ?) "
+                    "AND timestamp < ? ORDER BY timestamp, error_id LIMIT ?", (*position, end, chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [error_id for _, error_id in rows]
+            position = rows[-1]
+
+class SQLiteLearningStore:
+    """SQLite (WAL) tables behind error_learnings and success_patterns"""
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self._flush_timer: Optional[threading.Timer] = None
+
+        self.conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS error_learnings ("
+                " error_id TEXT PRIMARY KEY, error_type TEXT, agent_name TEXT, timestamp REAL,"
+                " prevented_count INTEGER, error_message TEXT, payload TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_error_learnings_timestamp"
+                              " ON error_learnings (timestamp, error_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_error_learnings_type ON error_learnings (error_type)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_error_learnings_agent ON error_learnings (agent_name)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS success_patterns ("
+                " pattern_id TEXT PRIMARY KEY, payload TEXT NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS learning_rollups ("
+                " period TEXT NOT NULL, bucket_start REAL NOT NULL, error_type TEXT NOT NULL,"
+                " agent_name TEXT NOT NULL, template TEXT NOT NULL, count INTEGER NOT NULL,"
+                " prevented INTEGER NOT NULL,"
+                " PRIMARY KEY (period, bucket_start, error_type, agent_name, template))"
+            )
+
+        self.error_learnings = SQLiteTable(
+            self, "error_learnings", "error_id",
+            ("error_type", "agent_name", "timestamp", "prevented_count", "error_message")
+        )
+        self.success_patterns = SQLiteTable(self, "success_patterns", "pattern_id")
+        self.timeline = SQLiteTimeline(self.error_learnings)
+
+    def load_rollups(self) -> List[tuple]:
+        """Every rollup row as (period, bucket_start, error_type, agent_name, template, count, prevented)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT period, bucket_start, error_type, agent_name, template, count, prevented"
+                " FROM learning_rollups"
+            ).fetchall()
+        return [(period, _from_seconds(start), *rest) for period, start, *rest in rows]
+
+    def apply_compaction(self, upserts: List[tuple], removed: List[tuple], deleted_ids: List[str]):
+        """
+        Write changed rollup rows, drop merged ones and delete the compacted
+        learnings in a single transaction, so a crash never counts a
+        learning twice or loses it.
+        """
+        self.error_learnings.flush()
+        with self.lock:
+            self.error_learnings._stored_rows()
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO learning_rollups (period, bucket_start, error_type, agent_name, template, count,"
+                    " prevented) VALUES (?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (period, bucket_start, error_type, agent_name, template)"
+                    " DO UPDATE SET count = excluded.count, prevented = excluded.prevented",
+                    [(period, _to_seconds(start), *rest) for period, start, *rest in upserts]
+                )
+                self.conn.executemany(
+                    "DELETE FROM learning_rollups WHERE period = ? AND bucket_start = ? AND error_type = ?"
+                    " AND agent_name = ? AND template = ?",
+                    [(period, _to_seconds(start), *rest) for period, start, *rest in removed]
+                )
+                deleted = self.conn.executemany("DELETE FROM error_learnings WHERE error_id = ?",
+                                                [(error_id,) for error_id in deleted_ids])
+            self.error_learnings._removed(deleted.rowcount)
+
+    def day_totals(self, start: float, end: float) -> List[tuple]:
+        """
+        Learnings with start <= timestamp < end (wall-clock seconds),
+        compacted ones included, as (day, error_type, agent_name, count,
+        prevented) rows grouped by day since 1970-01-01, type and agent.
+        """
+        self.error_learnings.flush()
+        with self.lock:
+            return self.conn.execute(
+                "SELECT CAST(timestamp / 86400 AS INTEGER) AS day, error_type, agent_name, COUNT(*),"
+                " COALESCE(SUM(prevented_count), 0) FROM error_learnings WHERE timestamp >= ? AND timestamp < ?"
+                " GROUP BY day, error_type, agent_name"
+                " UNION ALL "
+                "SELECT CAST(bucket_start / 86400 AS INTEGER) AS day, error_type, agent_name, SUM(count),"
+                " SUM(prevented) FROM learning_rollups WHERE bucket_start >= ? AND bucket_start < ?"
+                " GROUP BY day, error_type, agent_name",
+                (start, end, start, end)
+            ).fetchall()
+
+    def data_version(self) -> int:
+        """Changes whenever another connection commits to the database"""
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def schedule_flush(self):
+        """Flush pending writes after flush_interval unless a batch fills first"""
+        with self.lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        with self.lock:
+            self._flush_timer = None
+        try:
+            self.error_learnings.flush()
+            self.success_patterns.flush()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to flush learning store: {e}")
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+def attach_sqlite_store(db: Any, path: str) -> SQLiteLearningStore:
+    """
+    Point a learning database's error_learnings and success_patterns at
+    SQLite, migrating any records it already holds in memory.
+    """
+    store = SQLiteLearningStore(path)
+    for name in ("error_learnings", "success_patterns"):
+        table = getattr(store, name)
+        for key, record in dict(getattr(db, name, {})).items():
+            table[key] = record
+        setattr(db, name, table)
+    store.flush()
+    return store
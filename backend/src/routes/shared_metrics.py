@@ -0,0 +1,323 @@
+"""
+Shared-Memory Metrics Registry
+
+Lets every worker process publish counters, gauges and histograms into one
+memory-mapped file so any worker can report cluster-wide totals without IPC
+round trips.
+
+Each worker owns one fixed-layout row of 64-bit slots and is the only process
+writing that row, so updates need no cross-process locks: every update ends in
+a single aligned 8-byte store that readers can never observe half-written.
+Readers sum the rows. A file lock is only taken when a worker claims its row.
+Threads within a worker (request handlers, the event loop) serialize their
+read-modify-write updates on a process-local lock.
+
+The file name carries a hash of the layout, so workers of a release with a
+different layout (e.g. during a rolling deploy) use their own file instead of
+resizing one that live workers still have mapped.
+"""
+
+import atexit
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fixed layout shared by every worker. Changing it changes the layout hash
+# and with it the name of the file the workers share.
+METRIC_COUNTERS = [
+    "total_connections",
+    "failed_connections",
+    "total_messages",
+    "failed_messages",
+    "learning_applications",
+    "patterns_learned",
+    "oversized_messages",
+    "control_frames",
+    "learnings_captured",
+]
+METRIC_GAUGES = [
+    "active_connections",
+    "average_latency",
+]
+METRIC_HISTOGRAMS = {
+    "delivery_latency_ms": [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500],
+}
+
+_MAGIC = b"CBMETRC2"
+_HEADER = struct.Struct("<8sQQQ")  # magic, layout hash, max workers, row slots
+_HEADER_SLOTS = 8  # header padded to 64 bytes
+_OWNER_SLOTS = 2  # pid and process start time of the worker owning a row
+
+class SharedMetricsRegistry:
+    """Per-worker rows of counters, gauges and histograms in a shared mmap"""
+
+    def __init__(self, path: str, max_workers: int = 64,
+                 counters: List[str] = METRIC_COUNTERS,
+                 gauges: List[str] = METRIC_GAUGES,
+                 histograms: Dict[str, List[float]] = METRIC_HISTOGRAMS):
+        self.max_workers = max_workers
+        self.counters = list(counters)
+        self.gauges = list(gauges)
+        self.histograms = {name: list(bounds) for name, bounds in histograms.items()}
+
+        # Row layout: owner pid and start time, counters, gauges, then per
+        # histogram one slot per bucket (plus overflow), the sum and the count
+        self._offsets: Dict[str, int] = {}
+        slot = _OWNER_SLOTS
+        for name in self.counters + self.gauges:
+            self._offsets[name] = slot
+            slot += 1
+        for name, bounds in self.histograms.items():
+            self._offsets[name] = slot
+            slot += len(bounds) + 3
+        self.row_slots = slot
+
+        layout = repr((self.counters, self.gauges, sorted(self.histograms.items()), max_workers))
+        self._layout_hash = int.from_bytes(hashlib.sha1(layout.encode()).digest()[:8], "little")
+        self.path = f"{path}.{self._layout_hash:016x}"
+
+        size = (_HEADER_SLOTS + max_workers * self.row_slots) * 8
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            self._initialize(size)
+            self._map = mmap.mmap(self._fd, size)
+            self._slots = memoryview(self._map).cast("q")
+            self._floats = memoryview(self._map).cast("d")
+            self.row = self._claim_row()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self.pid = os.getpid()
+        self._base = self._row_start(self.row)
+        self._row_lock = threading.Lock()
+        # Counters inherited from a dead worker's row are kept so totals stay monotonic
+        self._inherited = {name: self._slots[self._base + self._offsets[name]] for name in self.counters}
+        atexit.register(self.release)
+
+    def _initialize(self, size: int):
+        """
+        Create the file if it is new or unusable. A file with a different
+        layout is never resized while a live worker may have it mapped;
+        shrinking a mapped file makes that worker fault with SIGBUS.
+        """
+        header = os.pread(self._fd, _HEADER.size, 0)
+        if len(header) == _HEADER.size:
+            magic, layout_hash, max_workers, row_slots = _HEADER.unpack(header)
+            if magic == _MAGIC and layout_hash == self._layout_hash and os.fstat(self._fd).st_size == size:
+                return
+            if magic == _MAGIC and self._has_live_rows(max_workers, row_slots):
+                raise RuntimeError(f"{self.path} has a different layout and is in use by live workers")
+
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, size)
+        os.pwrite(self._fd, _HEADER.pack(_MAGIC, self._layout_hash, self.max_workers, self.row_slots), 0)
+
+    def _has_live_rows(self, max_workers: int, row_slots: int) -> bool:
+        """Whether any row of a file written with another layout has a live owner"""
+        for row in range(max_workers):
+            owner = os.pread(self._fd, 16, (_HEADER_SLOTS + row * row_slots) * 8)
+            if len(owner) < 16:
+                return False
+            if _owner_alive(*struct.unpack("<qq", owner)):
+                return True
+        return False
+
+    def _row_start(self, row: int) -> int:
+        return _HEADER_SLOTS + row * self.row_slots
+
+    def _claim_row(self) -> int:
+        """Take a free row, or the row of a worker that has exited"""
+        pid = os.getpid()
+        for row in range(self.max_workers):
+            start = self._row_start(row)
+            if not _owner_alive(self._slots[start], self._slots[start + 1]):
+                for name in self.gauges:
+                    self._floats[start + self._offsets[name]] = 0.0
+                self._slots[start + 1] = _process_start_time(pid)
+                self._slots[start] = pid
+                return row
+        raise RuntimeError(f"All {self.max_workers} shared metrics rows are in use")
+
+    def release(self):
+        """Give up this worker's row; its counters remain part of the totals"""
+        if self._map.closed or self.pid != os.getpid():
+            return
+        for name in self.gauges:
+            self._floats[self._base + self._offsets[name]] = 0.0
+        self._slots[self._base] = 0
+        self._slots[self._base + 1] = 0
+
+    # Updates from the owning worker
+    def increment(self, name: str, value: int = 1):
+        with self._row_lock:
+            self._slots[self._base + self._offsets[name]] += value
+
+    def set_counter(self, name: str, value: int):
+        """Publish this worker's absolute count for a counter"""
+        self._slots[self._base + self._offsets[name]] = self._inherited[name] + int(value)
+
+    def set_gauge(self, name: str, value: float):
+        self._floats[self._base + self._offsets[name]] = float(value)
+
+    def observe(self, name: str, value: float):
+        """Record one histogram observation"""
+        bounds = self.histograms[name]
+        start = self._base + self._offsets[name]
+        bucket = len(bounds)
+        for position, bound in enumerate(bounds):
+            if value <= bound:
+                bucket = position
+                break
+        with self._row_lock:
+            self._slots[start + bucket] += 1
+            self._slots[start + len(bounds) + 1] += int(value * 1000)  # sum in thousandths
+            self._slots[start + len(bounds) + 2] += 1
+
+    # Reads from any worker
+    def snapshot(self) -> Dict[str, Any]:
+        """Cluster-wide totals summed directly from every worker's row"""
+        counters = {name: 0 for name in self.counters}
+        gauges = {name: {"sum": 0.0, "max": 0.0} for name in self.gauges}
+        histograms = {name: [0] * (len(bounds) + 3) for name, bounds in self.histograms.items()}
+        workers = 0
+
+        for row in range(self.max_workers):
+            start = self._row_start(row)
+            # Gauges of workers that died without releasing their row are ignored
+            alive = _owner_alive(self._slots[start], self._slots[start + 1])
+            workers += alive
+
+            for name in self.counters:
+                counters[name] += self._slots[start + self._offsets[name]]
+            if alive:
+                for name in self.gauges:
+                    value = self._floats[start + self._offsets[name]]
+                    gauges[name]["sum"] += value
+                    gauges[name]["max"] = max(gauges[name]["max"], value)
+            for name, totals in histograms.items():
+                offset = start + self._offsets[name]
+                for position in range(len(totals)):
+                    totals[position] += self._slots[offset + position]
+
+        return {
+            "workers": workers,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {
+                name: self._summarize_histogram(self.histograms[name], totals)
+                for name, totals in histograms.items()
+            }
+        }
+
+    @staticmethod
+    def _summarize_histogram(bounds: List[float], totals: List[int]) -> Dict[str, Any]:
+        buckets = totals[:len(bounds) + 1]
+        count = totals[len(bounds) + 2]
+
+        def quantile(q: float) -> Optional[float]:
+            if count == 0:
+                return None
+            rank = q * count
+            seen = 0
+            for position, bucket_count in enumerate(buckets):
+                seen += bucket_count
+                if seen >= rank:
+                    return bounds[position] if position < len(bounds) else float("inf")
+            return float("inf")
+
+        return {
+            "count": count,
+            "mean": totals[len(bounds) + 1] / 1000 / count if count else 0.0,
+            "p50_upper_bound": quantile(0.5),
+            "p99_upper_bound": quantile(0.99),
+            "buckets": {
+                **{f"le_{bound}": buckets[position] for position, bound in enumerate(bounds)},
+                "le_inf": buckets[len(bounds)]
+            }
+        }
+
+class SharedMetricsDict(dict):
+    """
+    Metrics dict that publishes registry-backed keys on every assignment.
+
+    Drop-in replacement for a plain performance_metrics dict: existing
+    `metrics[key] += 1` updates keep working and also reach shared memory.
+    """
+
+    def __init__(self, registry: Optional[SharedMetricsRegistry], *args, **kwargs):
+        self._registry = registry
+        super().__init__(*args, **kwargs)
+        for key, value in self.items():
+            self._publish(key, value)
+
+    def __setitem__(self, key: str, value: Any):
+        super().__setitem__(key, value)
+        self._publish(key, value)
+
+    def _publish(self, key: str, value: Any):
+        registry = self._registry
+        if registry is None:
+            return
+        if key in registry._inherited:
+            registry.set_counter(key, value)
+        elif key in registry.gauges:
+            registry.set_gauge(key, value)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _process_start_time(pid: int) -> int:
+    """Start time of a process in clock ticks since boot, or 0 where unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+        # Fields after the parenthesized command name; starttime is field 22
+        return int(stat[stat.rindex(b")") + 2:].split()[19])
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def _owner_alive(pid: int, start_time: int) -> bool:
+    """Whether a row's owner still runs; a reused pid has a different start time"""
+    if pid == 0 or not _pid_alive(pid):
+        return False
+    return start_time == 0 or _process_start_time(pid) in (0, start_time)
+
+def _default_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "callabo-metrics")
+
+# Global registry instance
+_registry_instance = None
+_registry_unavailable = False
+
+def get_shared_metrics() -> Optional[SharedMetricsRegistry]:
+    """Get this worker's registry, or None if shared metrics are disabled or unavailable"""
+    global _registry_instance, _registry_unavailable
+    if _registry_instance is not None and _registry_instance.pid != os.getpid():
+        # Forked from a process that already had a row; claim our own
+        _registry_instance = None
+    if _registry_instance is None and not _registry_unavailable:
+        if os.environ.get("CALLABO_SHARED_METRICS", "1") == "0":
+            _registry_unavailable = True
+            return None
+        try:
+            _registry_instance = SharedMetricsRegistry(os.environ.get("CALLABO_METRICS_PATH", _default_path()))
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Shared metrics unavailable, falling back to per-worker metrics: {e}")
+            _registry_unavailable = True
+    return _registry_instance
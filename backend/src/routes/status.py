@@ -13,6 +13,13 @@ except ImportError:
     # Fallback for deployment issues
     pass
 
+# Cross-worker metrics are optional; without them only this worker is reported
+try:
+    from api.shared_metrics import get_shared_metrics
+except ImportError:
+    def get_shared_metrics():
+        return None
+
 # Import auth decorators separately
 try:
     from auth.vercel_auth import optional_auth_vercel, handle_cors_preflight
@@ -45,6 +52,7 @@ class handler(BaseHTTPRequestHandler):
                     "system_status": status,
                     "health": health,
                     "metrics": metrics,
+                    "cluster_metrics": get_shared_metrics().snapshot() if get_shared_metrics() else None,
                     "deployment": "vercel",
                     "environment": "production",
                     "authenticated": getattr(self, 'is_authenticated', False)
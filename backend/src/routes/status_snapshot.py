@@ -0,0 +1,106 @@
+"""
+Status Snapshot
+
+Keeps a cached snapshot of slow status sources, refreshed in the background.
+Components are gathered concurrently with a timeout each, so one slow or
+hung component never delays readers: they get the last good value along
+with its age (stale-while-revalidate).
+"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class StatusSnapshot:
+    """
+    Background-refreshed snapshot of named status components.
+
+    Each component is a callable returning a dict. Every refresh_interval
+    seconds all components are called concurrently; a component that does
+    not answer within component_timeout keeps its previous value. A
+    component still running from an earlier refresh is not called again
+    until it returns.
+    """
+
+    def __init__(self, components: Dict[str, Callable[[], Dict[str, Any]]],
+                 refresh_interval: float = 5.0, component_timeout: float = 2.0):
+        self.components = components
+        self.refresh_interval = refresh_interval
+        self.component_timeout = component_timeout
+        self.entries: Dict[str, Dict[str, Any]] = {
+            name: {"data": None, "updated_at": None, "error": None} for name in components
+        }
+        self.refreshes = 0
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(components), thread_name_prefix="status-component"
+        )
+        self._in_flight: Dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._first_refresh = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop,
+                                                   name="status-snapshot", daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Status snapshot refresh failed: {e}")
+            self._first_refresh.set()
+            time.sleep(self.refresh_interval)
+
+    def refresh(self):
+        """Gather every component concurrently and store whatever completes in time"""
+        futures = {}
+        for name, component in self.components.items():
+            previous = self._in_flight.get(name)
+            if previous is not None and not previous.done():
+                self.entries[name]["error"] = "still running from an earlier refresh"
+                continue
+            futures[name] = self._in_flight[name] = self._executor.submit(component)
+
+        concurrent.futures.wait(futures.values(), timeout=self.component_timeout)
+        now = time.time()
+        for name, future in futures.items():
+            entry = self.entries[name]
+            if not future.done():
+                entry["error"] = f"timed out after {self.component_timeout}s"
+            elif future.exception() is not None:
+                entry["error"] = str(future.exception())
+            else:
+                self.entries[name] = {"data": future.result(), "updated_at": now, "error": None}
+        self.refreshes += 1
+
+    def get(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Latest value of every component with its age.
+
+        Never waits for a refresh, except for the very first one (bounded
+        by the component timeout). A component is marked stale once its
+        data is older than two refresh intervals.
+        """
+        self._ensure_started()
+        self._first_refresh.wait(self.component_timeout + 1.0)
+
+        now = time.time()
+        result = {}
+        for name, entry in list(self.entries.items()):
+            age = now - entry["updated_at"] if entry["updated_at"] is not None else None
+            result[name] = {
+                "data": entry["data"] if entry["data"] is not None else {},
+                "age_seconds": round(age, 3) if age is not None else None,
+                "stale": age is None or age > 2 * self.refresh_interval,
+                "error": entry["error"]
+            }
+        return result
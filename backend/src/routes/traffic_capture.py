@@ -0,0 +1,304 @@
+"""
+WebSocket Traffic Capture and Replay
+
+Records the shape of live WebSocket traffic (timestamps, directions, message
+types and sizes, with anonymized client IDs) to a compact binary log, and
+replays such a log against a local LearningWebSocketManager to measure
+latency and throughput under a realistic message mix.
+
+Payloads are never captured; replay synthesizes frames of the recorded type
+and size.
+
+Usage:
+    python -m api.traffic_capture capture.bin --speed 10
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Iterator, BinaryIO
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b"WSCAP1\n"
+DIRECTION_INBOUND = 0
+DIRECTION_OUTBOUND = 1
+
+# Types recorded for inbound frames the server rejected before parsing a type
+MSG_TYPE_INVALID = "invalid"
+MSG_TYPE_OVERSIZED = "oversized"
+
+# timestamp (s), direction, anonymized client, frame size (bytes), type length
+_RECORD = struct.Struct("<dBIIB")
+
+# Frames the server produces by itself in response to replayed traffic
+_SERVER_GENERATED_TYPES = {"welcome", "pong", "subscription_ack"}
+
+@dataclass
+class CapturedFrame:
+    """One frame from a capture log"""
+    timestamp: float
+    direction: int
+    client: int
+    size: int
+    msg_type: str
+
+class TrafficCapture:
+    """
+    Sampled, anonymizing writer for the capture log.
+
+    Sampling is per client so every sampled client's full frame sequence is
+    kept. Client IDs are replaced with a 32-bit keyed hash whose salt only
+    lives for the duration of the capture.
+    """
+
+    def __init__(self, path: str, sample_rate: float = 1.0, buffer_size: int = 64 * 1024):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._salt = os.urandom(16)
+        self._sampled: Dict[str, Optional[int]] = {}
+        self._file: BinaryIO = open(path, "ab", buffering=buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+        self.frames_recorded = 0
+
+    def _anonymize(self, client_id: str) -> Optional[int]:
+        """Anonymized client number, or None if the client is not sampled"""
+        if client_id not in self._sampled:
+            digest = hashlib.blake2b(client_id.encode(), key=self._salt, digest_size=4).digest()
+            anonymous = int.from_bytes(digest, "little")
+            self._sampled[client_id] = anonymous if anonymous / 2 ** 32 < self.sample_rate else None
+        return self._sampled[client_id]
+
+    def record(self, direction: int, client_id: str, msg_type: str, size: int):
+        """Append one frame record if its client is sampled"""
+        anonymous = self._anonymize(client_id)
+        if anonymous is None:
+            return
+
+        type_bytes = msg_type.encode()[:255]
+        self._file.write(_RECORD.pack(time.time(), direction, anonymous, size, len(type_bytes)))
+        self._file.write(type_bytes)
+        self.frames_recorded += 1
+
+    def forget_client(self, client_id: str):
+        """Drop the sampling decision for a departed client"""
+        self._sampled.pop(client_id, None)
+
+    def close(self):
+        self._file.close()
+
+def read_capture(path: str) -> Iterator[CapturedFrame]:
+    """Iterate over the frames of a capture log"""
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a traffic capture log")
+
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            timestamp, direction, client, size, type_length = _RECORD.unpack(header)
+            yield CapturedFrame(timestamp, direction, client, size, f.read(type_length).decode())
+
+def _synthesize(msg_type: str, size: int, extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a message of the given type padded to roughly the recorded size"""
+    message = {"type": msg_type, **extra}
+    padding = size - len(json.dumps(message)) - len(', "padding": ""')
+    if padding > 0:
+        message["padding"] = "x" * padding
+    return message
+
+def _decode_frames(frame: Any) -> List[Dict[str, Any]]:
+    """Decode a server frame, undoing compression and batching"""
+    if isinstance(frame, str) and frame[:1] == "!":
+        return []  # Compact control frame
+    try:
+        message = json.loads(frame)
+    except (ValueError, UnicodeDecodeError):
+        message = json.loads(gzip.decompress(frame.encode("latin1")))
+    return message["messages"] if message.get("type") == "batch" else [message]
+
+class TrafficReplayer:
+    """
+    Replays a capture log against a local server.
+
+    Inbound frames are sent by one local client per captured client.
+    Outbound frames recorded at the same moment with the same type are
+    grouped back into one broadcast to the corresponding clients.
+    Frames the server generates by itself (welcome, pong, acks) are not
+    injected; the server produces them in response to the replayed traffic.
+    """
+
+    def __init__(self, manager, frames: List[CapturedFrame], speed: float = 1.0,
+                 broadcast_window: float = 0.005):
+        self.manager = manager
+        self.frames = frames
+        self.speed = speed  # 0 replays as fast as possible
+        self.broadcast_window = broadcast_window
+        self.server_ids: Dict[int, str] = {}
+        self.sockets: Dict[int, Any] = {}
+        self.latencies: List[float] = []
+        self.frames_received = 0
+        self.bytes_sent = 0
+        self.max_schedule_lag = 0.0
+
+    async def run(self) -> Dict[str, Any]:
+        """Replay every frame and return the latency and throughput report"""
+        await self._connect_clients()
+        receivers = [asyncio.create_task(self._receive(ws)) for ws in self.sockets.values()]
+
+        started = time.perf_counter()
+        frames_sent = 0
+        for offset, group in self._schedule():
+            if self.speed:
+                delay = started + offset / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.max_schedule_lag = max(self.max_schedule_lag, -delay)
+            frames_sent += await self._replay_group(group)
+        elapsed = time.perf_counter() - started
+
+        # Let in-flight deliveries land before measuring
+        await asyncio.sleep(0.5)
+        for task in receivers:
+            task.cancel()
+        for ws in self.sockets.values():
+            await ws.close()
+
+        latencies = sorted(self.latencies)
+        return {
+            "captured_frames": len(self.frames),
+            "clients": len(self.sockets),
+            "speed": self.speed or "max",
+            "frames_sent": frames_sent,
+            "frames_received": self.frames_received,
+            "elapsed_seconds": elapsed,
+            "frames_per_second": (frames_sent + self.frames_received) / elapsed if elapsed else 0.0,
+            "bytes_per_second": self.bytes_sent / elapsed if elapsed else 0.0,
+            "latency_p50_ms": latencies[len(latencies) // 2] if latencies else None,
+            "latency_p99_ms": latencies[int(len(latencies) * 0.99)] if latencies else None,
+            "max_schedule_lag_ms": self.max_schedule_lag * 1000
+        }
+
+    async def _connect_clients(self):
+        """Open one connection per captured client and learn its server-side ID"""
+        port = self.manager.server.sockets[0].getsockname()[1]
+        for client in sorted({frame.client for frame in self.frames}):
+            ws = await websockets.connect(f"ws://127.0.0.1:{port}", max_size=None)
+            welcome = json.loads(await ws.recv())
+            self.sockets[client] = ws
+            self.server_ids[client] = welcome["client_id"]
+
+    def _schedule(self) -> Iterator[tuple]:
+        """Yield (offset seconds, frames) with co-timed outbound frames grouped"""
+        if not self.frames:
+            return
+        origin = self.frames[0].timestamp
+        group: List[CapturedFrame] = []
+
+        for frame in self.frames:
+            if frame.direction == DIRECTION_OUTBOUND and frame.msg_type in _SERVER_GENERATED_TYPES:
+                continue
+            if frame.direction == DIRECTION_INBOUND and frame.msg_type == MSG_TYPE_OVERSIZED:
+                continue  # The server closes the connection; the client could not replay further
+            if group and not (frame.direction == DIRECTION_OUTBOUND and
+                              group[0].direction == DIRECTION_OUTBOUND and
+                              frame.msg_type == group[0].msg_type and
+                              frame.timestamp - group[0].timestamp <= self.broadcast_window and
+                              all(member.client != frame.client for member in group)):
+                yield group[0].timestamp - origin, group
+                group = []
+            group.append(frame)
+        if group:
+            yield group[0].timestamp - origin, group
+
+    async def _replay_group(self, group: List[CapturedFrame]) -> int:
+        """Send one scheduled group; returns the number of frames it produced"""
+        first = group[0]
+        if first.direction == DIRECTION_INBOUND:
+            if first.msg_type == MSG_TYPE_INVALID:
+                payload = "x" * first.size  # Not JSON, like the frame that was rejected
+            else:
+                payload = json.dumps(_synthesize(first.msg_type, first.size, {}))
+            await self.sockets[first.client].send(payload)
+            self.bytes_sent += first.size
+            return 1
+
+        targets = [self.server_ids[frame.client] for frame in group]
+        message = _synthesize(first.msg_type, max(frame.size for frame in group),
+                              {"replay_sent_at": time.time()})
+        await self.manager.broadcast_with_learning(message, target_clients=targets)
+        self.bytes_sent += sum(frame.size for frame in group)
+        return len(group)
+
+    async def _receive(self, ws):
+        """Consume server frames, measuring latency of replayed broadcasts"""
+        async for frame in ws:
+            for message in _decode_frames(frame):
+                self.frames_received += 1
+                sent_at = message.get("replay_sent_at")
+                if sent_at is not None:
+                    self.latencies.append((time.time() - sent_at) * 1000)
+                    message_id = message.get("_message_id")
+                    if message_id:
+                        await ws.send(f"!a{message_id}")
+
+async def replay_capture(path: str, speed: float = 1.0, runtime_profile: str = "default") -> Dict[str, Any]:
+    """Start a local manager on an ephemeral port and replay a capture against it"""
+    from api.websocket_manager import LearningWebSocketManager, TokenBucket
+
+    frames = sorted(read_capture(path), key=lambda frame: frame.timestamp)
+    manager = LearningWebSocketManager("127.0.0.1", 0, runtime_profile=runtime_profile,
+                                       publish_shared_metrics=False)
+    manager.deduplication_enabled = False
+    manager.max_connections_per_host = manager.max_connections  # All replay clients are local
+    manager.accept_bucket = TokenBucket(rate=1000.0, burst=max(len(frames), 1))
+    await manager.start_server()
+
+    try:
+        report = await TrafficReplayer(manager, frames, speed=speed).run()
+    finally:
+        await manager.stop_server()
+
+    report["runtime_profile"] = runtime_profile
+    return report
+
+def summarize_capture(path: str) -> Dict[str, Any]:
+    """Message mix of a capture log by direction and type"""
+    mix: Dict[str, Dict[str, int]] = defaultdict(lambda: {"frames": 0, "bytes": 0})
+    clients = set()
+    first = last = None
+    for frame in read_capture(path):
+        key = f"{'in' if frame.direction == DIRECTION_INBOUND else 'out'}:{frame.msg_type}"
+        mix[key]["frames"] += 1
+        mix[key]["bytes"] += frame.size
+        clients.add(frame.client)
+        first = frame.timestamp if first is None else min(first, frame.timestamp)
+        last = frame.timestamp if last is None else max(last, frame.timestamp)
+    return {"clients": len(clients), "duration_seconds": (last - first) if first else 0.0, "mix": dict(mix)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a WebSocket traffic capture")
+    parser.add_argument("capture", help="capture log written by TrafficCapture")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier, 0 for max")
+    parser.add_argument("--profile", default="default", help="runtime profile of the local server")
+    parser.add_argument("--summary", action="store_true", help="print the message mix and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.summary:
+        print(json.dumps(summarize_capture(args.capture), indent=2))
+    else:
+        print(json.dumps(asyncio.run(replay_capture(args.capture, args.speed, args.profile)), indent=2))
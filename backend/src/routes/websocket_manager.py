@@ -6,23 +6,113 @@ its connection handling, message delivery, and error recovery strategies.
 """
 
 import asyncio
+import http
 import json
 import logging
+import os
+import sqlite3
+import random
+import math
+import secrets
+import socket
+import queue
+import threading
+import concurrent.futures
+import functools
+from contextlib import nullcontext, contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Set
-from dataclasses import dataclass, field
-from collections import deque, defaultdict
+from typing import Dict, Any, List, Optional, Set, Tuple, FrozenSet, Callable
+from urllib.parse import urlparse, parse_qs
+from dataclasses import dataclass, field, asdict
+from collections import deque, defaultdict, OrderedDict
 import websockets
 from websockets.server import WebSocketServerProtocol
 import hashlib
+import heapq
+import re
+import sys
 import gzip
 import time
 
 from agent_learning import AgentLearningSystem, RootCauseAnalyzer
 from monitoring import get_monitor
+from api.traffic_capture import (
+    TrafficCapture, DIRECTION_INBOUND, DIRECTION_OUTBOUND, MSG_TYPE_INVALID, MSG_TYPE_OVERSIZED
+)
+from api.shared_metrics import SharedMetricsDict, get_shared_metrics
+
+try:
+    import uvloop
+except ImportError:
+    # uvloop is optional; the default asyncio loop is used without it
+    uvloop = None
 
 logger = logging.getLogger(__name__)
 
+# Compact control frames, negotiated through the "compact_control" capability.
+# The prefix can never start a JSON document, so other frames fall back to JSON.
+CONTROL_PREFIX = "!"
+CONTROL_PING = "!p"  # optionally followed by an opaque client token
+CONTROL_PONG = "!P"  # echoes the ping's token
+CONTROL_ACK = "!a"  # followed by the acknowledged message id
+
+class SubmissionQueueFull(Exception):
+    """Raised to synchronous callers when the broadcast submission queue is full"""
+
+@dataclass
+class RuntimeProfile:
+    """Event loop, socket and websockets buffer settings for the server"""
+    name: str
+    ping_interval: float = 30
+    ping_timeout: float = 10
+    max_size: int = 1024 * 1024  # largest inbound message in bytes
+    max_queue: int = 32  # inbound messages buffered per connection
+    read_limit: int = 2 ** 16  # inbound stream buffer high-water mark
+    write_limit: int = 2 ** 16  # outbound buffer high-water mark
+    # TCP_NODELAY is not a profile option: asyncio (and uvloop) already set
+    # it on every TCP transport
+    tcp_keepalive: bool = False
+    keepalive_idle: int = 60  # seconds before the first keepalive probe
+    use_uvloop: bool = False
+
+RUNTIME_PROFILES: Dict[str, RuntimeProfile] = {
+    # Matches the settings the server always used
+    "default": RuntimeProfile("default"),
+    # Small buffers push backpressure upstream early and keep queueing delay low
+    "low-latency": RuntimeProfile(
+        "low-latency", ping_interval=20, max_queue=16, write_limit=2 ** 14,
+        tcp_keepalive=True, use_uvloop=True
+    ),
+    # Large write buffers absorb broadcast bursts to many mostly-receiving clients
+    "high-fan-out": RuntimeProfile(
+        "high-fan-out", ping_interval=60, ping_timeout=20, max_queue=8,
+        read_limit=2 ** 14, write_limit=2 ** 18,
+        tcp_keepalive=True, use_uvloop=True
+    ),
+    # Minimal per-connection buffering for constrained hosts
+    "memory-lean": RuntimeProfile(
+        "memory-lean", max_size=256 * 1024, max_queue=4,
+        read_limit=2 ** 13, write_limit=2 ** 13, tcp_keepalive=True
+    ),
+}
+
+def get_runtime_profile(name: str) -> RuntimeProfile:
+    """Look up a runtime profile by name, failing clearly on unknown names"""
+    try:
+        return RUNTIME_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown runtime profile '{name}'; valid profiles: "
+                         f"{', '.join(sorted(RUNTIME_PROFILES))}") from None
+
+def install_event_loop(profile: RuntimeProfile) -> str:
+    """Install uvloop if the profile asks for it; must run before the loop starts"""
+    if profile.use_uvloop and uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return "uvloop"
+    if profile.use_uvloop:
+        logger.warning(f"Runtime profile {profile.name} requests uvloop but it is not installed")
+    return "asyncio"
+
 @dataclass
 class ConnectionInfo:
     """Information about a WebSocket connection"""
@@ -31,9 +121,38 @@ class ConnectionInfo:
     connected_at: datetime
     last_ping: datetime
     failed_sends: int = 0
-    total_messages: int = 0
+    total_messages: int = 0  # inbound messages
     client_type: str = "unknown"
     connection_quality: float = 1.0  # 0.0 to 1.0
+    user_id: Optional[str] = None
+    organization_id: Optional[str] = None
+    sent_messages: int = 0
+    rtt_ewma_ms: Optional[float] = None  # exponentially weighted ack round trip
+    failure_ewma: float = 0.0  # exponentially weighted send failure rate
+    quality_updated_at: float = field(default_factory=time.monotonic)
+    frames_in: int = 0
+    frames_out: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0  # on the wire, after compression
+    raw_bytes_out: int = 0  # before compression
+    remote_host: Optional[str] = None
+    client_capabilities: FrozenSet[str] = frozenset()  # declared in the handshake
+
+@dataclass
+class DeliveryLane:
+    """Delivery settings for clients within one connection quality band"""
+    name: str
+    min_quality: float
+    compression_level: int  # gzip level
+    compression_threshold_factor: float  # multiplier on the manager's threshold
+    coalesce_ms: int = 0  # 0 sends immediately, otherwise batch for this long
+
+# Ordered best to worst; a client uses the first lane its quality reaches
+DELIVERY_LANES = [
+    DeliveryLane("realtime", 0.8, compression_level=1, compression_threshold_factor=1.0),
+    DeliveryLane("degraded", 0.5, compression_level=6, compression_threshold_factor=0.5),
+    DeliveryLane("constrained", 0.0, compression_level=9, compression_threshold_factor=0.25, coalesce_ms=250),
+]
 
 @dataclass
 class MessageDeliveryRecord:
@@ -45,6 +164,7 @@ class MessageDeliveryRecord:
     error: Optional[str] = None
     retry_count: int = 0
     delivery_time_ms: Optional[float] = None
+    pending: bool = False  # buffered in a coalescing lane, not yet written
 
 @dataclass
 class FailurePattern:
@@ -59,6 +179,491 @@ class FailurePattern:
     success_rate: float = 0.0
     learned_at: datetime = field(default_factory=datetime.now)
 
+class MessageDeduplicationCache:
+    """
+    TTL-bounded cache of recent broadcasts keyed by content hash and target set.
+
+    Identical broadcasts inside the window are either merged with the delivery
+    still in flight or suppressed in favour of the already completed one.
+    """
+
+    def __init__(self, ttl_seconds: float = 1.0, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, FrozenSet[str]], Tuple[float, asyncio.Future]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+
+    def make_key(self, message: Dict[str, Any], clients: List[str]) -> Tuple[str, FrozenSet[str]]:
+        """Build the cache key for a message and its recipients"""
+        content = json.dumps(message, sort_keys=True, default=str)
+        return hashlib.sha1(content.encode()).hexdigest(), frozenset(clients)
+
+    def lookup(self, key: Tuple[str, FrozenSet[str]]) -> Optional[asyncio.Future]:
+        """Return the delivery future of an identical recent broadcast, if any"""
+        self._evict_expired()
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[1].done() and entry[0] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if not entry[1].done():
+            self.merged += 1
+        return entry[1]
+
+    def reserve(self, key: Tuple[str, FrozenSet[str]]) -> asyncio.Future:
+        """Register a new broadcast and return the future its summary resolves"""
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, future)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        return future
+
+    def discard(self, key: Tuple[str, FrozenSet[str]]):
+        """Forget a broadcast that failed so it is not replayed to duplicates"""
+        self._entries.pop(key, None)
+
+    def _evict_expired(self):
+        """Drop entries whose window has passed (entries are in expiry order)"""
+        now = time.monotonic()
+        while self._entries:
+            key, (expires_at, future) = next(iter(self._entries.items()))
+            if expires_at > now or not future.done():
+                break
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get deduplication counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "merged": self.merged,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+class ValidatedTokenCache:
+    """
+    LRU cache of validated handshake tokens with a time-to-live.
+
+    Tokens are stored by SHA-256 digest so raw credentials never sit in memory
+    longer than the handshake that presented them.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached identity for token, or None if absent or expired"""
+        key = self._digest(token)
+        entry = self._entries.get(key)
+
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, token: str, identity: Dict[str, Any]):
+        """Cache a successfully validated identity"""
+        key = self._digest(token)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, identity)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get token cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+class TokenBucket:
+    """Token bucket rate limiter refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> bool:
+        """Take one token if available"""
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def seconds_until_available(self) -> float:
+        """Time until the next token is available"""
+        self._refill()
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+class SpaceSavingCounter:
+    """
+    Space-Saving heavy-hitters sketch over weighted keys.
+
+    Tracks at most `capacity` keys. When full, a new key replaces the current
+    minimum and inherits its count, which is kept as that key's error bound.
+    Any key whose true weight exceeds total/capacity is guaranteed present.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+
+    def add(self, key: str, weight: int = 1):
+        self.total += weight
+        if key in self.counts:
+            self.counts[key] += weight
+            return
+
+        if len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0
+            return
+
+        evicted = min(self.counts, key=self.counts.__getitem__)
+        floor = self.counts.pop(evicted)
+        del self.errors[evicted]
+        self.counts[key] = floor + weight
+        self.errors[key] = floor
+
+    def top(self, n: int = 10) -> List[Tuple[str, int, int]]:
+        """Return (key, estimated weight, max overestimate) for the n heaviest keys"""
+        heaviest = heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+        return [(key, count, self.errors[key]) for key, count in heaviest]
+
+class FailureSampler:
+    """
+    Limits full learning analysis for repeated identical failures.
+
+    Failures are fingerprinted by error type, handler and the error message
+    with numbers, hex ids and quoted values masked. The first
+    `full_capture_limit` occurrences of a fingerprint in each window go
+    through full analysis; later ones only increment its counter.
+    """
+
+    _MASKS = [
+        (re.compile(r"'[^']*'|\"[^\"]*\""), "<str>"),
+        (re.compile(r"\b[0-9a-fA-F]{8,}\b"), "<id>"),
+        (re.compile(r"\d+"), "<n>"),
+    ]
+
+    def __init__(self, full_capture_limit: int = 5, window_seconds: float = 3600.0,
+                 max_fingerprints: int = 4096):
+        self.full_capture_limit = full_capture_limit
+        self.window_seconds = window_seconds
+        self.max_fingerprints = max_fingerprints
+        self.fingerprints: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.captured = 0
+        self.suppressed = 0
+
+    @classmethod
+    def normalize(cls, message: str) -> str:
+        for pattern, replacement in cls._MASKS:
+            message = pattern.sub(replacement, message)
+        return message[:200]
+
+    def fingerprint(self, handler: str, error: Any) -> str:
+        error_type = type(error).__name__ if isinstance(error, BaseException) else "Exception"
+        return f"{handler}:{error_type}:{self.normalize(str(error))}"
+
+    def should_capture(self, handler: str, error: Any) -> bool:
+        """Count this failure and decide whether it deserves full analysis"""
+        key = self.fingerprint(handler, error)
+        now = time.monotonic()
+
+        entry = self.fingerprints.get(key)
+        if entry is None or now - entry["window_start"] > self.window_seconds:
+            entry = {"window_start": now, "count": 0, "suppressed": 0,
+                     "total": entry["total"] if entry else 0}
+            self.fingerprints[key] = entry
+        self.fingerprints.move_to_end(key)
+        while len(self.fingerprints) > self.max_fingerprints:
+            self.fingerprints.popitem(last=False)
+
+        entry["count"] += 1
+        entry["total"] += 1
+        if entry["count"] <= self.full_capture_limit:
+            self.captured += 1
+            return True
+
+        entry["suppressed"] += 1
+        self.suppressed += 1
+        return False
+
+    def export_state(self) -> Dict[str, Dict[str, Any]]:
+        """Fingerprint table with window starts as wall-clock seconds, for snapshots"""
+        offset = time.time() - time.monotonic()
+        return {
+            key: {**entry, "window_start": int(entry["window_start"] + offset)}
+            for key, entry in self.fingerprints.items()
+        }
+
+    def restore_state(self, fingerprints: Dict[str, Dict[str, Any]]):
+        """Seed the fingerprint table from a snapshot taken by export_state"""
+        offset = time.time() - time.monotonic()
+        for key, entry in sorted(fingerprints.items(), key=lambda item: item[1]["window_start"]):
+            if key not in self.fingerprints:
+                self.fingerprints[key] = {**entry, "window_start": entry["window_start"] - offset}
+        while len(self.fingerprints) > self.max_fingerprints:
+            self.fingerprints.popitem(last=False)
+
+    def get_stats(self, top_n: int = 10) -> Dict[str, Any]:
+        """Sampling counters and the most frequent fingerprints"""
+        noisiest = heapq.nlargest(top_n, self.fingerprints.items(), key=lambda item: item[1]["total"])
+        return {
+            "fingerprints": len(self.fingerprints),
+            "captured": self.captured,
+            "suppressed": self.suppressed,
+            "full_capture_limit": self.full_capture_limit,
+            "top_fingerprints": [
+                {"fingerprint": key, "total": entry["total"], "suppressed": entry["suppressed"]}
+                for key, entry in noisiest
+            ]
+        }
+
+class ManagerStateStore:
+    """
+    SQLite snapshot store for state the manager has learned.
+
+    Rows are (kind, key) -> JSON payload. All methods are blocking and are
+    meant to be run off the event loop with asyncio.to_thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS manager_state ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, payload TEXT NOT NULL,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (kind, key))"
+        )
+        return conn
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Load every snapshot row grouped by kind"""
+        state: Dict[str, Dict[str, Any]] = defaultdict(dict)
+        conn = self._connect()
+        try:
+            for kind, key, payload in conn.execute("SELECT kind, key, payload FROM manager_state"):
+                state[kind][key] = json.loads(payload)
+        finally:
+            conn.close()
+        return state
+
+    def write_batch(self, upserts: List[Tuple[str, str, str]], deletes: List[Tuple[str, str]]):
+        """Apply one batch of changed and removed rows in a single transaction"""
+        conn = self._connect()
+        try:
+            with conn:
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO manager_state (kind, key, payload, updated_at) VALUES (?, ?, ?, ?)",
+                    [(kind, key, payload, now) for kind, key, payload in upserts]
+                )
+                conn.executemany("DELETE FROM manager_state WHERE kind = ? AND key = ?", deletes)
+        finally:
+            conn.close()
+
+class BroadcastTracer:
+    """
+    Sampled span tracing for the broadcast delivery pipeline.
+
+    Spans are kept in a bounded ring buffer and can be exported as plain JSON
+    or as OTLP/JSON (the format accepted by OpenTelemetry collectors' file
+    receivers). With sampling disabled every hook reduces to a None check.
+    """
+
+    _NO_SPAN = nullcontext()
+
+    def __init__(self, sample_rate: float = 0.0, max_spans: int = 10000,
+                 service_name: str = "websocket_manager"):
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self.spans: deque = deque(maxlen=max_spans)
+        self.traces_started = 0
+
+    def start_trace(self, name: str, **attributes) -> Optional[Dict[str, Any]]:
+        """Start a root span if this operation is sampled, else return None"""
+        if self.sample_rate <= 0.0 or random.random() >= self.sample_rate:
+            return None
+
+        self.traces_started += 1
+        return {
+            "trace_id": secrets.token_hex(16),
+            "span_id": secrets.token_hex(8),
+            "parent_span_id": None,
+            "name": name,
+            "start_ns": time.time_ns(),
+            "attributes": attributes
+        }
+
+    def finish_trace(self, trace: Optional[Dict[str, Any]], **attributes):
+        """Close the root span and store it"""
+        if trace is None:
+            return
+        trace["attributes"].update(attributes)
+        trace["end_ns"] = time.time_ns()
+        self.spans.append(trace)
+
+    def span(self, trace: Optional[Dict[str, Any]], name: str, **attributes):
+        """Context manager timing one pipeline stage of a sampled trace"""
+        if trace is None:
+            return self._NO_SPAN
+        return self._record_span(trace, name, attributes)
+
+    def record_span(self, trace: Optional[Dict[str, Any]], name: str,
+                    start_ns: int, end_ns: int, **attributes):
+        """Store a span whose timing was measured elsewhere (e.g. ack wait)"""
+        if trace is None:
+            return
+        self.spans.append({
+            "trace_id": trace["trace_id"],
+            "span_id": secrets.token_hex(8),
+            "parent_span_id": trace["span_id"],
+            "name": name,
+            "start_ns": start_ns,
+            "end_ns": end_ns,
+            "attributes": attributes
+        })
+
+    @contextmanager
+    def _record_span(self, trace: Dict[str, Any], name: str, attributes: Dict[str, Any]):
+        start_ns = time.time_ns()
+        try:
+            yield
+        finally:
+            self.record_span(trace, name, start_ns, time.time_ns(), **attributes)
+
+    def export_json(self, path: str) -> int:
+        """Write buffered spans as a JSON list; returns the span count"""
+        spans = list(self.spans)
+        with open(path, "w") as f:
+            json.dump(spans, f, default=str)
+        return len(spans)
+
+    def export_otlp(self, path: str) -> int:
+        """Write buffered spans as an OTLP/JSON ExportTraceServiceRequest"""
+        spans = list(self.spans)
+        otlp_spans = [{
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            **({"parentSpanId": span["parent_span_id"]} if span["parent_span_id"] else {}),
+            "name": span["name"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span["start_ns"]),
+            "endTimeUnixNano": str(span["end_ns"]),
+            "attributes": [
+                {"key": key, "value": self._otlp_value(value)}
+                for key, value in span["attributes"].items()
+            ]
+        } for span in spans]
+
+        with open(path, "w") as f:
+            json.dump({
+                "resourceSpans": [{
+                    "resource": {"attributes": [
+                        {"key": "service.name", "value": {"stringValue": self.service_name}}
+                    ]},
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}]
+                }]
+            }, f)
+        return len(spans)
+
+    @staticmethod
+    def _otlp_value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get tracing configuration and buffer usage"""
+        return {
+            "sample_rate": self.sample_rate,
+            "traces_started": self.traces_started,
+            "buffered_spans": len(self.spans)
+        }
+
+class AdmissionControlledProtocol(WebSocketServerProtocol):
+    """
+    Server protocol that applies the manager's admission control to the HTTP
+    upgrade request. Shed clients never complete the WebSocket handshake;
+    they get a 503 response with a Retry-After header instead.
+    """
+
+    def __init__(self, *args, manager: "LearningWebSocketManager", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manager = manager
+        self.admitted_host: Optional[str] = None
+
+    async def process_request(self, path: str, request_headers) -> Optional[tuple]:
+        response = await super().process_request(path, request_headers)
+        if response is not None:
+            return response
+
+        host = self.manager._client_host(self.remote_address, request_headers)
+        rejection = self.manager._admit(host)
+        if rejection is not None:
+            reason, retry_after = rejection
+            return (http.HTTPStatus.SERVICE_UNAVAILABLE, [("Retry-After", str(retry_after))],
+                    f"Connection shed: {reason}\n".encode())
+        self.admitted_host = host
+        return None
+
+    async def handshake(self, *args, **kwargs):
+        try:
+            return await super().handshake(*args, **kwargs)
+        except BaseException:
+            # The rest of the handshake failed after admission; return the slot
+            if self.admitted_host is not None:
+                self.manager._release_admission(self.admitted_host)
+                self.admitted_host = None
+            raise
+
 class LearningWebSocketManager:
     """
     Self-improving WebSocket manager that learns from failures and optimizes performance.
@@ -71,14 +676,43 @@ class LearningWebSocketManager:
     5. Continuous learning from all failures
     """
     
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    def __init__(self, host: str = "localhost", port: int = 8765,
+                 token_validator: Optional[Callable[[str], Any]] = None,
+                 require_authentication: bool = False,
+                 state_path: Optional[str] = None,
+                 trace_sample_rate: float = 0.0,
+                 runtime_profile: str = "default",
+                 memory_budget_bytes: Optional[int] = None,
+                 publish_shared_metrics: bool = True,
+                 max_connections_per_host: int = 50,
+                 trusted_proxies: Optional[List[str]] = None,
+                 max_inbound_message_bytes: Optional[int] = None):
         self.host = host
         self.port = port
+        self.runtime_profile = get_runtime_profile(runtime_profile)
         
         # Connection management
         self.connections: Dict[str, ConnectionInfo] = {}
         self.connection_history: deque = deque(maxlen=1000)
         
+        # Authentication and tenant indexes
+        # token_validator(token) returns (or resolves to) a dict with
+        # "user_id" and "organization_id", or None for an invalid token
+        self.token_validator = token_validator
+        self.require_authentication = require_authentication
+        self.organization_clients: Dict[str, Set[str]] = defaultdict(set)
+        self.user_clients: Dict[str, Set[str]] = defaultdict(set)
+        self.token_cache = ValidatedTokenCache()
+        
+        # Handshake fast path: the static part of the welcome frame is
+        # serialized once and completed per connection
+        self.server_capabilities = ["compression", "learning", "auto_recovery", "batching", "compact_control"]
+        # Enforced before parsing; defaults to the profile's websockets max_size
+        self.max_inbound_message_bytes = min(max_inbound_message_bytes or self.runtime_profile.max_size,
+                                             self.runtime_profile.max_size)
+        self._welcome_prefix = self._build_welcome_prefix()
+        self.handshake_times: deque = deque(maxlen=1000)  # (monotonic time, duration ms)
+        
         # Message handling
         self.message_history: deque = deque(maxlen=1000)
         self.message_buffer: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
@@ -88,9 +722,11 @@ class LearningWebSocketManager:
         self.learning_system = AgentLearningSystem()
         self.analyzer = RootCauseAnalyzer()
         self.failure_patterns: Dict[str, FailurePattern] = {}
+        self.failure_sampler = FailureSampler()
         
-        # Performance tracking
-        self.performance_metrics = {
+        # Performance tracking, mirrored into the cross-worker shared registry
+        self.shared_metrics = get_shared_metrics() if publish_shared_metrics else None
+        self.performance_metrics = SharedMetricsDict(self.shared_metrics, {
             "total_connections": 0,
             "active_connections": 0,
             "failed_connections": 0,
@@ -98,74 +734,208 @@ class LearningWebSocketManager:
             "failed_messages": 0,
             "average_latency": 0.0,
             "learning_applications": 0,
-            "patterns_learned": 0
-        }
+            "patterns_learned": 0,
+            "patterns_reused": 0,
+            "oversized_messages": 0,
+            "control_frames": 0
+        })
         
         # Circuit breaker for failing clients
         self.circuit_breakers: Dict[str, Dict[str, Any]] = {}
         
+        # Bounded memory: auxiliary state of departed clients is kept for a
+        # short grace period, then evicted by age and LRU order. With a
+        # memory budget set, departed state is evicted immediately when the
+        # approximate footprint exceeds it.
+        self.departed_clients: "OrderedDict[str, float]" = OrderedDict()
+        self.departed_client_ttl = 300.0  # seconds
+        self.max_departed_clients = 10000
+        self.max_peer_states = 10000
+        self.memory_budget_bytes = memory_budget_bytes
+        
+        # Admission control: upgrade requests are answered with 503 and a
+        # Retry-After header when the server is at capacity, a host has too
+        # many connections, the accept rate is exceeded or the event loop
+        # lags. Behind a trusted proxy, hosts are taken from X-Forwarded-For.
+        self.max_connections = 10000
+        self.max_connections_per_host = max_connections_per_host
+        self.trusted_proxies: Set[str] = set(trusted_proxies or [])
+        self.max_loop_lag_ms = 250.0
+        self.accept_bucket = TokenBucket(rate=200.0, burst=500)
+        self.host_connections: Dict[str, int] = defaultdict(int)
+        self.admitted_connections = 0  # slots held, including handshakes in progress
+        self.loop_lag_ms = 0.0
+        self.admission_stats: Dict[str, Any] = {"admitted": 0, "rejected": defaultdict(int)}
+        self.eviction_counts: Dict[str, int] = defaultdict(int)
+        
+        # Warm-start persistence of learned state. Client IDs change on every
+        # connection, so quality and breaker state are kept per peer (user or
+        # remote host) and restored when that peer reconnects.
+        self.state_store = ManagerStateStore(state_path) if state_path else None
+        self.state_snapshot_interval = 30  # seconds
+        self.peer_state: Dict[str, Dict[str, Any]] = {}
+        self._persisted_state: Dict[Tuple[str, str], str] = {}
+        
         # Compression and optimization
         self.compression_enabled = True
         self.compression_threshold = 1024  # bytes
         
+        # Connection quality scoring and quality-based delivery lanes
+        self.quality_ewma_alpha = 0.2
+        self.quality_recovery_half_life = 60.0  # seconds for failure rate to halve
+        self.rtt_target_ms = 200.0
+        self.delivery_lanes: List[DeliveryLane] = DELIVERY_LANES
+        self.coalesce_buffers: Dict[str, List[Tuple[str, str, str]]] = {}
+        self.coalesce_tasks: Dict[str, Tuple[asyncio.Task, DeliveryLane]] = {}
+        
+        # Bandwidth accounting per message type and heaviest clients
+        self.max_tracked_message_types = 64
+        self.bandwidth_by_type: Dict[str, Dict[str, int]] = {}
+        self.top_talkers = SpaceSavingCounter(capacity=100)
+        
+        # Optional traffic capture for replay-based regression testing
+        self.capture: Optional[TrafficCapture] = None
+        
+        # Deduplication of identical broadcasts
+        self.deduplication_enabled = True
+        self.dedup_cache = MessageDeduplicationCache(ttl_seconds=1.0)
+        
+        # Sampled tracing of the delivery pipeline
+        self.tracer = BroadcastTracer(sample_rate=trace_sample_rate)
+        
+        # Thread-safe submission of work from synchronous code (e.g. Flask
+        # request handlers) to the manager's event loop
+        self.submission_queue: queue.Queue = queue.Queue(maxsize=1000)
+        self.submission_batch_size = 100
+        self.submission_stats = {"submitted": 0, "rejected": 0, "processed": 0, "failed": 0, "cancelled": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._submission_ready: Optional[asyncio.Event] = None
+        self._submission_lock = threading.Lock()  # stats, wakeups and the running check
+        self._wakeup_scheduled = False
+        
         # Server instance
         self.server = None
         self.running = False
+        self._background_tasks: List[asyncio.Task] = []
         
         logger.info("Learning WebSocket Manager initialized")
     
     async def start_server(self):
         """Start the WebSocket server with learning capabilities"""
+        profile = self.runtime_profile
         logger.info(f"Starting WebSocket server on {self.host}:{self.port}")
         
         try:
+            if self.state_store:
+                await self._load_persisted_state()
+            
             self.server = await websockets.serve(
                 self.handle_client,
                 self.host,
                 self.port,
-                ping_interval=30,
-                ping_timeout=10,
-                max_size=1024*1024  # 1MB max message size
+                create_protocol=functools.partial(AdmissionControlledProtocol, manager=self),
+                ping_interval=profile.ping_interval,
+                ping_timeout=profile.ping_timeout,
+                max_size=profile.max_size,
+                max_queue=profile.max_queue,
+                read_limit=profile.read_limit,
+                write_limit=profile.write_limit
             )
             
             self.running = True
-            logger.info("WebSocket server started successfully")
+            self._loop = asyncio.get_running_loop()
+            self._submission_ready = asyncio.Event()
+            loop_name = type(asyncio.get_running_loop()).__module__.split(".")[0]
+            logger.info(f"WebSocket server started successfully with runtime profile "
+                        f"'{profile.name}' on {loop_name} event loop ({asdict(profile)})")
             
             # Start background tasks
-            asyncio.create_task(self.connection_monitor())
-            asyncio.create_task(self.performance_monitor())
-            asyncio.create_task(self.learning_processor())
+            background = [self.connection_monitor(), self.performance_monitor(),
+                          self.learning_processor(), self.submission_processor(),
+                          self.loop_lag_monitor()]
+            if self.state_store:
+                background.append(self.state_persister())
+            self._background_tasks = [asyncio.create_task(coroutine) for coroutine in background]
             
         except Exception as e:
             logger.error(f"Failed to start WebSocket server: {e}")
             await self._apply_server_failure_learning(e)
             raise
-    
+
+    async def stop_server(self):
+        """Stop accepting connections and cancel the background tasks"""
+        with self._submission_lock:
+            self.running = False
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+        self._cancel_queued_submissions()
+        await self._flush_all_coalesced()
+        if self.state_store:
+            # Keep what was learned since the last periodic snapshot
+            try:
+                await self._persist_state()
+            except Exception as e:
+                logger.error(f"Failed to persist manager state on stop: {e}")
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
     async def handle_client(self, websocket: WebSocketServerProtocol, path: str):
         """Handle individual client connection with learning"""
+        handshake_start = time.monotonic()
+        
+        # Connections accepted by start_server were admitted during the HTTP
+        # upgrade; others (embedding servers) are admitted here
+        remote_host = getattr(websocket, "admitted_host", None)
+        if remote_host is None:
+            remote_host = self._client_host(websocket.remote_address, websocket.request_headers)
+            rejection = self._admit(remote_host)
+            if rejection is not None:
+                reason, retry_after = rejection
+                # 1013 = Try Again Later
+                await websocket.close(code=1013, reason=f"{reason}; retry-after={retry_after}")
+                return
+        
         client_id = self._generate_client_id(websocket)
+        self._tune_socket(websocket)
         
         logger.info(f"New client connection: {client_id}")
         
+        # Authenticate before the connection becomes visible to broadcasts
+        identity = await self._authenticate_client(websocket, path)
+        if identity is None and self.require_authentication:
+            logger.warning(f"Rejecting unauthenticated client {client_id}")
+            self.performance_metrics["failed_connections"] += 1
+            self._release_admission(remote_host)
+            await websocket.close(code=4001, reason="authentication required")
+            return
+        
         # Create connection info
         connection = ConnectionInfo(
             websocket=websocket,
             client_id=client_id,
             connected_at=datetime.now(),
-            last_ping=datetime.now()
+            last_ping=datetime.now(),
+            user_id=(identity or {}).get("user_id"),
+            organization_id=(identity or {}).get("organization_id"),
+            remote_host=remote_host,
+            client_capabilities=self._extract_client_capabilities(websocket, path)
         )
         
         self.connections[client_id] = connection
+        self._index_connection(connection)
+        self._restore_peer_state(connection)
         self.performance_metrics["total_connections"] += 1
         self.performance_metrics["active_connections"] += 1
         
         try:
             # Send welcome message
-            await self._send_to_client(client_id, {
-                "type": "welcome",
-                "client_id": client_id,
-                "server_capabilities": ["compression", "learning", "auto_recovery"]
-            })
+            welcome_frame = self._welcome_frame(client_id, identity is not None)
+            await websocket.send(welcome_frame)
+            self._account_outbound(connection, "welcome", welcome_frame, welcome_frame)
+            self._record_handshake(handshake_start)
             
             # Handle messages
             async for message in websocket:
@@ -182,17 +952,36 @@ class LearningWebSocketManager:
     
     async def _handle_message(self, client_id: str, raw_message: str):
         """Handle incoming message with error learning"""
+        # Reject oversized frames before spending any time parsing them. The
+        # limit is in encoded bytes; only non-ASCII text needs encoding to tell.
+        limit = self.max_inbound_message_bytes
+        if len(raw_message) > limit or self._frame_size(raw_message) > limit:
+            self.performance_metrics["oversized_messages"] += 1
+            self._account_rejected_inbound(client_id, MSG_TYPE_OVERSIZED, raw_message)
+            logger.warning(f"Closing {client_id}: {self._frame_size(raw_message)} byte message over inbound limit")
+            connection = self.connections.get(client_id)
+            if connection is not None:
+                # 1009 = Message Too Big, as the websockets max_size check would close it
+                await connection.websocket.close(code=1009, reason=f"message exceeds {limit} bytes")
+            return
+        
+        # Compact ping/ack frames skip JSON entirely
+        if isinstance(raw_message, str) and raw_message.startswith(CONTROL_PREFIX):
+            if await self._handle_control_frame(client_id, raw_message):
+                return
+        
         try:
             # Parse message
             message = json.loads(raw_message)
             
+            # Process based on message type
+            msg_type = message.get("type", "unknown")
+            
             # Update connection stats
             if client_id in self.connections:
                 self.connections[client_id].total_messages += 1
                 self.connections[client_id].last_ping = datetime.now()
-            
-            # Process based on message type
-            msg_type = message.get("type", "unknown")
+                self._account_inbound(self.connections[client_id], msg_type, raw_message)
             
             if msg_type == "ping":
                 await self._handle_ping(client_id, message)
@@ -205,6 +994,7 @@ class LearningWebSocketManager:
                 
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON from client {client_id}: {e}")
+            self._account_rejected_inbound(client_id, MSG_TYPE_INVALID, raw_message)
             await self._apply_message_parsing_learning(client_id, raw_message, e)
         except Exception as e:
             logger.error(f"Error processing message from {client_id}: {e}")
@@ -215,24 +1005,64 @@ class LearningWebSocketManager:
         """
         Broadcast message with comprehensive learning from failures.
         NO workarounds - every failure is analyzed and fixed.
+        
+        Identical messages sent to the same clients within the deduplication
+        window share a single delivery and its summary.
         """
+        # Determine target clients
+        clients = target_clients or list(self.connections.keys())
+        
+        if not self.deduplication_enabled:
+            return await self._broadcast(message, clients)
+        
+        dedup_key = self.dedup_cache.make_key(message, clients)
+        previous = self.dedup_cache.lookup(dedup_key)
+        if previous is not None:
+            try:
+                summary = await asyncio.shield(previous)
+            except asyncio.CancelledError:
+                if not previous.cancelled():
+                    raise
+                # The shared delivery was cancelled, not this caller: deliver it ourselves
+                return await self.broadcast_with_learning(message, target_clients)
+            logger.debug(f"Suppressed duplicate broadcast of message {summary['message_id']}")
+            return {**summary, "deduplicated": True}
+        
+        pending = self.dedup_cache.reserve(dedup_key)
+        try:
+            summary = await self._broadcast(message, clients)
+        except BaseException as e:
+            # Includes cancellation: merged waiters must never be left pending
+            self.dedup_cache.discard(dedup_key)
+            if isinstance(e, asyncio.CancelledError):
+                pending.cancel()
+            else:
+                pending.set_exception(e)
+                # Mark retrieved so merged waiters are not required
+                pending.exception()
+            raise
+        
+        pending.set_result(summary)
+        return summary
+    
+    async def _broadcast(self, message: Dict[str, Any], clients: List[str]) -> Dict[str, Any]:
+        """Deliver a message to the given clients and learn from failures"""
         message_id = self._generate_message_id(message)
         start_time = time.time()
         
-        logger.info(f"Broadcasting message {message_id} to {len(target_clients or self.connections)} clients")
+        logger.info(f"Broadcasting message {message_id} to {len(clients)} clients")
+        trace = self.tracer.start_trace("broadcast", message_id=message_id, clients=len(clients))
         
         # Apply learned optimizations
-        optimized_message = await self._apply_message_optimizations(message)
-        
-        # Determine target clients
-        clients = target_clients or list(self.connections.keys())
+        with self.tracer.span(trace, "optimize"):
+            optimized_message = await self._apply_message_optimizations(message)
         
         # Track delivery results
         delivery_results = []
         failed_deliveries = []
         
-        # Send to each client
-        for client_id in clients:
+        # Send to each client, best lanes first so weak clients never delay healthy ones
+        for client_id, lane in self._order_by_lane(clients):
             try:
                 # Check circuit breaker
                 if self._is_circuit_breaker_open(client_id):
@@ -240,7 +1070,8 @@ class LearningWebSocketManager:
                     continue
                 
                 # Attempt delivery
-                delivery_result = await self._deliver_to_client(client_id, optimized_message, message_id)
+                delivery_result = await self._deliver_to_client(client_id, optimized_message, message_id,
+                                                                trace, lane)
                 delivery_results.append(delivery_result)
                 
                 if not delivery_result.success:
@@ -261,29 +1092,265 @@ class LearningWebSocketManager:
         
         # Learn from failures
         if failed_deliveries:
-            await self._learn_from_delivery_failures(failed_deliveries, optimized_message)
+            with self.tracer.span(trace, "learn_from_failures", failures=len(failed_deliveries)):
+                await self._learn_from_delivery_failures(failed_deliveries, optimized_message)
         
         # Calculate metrics
         total_time = (time.time() - start_time) * 1000  # ms
-        success_count = len([r for r in delivery_results if r.success])
+        success_count = len([r for r in delivery_results if r.success and not r.pending])
+        pending_count = len([r for r in delivery_results if r.pending])
         total_count = len(delivery_results)
+        self.tracer.finish_trace(trace, successful_deliveries=success_count)
         
         # Update performance metrics
         self.performance_metrics["total_messages"] += total_count
-        self.performance_metrics["failed_messages"] += (total_count - success_count)
+        self.performance_metrics["failed_messages"] += (total_count - success_count - pending_count)
         
         return {
             "message_id": message_id,
             "total_clients": len(clients),
             "successful_deliveries": success_count,
-            "failed_deliveries": total_count - success_count,
+            "pending_deliveries": pending_count,
+            "failed_deliveries": total_count - success_count - pending_count,
             "delivery_time_ms": total_time,
             "failures_learned": len(failed_deliveries),
             "optimizations_applied": len(optimized_message.get("_optimizations", []))
         }
     
+    # Admission control
+    def _client_host(self, remote_address: Any, request_headers: Any) -> str:
+        """
+        Host a connection is charged to for per-host limits: the peer address,
+        or behind a trusted proxy the nearest untrusted X-Forwarded-For hop
+        """
+        try:
+            host = str(remote_address[0])
+        except (IndexError, TypeError):
+            return "unknown"
+        
+        forwarded = request_headers.get("X-Forwarded-For") if host in self.trusted_proxies else None
+        if forwarded:
+            for hop in reversed([part.strip() for part in forwarded.split(",")]):
+                if hop and hop not in self.trusted_proxies:
+                    return hop
+        return host
+    
+    def _admit(self, remote_host: str) -> Optional[Tuple[str, int]]:
+        """Take a connection slot for a host, or return (reason, retry-after) if shed"""
+        rejection = self._check_admission(remote_host)
+        if rejection is not None:
+            self.admission_stats["rejected"][rejection[0]] += 1
+            self.performance_metrics["failed_connections"] += 1
+            logger.warning(f"Rejected connection from {remote_host}: {rejection[0]}")
+            return rejection
+        
+        self.host_connections[remote_host] += 1
+        self.admitted_connections += 1
+        self.admission_stats["admitted"] += 1
+        return None
+    
+    def _check_admission(self, remote_host: str) -> Optional[Tuple[str, int]]:
+        """Return (reason, retry-after seconds) if a new connection must be shed"""
+        jitter = random.randint(0, 5)  # Spread retries so rejected clients do not return in lockstep
+        
+        if self.admitted_connections >= self.max_connections:
+            return "server_full", 30 + jitter
+        if self.host_connections.get(remote_host, 0) >= self.max_connections_per_host:
+            return "host_limit", 60 + jitter
+        if self.loop_lag_ms > self.max_loop_lag_ms:
+            return "overloaded", 5 + jitter
+        if not self.accept_bucket.try_acquire():
+            return "rate_limited", math.ceil(self.accept_bucket.seconds_until_available()) + jitter
+        return None
+    
+    def _release_admission(self, remote_host: Optional[str]):
+        """Return a host's connection slot"""
+        if remote_host is None or remote_host not in self.host_connections:
+            return
+        self.admitted_connections -= 1
+        self.host_connections[remote_host] -= 1
+        if self.host_connections[remote_host] <= 0:
+            del self.host_connections[remote_host]
+    
+    async def loop_lag_monitor(self, interval: float = 0.5):
+        """Track event loop lag as the smoothed overshoot of a periodic sleep"""
+        while self.running:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            lag_ms = max(0.0, (time.monotonic() - started - interval) * 1000)
+            self.loop_lag_ms = 0.7 * self.loop_lag_ms + 0.3 * lag_ms
+    
+    def get_admission_stats(self) -> Dict[str, Any]:
+        """Admission counters and current limits"""
+        return {
+            "admitted": self.admission_stats["admitted"],
+            "rejected": dict(self.admission_stats["rejected"]),
+            "loop_lag_ms": self.loop_lag_ms,
+            "admitted_connections": self.admitted_connections,
+            "max_connections": self.max_connections,
+            "max_connections_per_host": self.max_connections_per_host,
+            "trusted_proxies": sorted(self.trusted_proxies),
+            "accept_rate_per_second": self.accept_bucket.rate,
+            "hosts_connected": len(self.host_connections)
+        }
+    
+    # Thread-safe submission API
+    def submit_broadcast(self, message: Dict[str, Any], target_clients: Optional[List[str]] = None,
+                         organization_id: Optional[str] = None,
+                         user_id: Optional[str] = None) -> concurrent.futures.Future:
+        """
+        Queue a broadcast from any thread; the future resolves to its summary.
+        
+        Routes to broadcast_to_organization or send_to_user when an
+        organization_id or user_id is given. Raises SubmissionQueueFull when
+        the queue is at capacity so callers can shed or retry.
+        """
+        if organization_id is not None:
+            return self.submit_coroutine(self.broadcast_to_organization, organization_id, message)
+        if user_id is not None:
+            return self.submit_coroutine(self.send_to_user, user_id, message)
+        return self.submit_coroutine(self.broadcast_with_learning, message, target_clients)
+    
+    def submit_coroutine(self, coroutine_function: Callable[..., Any], *args) -> concurrent.futures.Future:
+        """Queue coroutine_function(*args) to run on the manager's event loop from any thread"""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        # Checked under the lock so nothing is queued after stop_server drains the queue
+        with self._submission_lock:
+            if self._loop is None or not self.running:
+                raise RuntimeError("WebSocket manager event loop is not running")
+            
+            try:
+                self.submission_queue.put_nowait((coroutine_function, args, future))
+            except queue.Full:
+                self.submission_stats["rejected"] += 1
+                raise SubmissionQueueFull(f"Submission queue full ({self.submission_queue.maxsize} pending)")
+            
+            self.submission_stats["submitted"] += 1
+            # Coalesce wakeups: at most one pending call_soon_threadsafe at a time
+            if not self._wakeup_scheduled:
+                self._wakeup_scheduled = True
+                self._loop.call_soon_threadsafe(self._wake_submission_processor)
+        return future
+    
+    def _wake_submission_processor(self):
+        with self._submission_lock:
+            self._wakeup_scheduled = False
+        self._submission_ready.set()
+    
+    def get_submission_backpressure(self) -> Dict[str, Any]:
+        """Queue depth and fill ratio for callers deciding whether to submit"""
+        depth = self.submission_queue.qsize()
+        with self._submission_lock:
+            stats = dict(self.submission_stats)
+        return {
+            "depth": depth,
+            "capacity": self.submission_queue.maxsize,
+            "utilization": depth / self.submission_queue.maxsize,
+            **stats
+        }
+    
+    async def submission_processor(self):
+        """Drain submitted work in batches on the event loop"""
+        while self.running:
+            batch = []
+            try:
+                await self._submission_ready.wait()
+                self._submission_ready.clear()
+                
+                while True:
+                    batch = []
+                    try:
+                        while len(batch) < self.submission_batch_size:
+                            batch.append(self.submission_queue.get_nowait())
+                    except queue.Empty:
+                        pass
+                    
+                    if not batch:
+                        break
+                    await asyncio.gather(*(self._run_submission(*item) for item in batch))
+                
+            except asyncio.CancelledError:
+                # Callers blocked on .result() must not wait forever
+                for _, _, future in batch:
+                    self._cancel_submission(future)
+                raise
+            except Exception as e:
+                logger.error(f"Submission processor error: {e}")
+    
+    async def _run_submission(self, coroutine_function: Callable[..., Any], args: tuple,
+                              future: concurrent.futures.Future):
+        """Run one submitted call and resolve its future"""
+        if not future.set_running_or_notify_cancel():
+            return
+        
+        try:
+            result = await coroutine_function(*args)
+        except asyncio.CancelledError:
+            self._cancel_submission(future)
+            raise
+        except Exception as e:
+            with self._submission_lock:
+                self.submission_stats["failed"] += 1
+            logger.error(f"Submitted {getattr(coroutine_function, '__name__', 'call')} failed: {e}")
+            future.set_exception(e)
+        else:
+            with self._submission_lock:
+                self.submission_stats["processed"] += 1
+            future.set_result(result)
+    
+    def _cancel_submission(self, future: concurrent.futures.Future):
+        """Resolve a submission that will never run to completion as cancelled"""
+        if future.done():
+            return
+        # Futures that were already running cannot be cancelled, only failed
+        if not future.cancel():
+            future.set_exception(concurrent.futures.CancelledError())
+        with self._submission_lock:
+            self.submission_stats["cancelled"] += 1
+    
+    def _cancel_queued_submissions(self):
+        """Cancel work still queued when the submission processor stops"""
+        while True:
+            try:
+                _, _, future = self.submission_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._cancel_submission(future)
+    
+    async def broadcast_to_organization(self, organization_id: str,
+                                        message: Dict[str, Any]) -> Dict[str, Any]:
+        """Broadcast message to every connection of one organization"""
+        clients = list(self.organization_clients.get(organization_id, ()))
+        if not clients:
+            return self._empty_broadcast_summary(message)
+        
+        return await self.broadcast_with_learning(message, target_clients=clients)
+    
+    async def send_to_user(self, user_id: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Send message to every connection of one user"""
+        clients = list(self.user_clients.get(user_id, ()))
+        if not clients:
+            return self._empty_broadcast_summary(message)
+        
+        return await self.broadcast_with_learning(message, target_clients=clients)
+    
+    def _empty_broadcast_summary(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Summary for a targeted broadcast that has no connected recipients"""
+        return {
+            "message_id": self._generate_message_id(message),
+            "total_clients": 0,
+            "successful_deliveries": 0,
+            "pending_deliveries": 0,
+            "failed_deliveries": 0,
+            "delivery_time_ms": 0.0,
+            "failures_learned": 0,
+            "optimizations_applied": 0
+        }
+    
     async def _deliver_to_client(self, client_id: str, message: Dict[str, Any], 
-                                message_id: str) -> MessageDeliveryRecord:
+                                message_id: str,
+                                trace: Optional[Dict[str, Any]] = None,
+                                lane: Optional[DeliveryLane] = None) -> MessageDeliveryRecord:
         """Deliver message to specific client with learning"""
         start_time = time.time()
         
@@ -294,6 +1361,7 @@ class LearningWebSocketManager:
             
             connection = self.connections[client_id]
             websocket = connection.websocket
+            lane = lane or self._select_lane(connection)
             
             # Prepare message for delivery
             delivery_message = {
@@ -303,31 +1371,49 @@ class LearningWebSocketManager:
                 "_expects_ack": True
             }
             
-            # Compress if beneficial
-            message_data = json.dumps(delivery_message)
-            if self.compression_enabled and len(message_data) > self.compression_threshold:
-                message_data = await self._compress_message(message_data)
-                delivery_message["_compressed"] = True
-            
-            # Send message
-            await websocket.send(message_data)
+            with self.tracer.span(trace, "serialize", client_id=client_id):
+                message_data = json.dumps(delivery_message)
             
             # Record pending acknowledgment
             self.pending_acknowledgments[f"{client_id}_{message_id}"] = {
                 "client_id": client_id,
                 "message_id": message_id,
                 "sent_at": datetime.now(),
-                "timeout": datetime.now() + timedelta(seconds=30)
+                "sent_monotonic": time.monotonic(),
+                "timeout": datetime.now() + timedelta(seconds=30),
+                "trace": trace,
+                "sent_ns": time.time_ns() if trace else None
             }
             
+            msg_type = message.get("type", "unknown")
+            # Weak clients that can parse batch frames get them instead of one frame per message
+            coalesced = bool(lane.coalesce_ms) and "batching" in connection.client_capabilities
+            if coalesced:
+                self._enqueue_coalesced(connection, lane, message_id, msg_type, message_data)
+            else:
+                # Compress if beneficial
+                raw_data = message_data
+                if self._should_compress_for_lane(message_data, lane):
+                    with self.tracer.span(trace, "compress", client_id=client_id, raw_bytes=len(message_data)):
+                        message_data = await self._compress_message(message_data, lane.compression_level)
+                
+                # Send message
+                with self.tracer.span(trace, "socket_write", client_id=client_id, bytes=len(message_data)):
+                    await websocket.send(message_data)
+                self._record_send_result(connection, True)
+                self._account_outbound(connection, msg_type, raw_data, message_data)
+            
             delivery_time = (time.time() - start_time) * 1000
+            if self.shared_metrics and not coalesced:
+                self.shared_metrics.observe("delivery_latency_ms", delivery_time)
             
             return MessageDeliveryRecord(
                 message_id=message_id,
                 client_id=client_id,
                 timestamp=datetime.now(),
                 success=True,
-                delivery_time_ms=delivery_time
+                delivery_time_ms=delivery_time,
+                pending=coalesced
             )
             
         except Exception as e:
@@ -354,6 +1440,18 @@ class LearningWebSocketManager:
         logger.info(f"Learning from {len(failures)} delivery failures")
         
         for failure in failures:
+            # A known pattern (possibly restored from a snapshot) is fixed
+            # right away without another round of analysis
+            pattern_key = self.failure_sampler.fingerprint("message_delivery", failure.error)
+            known_pattern = self.failure_patterns.get(pattern_key)
+            if known_pattern is not None:
+                await self._apply_delivery_fix({"root_cause": known_pattern.root_cause}, failure)
+                self.performance_metrics["patterns_reused"] += 1
+                continue
+
+            if not self.failure_sampler.should_capture("message_delivery", failure.error):
+                continue
+
             try:
                 # Create comprehensive error context
                 error_context = {
@@ -384,7 +1482,7 @@ class LearningWebSocketManager:
                 prevention_rule = await self.learning_system.create_prevention_rule(learning, fix_result)
                 
                 # Update failure patterns
-                await self._update_failure_patterns(learning, fix_result)
+                await self._update_failure_patterns(pattern_key, learning, fix_result)
                 
                 logger.info(f"Learned from delivery failure: {learning['error_id']}")
                 
@@ -523,6 +1621,9 @@ class LearningWebSocketManager:
                 # Update active connection count
                 self.performance_metrics["active_connections"] = len(self.connections)
                 
+                # Keep per-client auxiliary state bounded
+                self._evict_departed_client_state()
+                
                 await asyncio.sleep(30)  # Check every 30 seconds
                 
             except Exception as e:
@@ -568,6 +1669,219 @@ class LearningWebSocketManager:
                 logger.error(f"Learning processor error: {e}")
                 await asyncio.sleep(300)
     
+    async def state_persister(self):
+        """Periodically snapshot learned state without blocking the event loop"""
+        while self.running:
+            try:
+                await asyncio.sleep(self.state_snapshot_interval)
+                await self._persist_state()
+                
+            except Exception as e:
+                logger.error(f"State persister error: {e}")
+    
+    # Warm-start persistence
+    async def _load_persisted_state(self):
+        """Restore failure patterns, sampler fingerprints and peer state from the last snapshot"""
+        try:
+            state = await asyncio.to_thread(self.state_store.load)
+        except Exception as e:
+            logger.error(f"Failed to load persisted manager state: {e}")
+            return
+        
+        for pattern_id, data in state.get("failure_pattern", {}).items():
+            if ":" not in pattern_id and data.get("symptoms"):
+                # Snapshots from before patterns were fingerprinted are keyed by error id
+                pattern_id = data["pattern_id"] = self.failure_sampler.fingerprint(
+                    "message_delivery", data["symptoms"][0])
+            data["learned_at"] = datetime.fromisoformat(data["learned_at"])
+            self.failure_patterns.setdefault(pattern_id, FailurePattern(**data))
+        
+        for peer_key, data in state.get("peer", {}).items():
+            self.peer_state.setdefault(peer_key, data)
+        
+        self.failure_sampler.restore_state(state.get("failure_fingerprint", {}))
+        
+        # Remember what is on disk so the first snapshot only writes changes
+        for kind, rows in state.items():
+            for key, data in rows.items():
+                self._persisted_state[(kind, key)] = json.dumps(data, sort_keys=True, default=str)
+        
+        logger.info(f"Warm start: restored {len(state.get('failure_pattern', {}))} failure patterns "
+                    f"and state for {len(state.get('peer', {}))} peers")
+    
+    async def _persist_state(self):
+        """Write changed state to the store in one batch on a worker thread"""
+        self._capture_peer_state()
+        
+        current: Dict[Tuple[str, str], str] = {}
+        for pattern_id, pattern in self.failure_patterns.items():
+            current[("failure_pattern", pattern_id)] = json.dumps(asdict(pattern), sort_keys=True, default=str)
+        for peer_key, data in self.peer_state.items():
+            current[("peer", peer_key)] = json.dumps(data, sort_keys=True, default=str)
+        for fingerprint, data in self.failure_sampler.export_state().items():
+            current[("failure_fingerprint", fingerprint)] = json.dumps(data, sort_keys=True)
+        
+        upserts = [(kind, key, payload) for (kind, key), payload in current.items()
+                   if self._persisted_state.get((kind, key)) != payload]
+        deletes = [row for row in self._persisted_state if row not in current]
+        
+        if not upserts and not deletes:
+            return
+        
+        await asyncio.to_thread(self.state_store.write_batch, upserts, deletes)
+        self._persisted_state = current
+        logger.debug(f"Persisted {len(upserts)} state changes, removed {len(deletes)}")
+    
+    def _peer_key(self, connection: ConnectionInfo) -> str:
+        """Stable identity of the peer behind a connection"""
+        if connection.user_id:
+            return f"user:{connection.user_id}"
+        try:
+            return f"host:{connection.websocket.remote_address[0]}"
+        except (AttributeError, IndexError, TypeError):
+            return f"client:{connection.client_id}"
+    
+    def _remember_peer(self, connection: ConnectionInfo):
+        """Copy a connection's quality and breaker state into its peer record"""
+        peer_key = self._peer_key(connection)
+        # A host can be a NAT or proxy shared by many clients, so one client's
+        # failures must not open the breaker for its neighbours
+        breaker = self.circuit_breakers.get(connection.client_id) if peer_key.startswith("user:") else None
+        self.peer_state.pop(peer_key, None)  # Re-insert to keep LRU order
+        self.peer_state[peer_key] = {
+            "connection_quality": connection.connection_quality,
+            "rtt_ewma_ms": connection.rtt_ewma_ms,
+            "failure_ewma": connection.failure_ewma,
+            "circuit_breaker": {
+                **breaker,
+                "next_attempt": breaker["next_attempt"].isoformat() if breaker.get("next_attempt") else None
+            } if breaker else None,
+            "updated_at": datetime.now().isoformat()
+        }
+    
+    def _capture_peer_state(self):
+        """Copy live quality and breaker state into the per-peer snapshot"""
+        for connection in self.connections.values():
+            self._remember_peer(connection)
+        
+        # Forget peers that have not been seen for a week
+        cutoff = (datetime.now() - timedelta(days=7)).isoformat()
+        for peer_key in [key for key, data in self.peer_state.items() if data["updated_at"] < cutoff]:
+            del self.peer_state[peer_key]
+            self.eviction_counts["peer_state"] += 1
+    
+    def _restore_peer_state(self, connection: ConnectionInfo):
+        """Seed a new connection with what was learned about its peer"""
+        data = self.peer_state.get(self._peer_key(connection))
+        if not data:
+            return
+        
+        connection.connection_quality = data.get("connection_quality", 1.0)
+        connection.rtt_ewma_ms = data.get("rtt_ewma_ms")
+        connection.failure_ewma = data.get("failure_ewma", 1.0 - connection.connection_quality)
+        
+        breaker = data.get("circuit_breaker")
+        if breaker and breaker.get("state") != "closed" and self._peer_key(connection).startswith("user:"):
+            self.circuit_breakers[connection.client_id] = {
+                **breaker,
+                "next_attempt": datetime.fromisoformat(breaker["next_attempt"]) if breaker.get("next_attempt") else None
+            }
+    
+    # Bounded memory
+    def _evict_departed_client_state(self):
+        """Drop auxiliary state of departed clients by TTL, LRU and memory budget"""
+        now = time.monotonic()
+        over_budget = (self.memory_budget_bytes is not None and
+                       self._approximate_memory_total() > self.memory_budget_bytes)
+        
+        while self.departed_clients:
+            client_id, departed_at = next(iter(self.departed_clients.items()))
+            expired = now - departed_at > self.departed_client_ttl
+            if not (over_budget or expired or len(self.departed_clients) > self.max_departed_clients):
+                break
+            self.departed_clients.popitem(last=False)
+            self._evict_client_state(client_id)
+        
+        # Sweep state created for clients that never had a live connection
+        orphans = set()
+        for structure in (self.circuit_breakers, self.message_buffer, self.coalesce_buffers):
+            orphans.update(key for key in structure
+                           if key not in self.connections and key not in self.departed_clients)
+        for client_id in orphans:
+            self._evict_client_state(client_id)
+        
+        while len(self.peer_state) > self.max_peer_states:
+            del self.peer_state[next(iter(self.peer_state))]
+            self.eviction_counts["peer_state"] += 1
+        
+        if over_budget:
+            logger.warning(f"Memory budget of {self.memory_budget_bytes} bytes exceeded; "
+                           f"evicted all departed client state")
+    
+    def _evict_client_state(self, client_id: str):
+        """Remove one client's entries from every per-client structure"""
+        for name, structure in (("circuit_breakers", self.circuit_breakers),
+                                ("message_buffer", self.message_buffer),
+                                ("coalesce_buffers", self.coalesce_buffers)):
+            if structure.pop(client_id, None) is not None:
+                self.eviction_counts[name] += 1
+        self.eviction_counts["clients"] += 1
+    
+    @staticmethod
+    def _approximate_size(obj: Any, sample: int = 20, depth: int = 3) -> int:
+        """Approximate deep size, extrapolating from a sample of container items"""
+        size = sys.getsizeof(obj)
+        if depth == 0:
+            return size
+        
+        if isinstance(obj, dict):
+            items = list(obj.items())[:sample]
+            if items:
+                per_item = sum(LearningWebSocketManager._approximate_size(k, sample, depth - 1) +
+                               LearningWebSocketManager._approximate_size(v, sample, depth - 1)
+                               for k, v in items) / len(items)
+                size += int(per_item * len(obj))
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            items = list(obj)[:sample]
+            if items:
+                per_item = sum(LearningWebSocketManager._approximate_size(i, sample, depth - 1)
+                               for i in items) / len(items)
+                size += int(per_item * len(obj))
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            size += LearningWebSocketManager._approximate_size(vars(obj), sample, depth - 1)
+        return size
+    
+    def _tracked_structures(self) -> Dict[str, Any]:
+        return {
+            "circuit_breakers": self.circuit_breakers,
+            "message_buffer": self.message_buffer,
+            "coalesce_buffers": self.coalesce_buffers,
+            "pending_acknowledgments": self.pending_acknowledgments,
+            "departed_clients": self.departed_clients,
+            "peer_state": self.peer_state,
+            "failure_patterns": self.failure_patterns,
+            "message_history": self.message_history,
+            "connection_history": self.connection_history,
+            "handshake_times": self.handshake_times,
+            "trace_spans": self.tracer.spans
+        }
+    
+    def _approximate_memory_total(self) -> int:
+        return sum(self._approximate_size(structure) for structure in self._tracked_structures().values())
+    
+    def get_memory_report(self) -> Dict[str, Any]:
+        """Approximate memory per structure and eviction counts"""
+        structures = {
+            name: {"entries": len(structure), "approx_bytes": self._approximate_size(structure)}
+            for name, structure in self._tracked_structures().items()
+        }
+        return {
+            "budget_bytes": self.memory_budget_bytes,
+            "approx_total_bytes": sum(entry["approx_bytes"] for entry in structures.values()),
+            "structures": structures,
+            "evictions": dict(self.eviction_counts)
+        }
+    
     # Helper methods
     def _generate_client_id(self, websocket: WebSocketServerProtocol) -> str:
         """Generate unique client ID"""
@@ -581,33 +1895,409 @@ class LearningWebSocketManager:
         timestamp = datetime.now().isoformat()
         return hashlib.md5(f"{content}_{timestamp}".encode()).hexdigest()[:8]
     
+    async def _authenticate_client(self, websocket: WebSocketServerProtocol,
+                                   path: str) -> Optional[Dict[str, Any]]:
+        """Validate the handshake token and return the client identity"""
+        if self.token_validator is None:
+            return None
+        
+        token = self._extract_auth_token(websocket, path)
+        if not token:
+            return None
+        
+        identity = self.token_cache.get(token)
+        if identity is not None:
+            return identity
+        
+        try:
+            identity = self.token_validator(token)
+            if asyncio.iscoroutine(identity):
+                identity = await identity
+        except Exception as e:
+            logger.warning(f"Token validation failed: {e}")
+            return None
+        
+        if identity:
+            self.token_cache.put(token, identity)
+        return identity or None
+    
+    def _extract_auth_token(self, websocket: WebSocketServerProtocol, path: str) -> Optional[str]:
+        """Read the bearer token from the Authorization header or ?token= query"""
+        headers = getattr(websocket, "request_headers", None)
+        if headers is None and getattr(websocket, "request", None) is not None:
+            headers = websocket.request.headers
+        
+        authorization = headers.get("Authorization", "") if headers else ""
+        if authorization.lower().startswith("bearer "):
+            return authorization[7:].strip()
+        
+        query = parse_qs(urlparse(path or getattr(websocket, "path", "") or "").query)
+        tokens = query.get("token")
+        return tokens[0] if tokens else None
+    
+    def _extract_client_capabilities(self, websocket: WebSocketServerProtocol, path: str) -> FrozenSet[str]:
+        """
+        Capabilities the client declared in the X-Client-Capabilities header or
+        ?capabilities= query (comma separated), limited to what the server offers
+        """
+        headers = getattr(websocket, "request_headers", None)
+        declared = headers.get("X-Client-Capabilities", "") if headers else ""
+        if not declared:
+            query = parse_qs(urlparse(path or getattr(websocket, "path", "") or "").query)
+            declared = ",".join(query.get("capabilities", []))
+        
+        names = {name.strip() for name in declared.split(",")}
+        return frozenset(names & set(self.server_capabilities))
+    
+    def _tune_socket(self, websocket: WebSocketServerProtocol):
+        """Apply the runtime profile's TCP options to an accepted connection"""
+        profile = self.runtime_profile
+        if not profile.tcp_keepalive:
+            return
+        
+        transport = getattr(websocket, "transport", None)
+        sock = transport.get_extra_info("socket") if transport else None
+        if sock is None:
+            return
+        
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, "TCP_KEEPIDLE"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, profile.keepalive_idle)
+        except OSError as e:
+            logger.debug(f"Could not tune socket options: {e}")
+    
+    def _build_welcome_prefix(self) -> str:
+        """Serialize the connection-independent part of the welcome frame"""
+        static_part = json.dumps({
+            "type": "welcome",
+            "server_capabilities": self.server_capabilities,
+            "control_frames": {"ping": CONTROL_PING, "pong": CONTROL_PONG, "ack": CONTROL_ACK},
+            "max_message_bytes": self.max_inbound_message_bytes
+        })
+        return static_part[:-1]  # Leave the object open for per-client fields
+    
+    def _welcome_frame(self, client_id: str, authenticated: bool) -> str:
+        """Complete the precomputed welcome frame for one client"""
+        return (f'{self._welcome_prefix}, "client_id": {json.dumps(client_id)}, '
+                f'"authenticated": {"true" if authenticated else "false"}}}')
+    
+    def _record_handshake(self, started_at: float):
+        """Record a completed handshake for rate and latency reporting"""
+        now = time.monotonic()
+        self.handshake_times.append((now, (now - started_at) * 1000))
+    
+    def get_handshake_stats(self, window_seconds: float = 10.0) -> Dict[str, Any]:
+        """Get measured handshake throughput and latency"""
+        cutoff = time.monotonic() - window_seconds
+        recent = [duration for finished_at, duration in self.handshake_times if finished_at >= cutoff]
+        
+        return {
+            "connections_per_second": len(recent) / window_seconds,
+            "average_handshake_ms": sum(recent) / len(recent) if recent else 0.0,
+            "window_seconds": window_seconds,
+            "token_cache": self.token_cache.get_stats()
+        }
+    
+    def _index_connection(self, connection: ConnectionInfo):
+        """Add connection to the organization and user indexes"""
+        if connection.organization_id:
+            self.organization_clients[connection.organization_id].add(connection.client_id)
+        if connection.user_id:
+            self.user_clients[connection.user_id].add(connection.client_id)
+    
+    def _unindex_connection(self, connection: ConnectionInfo):
+        """Remove connection from the organization and user indexes"""
+        for index, key in ((self.organization_clients, connection.organization_id),
+                           (self.user_clients, connection.user_id)):
+            if key and key in index:
+                index[key].discard(connection.client_id)
+                if not index[key]:
+                    del index[key]
+    
     def _get_client_quality(self, client_id: str) -> float:
         """Get connection quality score for client"""
         if client_id not in self.connections:
             return 0.0
         
-        connection = self.connections[client_id]
+        return self._refresh_quality(self.connections[client_id])
+    
+    def _refresh_quality(self, connection: ConnectionInfo) -> float:
+        """
+        Recompute quality from failure rate, ack RTT and send buffer occupancy.
+        
+        The failure rate decays toward zero while no new failures arrive, so a
+        client that stops failing recovers its score over time.
+        """
+        now = time.monotonic()
+        elapsed = now - connection.quality_updated_at
+        connection.quality_updated_at = now
+        if connection.failure_ewma and elapsed > 0:
+            connection.failure_ewma *= math.pow(0.5, elapsed / self.quality_recovery_half_life)
         
-        # Calculate quality based on various factors
-        if connection.total_messages == 0:
-            return 1.0
+        rtt_factor = 1.0
+        if connection.rtt_ewma_ms and connection.rtt_ewma_ms > self.rtt_target_ms:
+            rtt_factor = self.rtt_target_ms / connection.rtt_ewma_ms
         
-        failure_rate = connection.failed_sends / connection.total_messages
-        quality = 1.0 - failure_rate
+        buffer_factor = 1.0 - self._send_buffer_occupancy(connection)
+        
+        quality = (1.0 - connection.failure_ewma) * rtt_factor * buffer_factor
+        connection.connection_quality = max(0.0, min(1.0, quality))
+        return connection.connection_quality
+    
+    def _send_buffer_occupancy(self, connection: ConnectionInfo) -> float:
+        """Fraction of the transport's write buffer high-water mark in use"""
+        transport = getattr(connection.websocket, "transport", None)
+        if transport is None:
+            return 0.0
+        
+        try:
+            high_water = transport.get_write_buffer_limits()[1]
+            if not high_water:
+                return 0.0
+            return min(1.0, transport.get_write_buffer_size() / high_water)
+        except (AttributeError, NotImplementedError):
+            return 0.0
+    
+    def _record_send_result(self, connection: ConnectionInfo, success: bool):
+        """Fold one send outcome into the connection's failure rate"""
+        alpha = self.quality_ewma_alpha
+        if success:
+            connection.sent_messages += 1
+        else:
+            connection.failed_sends += 1
+        connection.failure_ewma = (1 - alpha) * connection.failure_ewma + alpha * (0.0 if success else 1.0)
+    
+    def _record_ack_rtt(self, connection: ConnectionInfo, rtt_ms: float):
+        """Fold one ack round trip into the connection's RTT average"""
+        if connection.rtt_ewma_ms is None:
+            connection.rtt_ewma_ms = rtt_ms
+        else:
+            alpha = self.quality_ewma_alpha
+            connection.rtt_ewma_ms = (1 - alpha) * connection.rtt_ewma_ms + alpha * rtt_ms
+    
+    def _select_lane(self, connection: ConnectionInfo) -> DeliveryLane:
+        """Pick the delivery lane matching the connection's current quality"""
+        quality = self._refresh_quality(connection)
+        for lane in self.delivery_lanes:
+            if quality >= lane.min_quality:
+                return lane
+        return self.delivery_lanes[-1]
+    
+    def _order_by_lane(self, clients: List[str]) -> List[Tuple[str, Optional[DeliveryLane]]]:
+        """Pair recipients with their lane, ordered so better lanes are served first"""
+        rank = {lane.name: position for position, lane in enumerate(self.delivery_lanes)}
+        
+        recipients = []
+        for client_id in clients:
+            connection = self.connections.get(client_id)
+            recipients.append((client_id, self._select_lane(connection) if connection else None))
         
-        return max(0.0, min(1.0, quality))
+        return sorted(recipients, key=lambda recipient: rank[recipient[1].name] if recipient[1] else len(rank))
+    
+    def _should_compress_for_lane(self, message_data: str, lane: DeliveryLane) -> bool:
+        """Check the lane-adjusted compression threshold"""
+        return (self.compression_enabled and
+                len(message_data) > self.compression_threshold * lane.compression_threshold_factor)
+    
+    def _enqueue_coalesced(self, connection: ConnectionInfo, lane: DeliveryLane,
+                           message_id: str, msg_type: str, message_data: str):
+        """Buffer a frame for a coalesced lane, scheduling a flush for the first one"""
+        client_id = connection.client_id
+        buffer = self.coalesce_buffers.setdefault(client_id, [])
+        buffer.append((message_id, msg_type, message_data))
+        if len(buffer) == 1:
+            task = asyncio.create_task(self._flush_coalesced_after(client_id, lane))
+            self.coalesce_tasks[client_id] = (task, lane)
+            task.add_done_callback(functools.partial(self._forget_coalesce_task, client_id))
+    
+    def _forget_coalesce_task(self, client_id: str, task: asyncio.Task):
+        entry = self.coalesce_tasks.get(client_id)
+        if entry is not None and entry[0] is task:
+            del self.coalesce_tasks[client_id]
+    
+    def _cancel_coalesced(self, client_id: str):
+        """Drop a departed client's buffered frames and its pending flush"""
+        entry = self.coalesce_tasks.pop(client_id, None)
+        if entry is not None:
+            entry[0].cancel()
+        self.coalesce_buffers.pop(client_id, None)
+    
+    async def _flush_all_coalesced(self):
+        """Send every buffered frame now instead of waiting for its window"""
+        entries = list(self.coalesce_tasks.items())
+        self.coalesce_tasks.clear()
+        for _, (task, _) in entries:
+            task.cancel()
+        await asyncio.gather(*(task for _, (task, _) in entries), return_exceptions=True)
+        for client_id, (_, lane) in entries:
+            await self._flush_coalesced(client_id, lane)
+    
+    async def _flush_coalesced_after(self, client_id: str, lane: DeliveryLane):
+        """Send everything buffered for a client once the coalescing window closes"""
+        await asyncio.sleep(lane.coalesce_ms / 1000)
+        await self._flush_coalesced(client_id, lane)
+    
+    async def _flush_coalesced(self, client_id: str, lane: DeliveryLane):
+        """Write a client's buffered frames as one batch frame"""
+        frames = self.coalesce_buffers.pop(client_id, [])
+        connection = self.connections.get(client_id)
+        if not frames or connection is None:
+            return
+        
+        if len(frames) == 1:
+            message_data = frames[0][2]
+        else:
+            message_data = '{"type": "batch", "messages": [' + ", ".join(frame for _, _, frame in frames) + ']}'
+        
+        try:
+            raw_size = self._frame_size(message_data)
+            if self._should_compress_for_lane(message_data, lane):
+                message_data = await self._compress_message(message_data, lane.compression_level)
+            await connection.websocket.send(message_data)
+            
+            # Ack round trips are measured from the actual send
+            sent_monotonic = time.monotonic()
+            for message_id, _, _ in frames:
+                pending = self.pending_acknowledgments.get(f"{client_id}_{message_id}")
+                if pending:
+                    pending["sent_monotonic"] = sent_monotonic
+            self._record_send_result(connection, True)
+            
+            # Split the batch's wire bytes across the message types it carried
+            wire_size = self._frame_size(message_data)
+            for position, (_, msg_type, frame) in enumerate(frames):
+                share = len(frame) / max(raw_size, 1)
+                self._account_outbound_sizes(connection, msg_type, len(frame), int(wire_size * share),
+                                             frames=1 if position == 0 else 0)
+            
+        except Exception as e:
+            logger.error(f"Coalesced delivery failed to {client_id}: {e}")
+            await self._analyze_delivery_failure(client_id, {"type": "batch", "messages": len(frames)}, e)
     
     async def _send_to_client(self, client_id: str, message: Dict[str, Any]):
         """Send message to specific client"""
         if client_id in self.connections:
             connection = self.connections[client_id]
-            await connection.websocket.send(json.dumps(message))
+            message_data = json.dumps(message)
+            await connection.websocket.send(message_data)
+            self._account_outbound(connection, message.get("type", "unknown"), message_data, message_data)
+    
+    # Bandwidth accounting
+    @staticmethod
+    def _frame_size(data: Any) -> int:
+        """Bytes a frame occupies on the wire (text frames are UTF-8 encoded)"""
+        if isinstance(data, (bytes, bytearray)):
+            return len(data)
+        return len(data) if data.isascii() else len(data.encode())
+    
+    def _type_counters(self, msg_type: str) -> Dict[str, int]:
+        """Counters for a message type; rare types fold into "other" past the cap"""
+        if msg_type not in self.bandwidth_by_type and len(self.bandwidth_by_type) >= self.max_tracked_message_types:
+            msg_type = "other"
+        
+        counters = self.bandwidth_by_type.get(msg_type)
+        if counters is None:
+            counters = self.bandwidth_by_type[msg_type] = {
+                "frames_in": 0, "bytes_in": 0, "frames_out": 0, "bytes_out": 0, "raw_bytes_out": 0
+            }
+        return counters
+    
+    def _account_inbound(self, connection: ConnectionInfo, msg_type: str, raw_message: Any):
+        """Count one received frame"""
+        size = self._frame_size(raw_message)
+        connection.frames_in += 1
+        connection.bytes_in += size
+        counters = self._type_counters(msg_type)
+        counters["frames_in"] += 1
+        counters["bytes_in"] += size
+        self.top_talkers.add(connection.client_id, size)
+        if self.capture is not None:
+            self.capture.record(DIRECTION_INBOUND, connection.client_id, msg_type, size)
+    
+    def _account_rejected_inbound(self, client_id: str, msg_type: str, raw_message: Any):
+        """Count a received frame that was rejected before it had a message type"""
+        connection = self.connections.get(client_id)
+        if connection is not None:
+            self._account_inbound(connection, msg_type, raw_message)
+    
+    def _account_outbound(self, connection: ConnectionInfo, msg_type: str, raw_data: Any, wire_data: Any):
+        """Count one sent frame, before and after compression"""
+        raw_size = self._frame_size(raw_data)
+        wire_size = raw_size if wire_data is raw_data else self._frame_size(wire_data)
+        self._account_outbound_sizes(connection, msg_type, raw_size, wire_size)
+    
+    def _account_outbound_sizes(self, connection: ConnectionInfo, msg_type: str,
+                                raw_size: int, wire_size: int, frames: int = 1):
+        """Add sizes to the connection, its message type and the talker sketch"""
+        connection.frames_out += frames
+        connection.bytes_out += wire_size
+        connection.raw_bytes_out += raw_size
+        counters = self._type_counters(msg_type)
+        counters["frames_out"] += frames
+        counters["bytes_out"] += wire_size
+        counters["raw_bytes_out"] += raw_size
+        self.top_talkers.add(connection.client_id, wire_size)
+        if self.capture is not None:
+            self.capture.record(DIRECTION_OUTBOUND, connection.client_id, msg_type, wire_size)
+    
+    def start_capture(self, path: str, sample_rate: float = 1.0):
+        """Start recording anonymized frame metadata to a capture log"""
+        self.stop_capture()
+        self.capture = TrafficCapture(path, sample_rate=sample_rate)
+        logger.info(f"Capturing {sample_rate:.0%} of client traffic to {path}")
+    
+    def stop_capture(self) -> int:
+        """Stop recording; returns the number of frames captured"""
+        if self.capture is None:
+            return 0
+        frames = self.capture.frames_recorded
+        self.capture.close()
+        self.capture = None
+        logger.info(f"Traffic capture stopped after {frames} frames")
+        return frames
+    
+    def get_bandwidth_report(self, top_n: int = 10) -> Dict[str, Any]:
+        """Bandwidth totals, per-type breakdown and heaviest clients"""
+        talkers = []
+        for client_id, estimated_bytes, error_bound in self.top_talkers.top(top_n):
+            connection = self.connections.get(client_id)
+            talkers.append({
+                "client_id": client_id,
+                "estimated_bytes": estimated_bytes,
+                "error_bound": error_bound,
+                "connected": connection is not None,
+                "user_id": connection.user_id if connection else None,
+                "organization_id": connection.organization_id if connection else None,
+                "bytes_in": connection.bytes_in if connection else None,
+                "bytes_out": connection.bytes_out if connection else None
+            })
+        
+        bytes_out = sum(c["bytes_out"] for c in self.bandwidth_by_type.values())
+        raw_bytes_out = sum(c["raw_bytes_out"] for c in self.bandwidth_by_type.values())
+        return {
+            "bytes_in": sum(c["bytes_in"] for c in self.bandwidth_by_type.values()),
+            "bytes_out": bytes_out,
+            "raw_bytes_out": raw_bytes_out,
+            "compression_ratio": bytes_out / raw_bytes_out if raw_bytes_out else 1.0,
+            "by_type": self.bandwidth_by_type,
+            "top_talkers": talkers
+        }
     
     async def _cleanup_connection(self, client_id: str):
         """Clean up connection resources"""
         if client_id in self.connections:
-            del self.connections[client_id]
+            connection = self.connections.pop(client_id)
+            self._unindex_connection(connection)
+            self._release_admission(connection.remote_host)
+            if self.state_store:
+                self._remember_peer(connection)
             self.performance_metrics["active_connections"] -= 1
+            self.departed_clients[client_id] = time.monotonic()
+            if self.capture is not None:
+                self.capture.forget_client(client_id)
+        
+        self._cancel_coalesced(client_id)
         
         # Clean up pending acknowledgments
         to_remove = [key for key in self.pending_acknowledgments.keys() if key.startswith(f"{client_id}_")]
@@ -624,13 +2314,46 @@ class LearningWebSocketManager:
         # In real implementation, this would manage subscriptions
         await self._send_to_client(client_id, {"type": "subscription_ack", "subscription": message.get("channel", "unknown")})
     
+    async def _handle_control_frame(self, client_id: str, frame: str) -> bool:
+        """Handle a compact control frame; returns False if it is not one"""
+        if frame.startswith(CONTROL_ACK):
+            msg_type = "ack"
+        elif frame.startswith(CONTROL_PING):
+            msg_type = "ping"
+        else:
+            return False
+        
+        connection = self.connections.get(client_id)
+        if connection is not None:
+            connection.total_messages += 1
+            connection.last_ping = datetime.now()
+            self._account_inbound(connection, msg_type, frame)
+        self.performance_metrics["control_frames"] += 1
+        
+        if msg_type == "ack":
+            self._acknowledge(client_id, frame[len(CONTROL_ACK):])
+        elif connection is not None:
+            pong = CONTROL_PONG + frame[len(CONTROL_PING):]
+            await connection.websocket.send(pong)
+            self._account_outbound(connection, "pong", pong, pong)
+        return True
+    
     async def _handle_acknowledgment(self, client_id: str, message: Dict[str, Any]):
         """Handle message acknowledgment"""
-        message_id = message.get("message_id")
+        self._acknowledge(client_id, message.get("message_id"))
+    
+    def _acknowledge(self, client_id: str, message_id: Optional[str]):
+        """Resolve a pending acknowledgment and record its round trip"""
         if message_id:
             ack_key = f"{client_id}_{message_id}"
             if ack_key in self.pending_acknowledgments:
-                del self.pending_acknowledgments[ack_key]
+                pending = self.pending_acknowledgments.pop(ack_key)
+                if client_id in self.connections:
+                    rtt_ms = (time.monotonic() - pending["sent_monotonic"]) * 1000
+                    self._record_ack_rtt(self.connections[client_id], rtt_ms)
+                if pending.get("trace"):
+                    self.tracer.record_span(pending["trace"], "ack_wait", pending["sent_ns"],
+                                            time.time_ns(), client_id=client_id)
                 logger.debug(f"Received ack for message {message_id} from {client_id}")
     
     async def _handle_custom_message(self, client_id: str, message: Dict[str, Any]):
@@ -639,9 +2362,9 @@ class LearningWebSocketManager:
         logger.info(f"Received custom message from {client_id}: {message.get('type', 'unknown')}")
     
     # Learning and optimization methods
-    async def _compress_message(self, data: str) -> str:
+    async def _compress_message(self, data: str, level: int = 9) -> str:
         """Compress message data"""
-        return gzip.compress(data.encode()).decode('latin1')
+        return gzip.compress(data.encode(), compresslevel=level).decode('latin1')
     
     def _should_compress_message(self, message: Dict[str, Any]) -> bool:
         """Determine if message should be compressed"""
@@ -666,7 +2389,7 @@ class LearningWebSocketManager:
         logger.info(f"Initiating connection recovery for {client_id}")
         # Mark connection for recovery attempt
         if client_id in self.connections:
-            self.connections[client_id].connection_quality *= 0.8  # Reduce quality
+            self._refresh_quality(self.connections[client_id])
     
     async def _implement_message_chunking(self, client_id: str):
         """Implement message chunking for client"""
@@ -701,11 +2424,14 @@ class LearningWebSocketManager:
         
         # Update connection quality
         if client_id in self.connections:
-            self.connections[client_id].failed_sends += 1
-            self.connections[client_id].connection_quality *= 0.9
+            self._record_send_result(self.connections[client_id], False)
+            self._refresh_quality(self.connections[client_id])
     
     async def _apply_connection_failure_learning(self, client_id: str, error: Exception, connection: ConnectionInfo):
         """Apply learning from connection failures"""
+        if not self.failure_sampler.should_capture("connection_handling", error):
+            return
+        
         error_context = {
             "error": error,
             "task": {"type": "connection_handling", "client_id": client_id},
@@ -721,6 +2447,9 @@ class LearningWebSocketManager:
     
     async def _apply_message_parsing_learning(self, client_id: str, raw_message: str, error: Exception):
         """Learn from message parsing failures"""
+        if not self.failure_sampler.should_capture("message_parsing", error):
+            return
+        
         error_context = {
             "error": error,
             "task": {"type": "message_parsing", "client_id": client_id, "raw_message": raw_message[:100]},
@@ -735,6 +2464,9 @@ class LearningWebSocketManager:
     
     async def _apply_message_handling_learning(self, client_id: str, raw_message: str, error: Exception):
         """Learn from message handling failures"""
+        if not self.failure_sampler.should_capture("message_handling", error):
+            return
+        
         error_context = {
             "error": error,
             "task": {"type": "message_handling", "client_id": client_id},
@@ -749,6 +2481,9 @@ class LearningWebSocketManager:
     
     async def _apply_server_failure_learning(self, error: Exception):
         """Learn from server startup failures"""
+        if not self.failure_sampler.should_capture("server_startup", error):
+            return
+        
         error_context = {
             "error": error,
             "task": {"type": "server_startup"},
@@ -830,10 +2565,15 @@ class LearningWebSocketManager:
         for pattern_id in old_patterns:
             del self.failure_patterns[pattern_id]
     
-    async def _update_failure_patterns(self, learning: Dict[str, Any], fix_result: Dict[str, Any]):
-        """Update failure patterns with new learning"""
-        pattern_id = learning.get("error_id", "unknown")
-        
+    async def _update_failure_patterns(self, pattern_id: str, learning: Dict[str, Any],
+                                       fix_result: Dict[str, Any]):
+        """
+        Update failure patterns with new learning.
+
+        Patterns are keyed by the failure fingerprint (handler, error type
+        and normalized message) rather than the per-capture error id, so a
+        repeat of the same failure, also after a restart, matches them.
+        """
         if pattern_id not in self.failure_patterns:
             pattern = FailurePattern(
                 pattern_id=pattern_id,
@@ -848,13 +2588,43 @@ class LearningWebSocketManager:
             self.failure_patterns[pattern_id] = pattern
             self.performance_metrics["patterns_learned"] += 1
 
+    def _get_lane_distribution(self) -> Dict[str, int]:
+        """Count connections currently assigned to each delivery lane"""
+        distribution = {lane.name: 0 for lane in self.delivery_lanes}
+        for connection in self.connections.values():
+            distribution[self._select_lane(connection).name] += 1
+        return distribution
+    
     def get_manager_status(self) -> Dict[str, Any]:
-        """Get comprehensive status of the WebSocket manager"""
+        """
+        Get comprehensive status of the WebSocket manager.
+        
+        Reads (and refreshes) per-connection state, so call it on the
+        manager's event loop; other threads use get_manager_status_threadsafe.
+        """
         return {
             "server_running": self.running,
             "active_connections": len(self.connections),
-            "performance_metrics": self.performance_metrics,
+            "organizations_connected": len(self.organization_clients),
+            "users_connected": len(self.user_clients),
+            "performance_metrics": dict(self.performance_metrics),
+            "cluster_metrics": self.shared_metrics.snapshot() if self.shared_metrics else None,
             "failure_patterns": len(self.failure_patterns),
+            "deduplication": self.dedup_cache.get_stats(),
+            "runtime_profile": self.runtime_profile.name,
+            "admission": self.get_admission_stats(),
+            "handshake": self.get_handshake_stats(),
+            "tracing": self.tracer.get_stats(),
+            "delivery_lanes": self._get_lane_distribution(),
+            "bandwidth": self.get_bandwidth_report(),
+            "failure_sampling": self.failure_sampler.get_stats(),
+            "memory": self.get_memory_report(),
+            "submissions": self.get_submission_backpressure(),
+            "capture": {
+                "active": self.capture is not None,
+                "path": self.capture.path if self.capture else None,
+                "frames_recorded": self.capture.frames_recorded if self.capture else 0
+            },
             "circuit_breakers": {
                 client_id: breaker["state"]
                 for client_id, breaker in self.circuit_breakers.items()
@@ -862,6 +2632,27 @@ class LearningWebSocketManager:
             "learning_stats": self.learning_system.get_learning_stats() if hasattr(self, 'learning_system') else {}
         }
 
+    async def _collect_status(self) -> Dict[str, Any]:
+        return self.get_manager_status()
+    
+    def get_manager_status_threadsafe(self, timeout: float = 2.0) -> Dict[str, Any]:
+        """
+        Status for callers on other threads, collected on the manager's event
+        loop so it never races connection handling. Raises TimeoutError if the
+        loop does not get to it within timeout seconds.
+        """
+        loop = self._loop
+        if loop is None or not self.running:
+            # Nothing else is touching the connections
+            return self.get_manager_status()
+        
+        future = asyncio.run_coroutine_threadsafe(self._collect_status(), loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
 # Global manager instance
 _manager_instance = None
 
@@ -869,5 +2660,91 @@ def get_websocket_manager() -> LearningWebSocketManager:
     """Get the global WebSocket manager instance"""
     global _manager_instance
     if _manager_instance is None:
-        _manager_instance = LearningWebSocketManager()
-    return _manager_instance
\ No newline at end of file
+        _manager_instance = LearningWebSocketManager(
+            state_path=os.environ.get("WEBSOCKET_STATE_PATH"),
+            trace_sample_rate=float(os.environ.get("WEBSOCKET_TRACE_SAMPLE_RATE", "0.0")),
+            runtime_profile=os.environ.get("WEBSOCKET_RUNTIME_PROFILE", "default"),
+            memory_budget_bytes=int(os.environ["WEBSOCKET_MEMORY_BUDGET_BYTES"])
+            if os.environ.get("WEBSOCKET_MEMORY_BUDGET_BYTES") else None,
+            max_connections_per_host=int(os.environ.get("WEBSOCKET_MAX_CONNECTIONS_PER_HOST", "50")),
+            trusted_proxies=[proxy.strip() for proxy in os.environ.get("WEBSOCKET_TRUSTED_PROXIES", "").split(",")
+                             if proxy.strip()]
+        )
+        if os.environ.get("WEBSOCKET_CAPTURE_PATH"):
+            _manager_instance.start_capture(
+                os.environ["WEBSOCKET_CAPTURE_PATH"],
+                sample_rate=float(os.environ.get("WEBSOCKET_CAPTURE_SAMPLE_RATE", "1.0"))
+            )
+    return _manager_instance
+
+def run_websocket_server(host: str = "localhost", port: int = 8765, profile_name: str = "default"):
+    """Run a standalone manager, installing the profile's event loop first"""
+    loop_name = install_event_loop(get_runtime_profile(profile_name))
+    logger.info(f"Runtime profile '{profile_name}' using {loop_name} event loop")
+    
+    async def serve_forever():
+        manager = LearningWebSocketManager(host, port, runtime_profile=profile_name)
+        await manager.start_server()
+        await asyncio.Future()
+    
+    asyncio.run(serve_forever())
+
+async def benchmark_runtime_profile(profile_name: str, clients: int = 100, messages: int = 200,
+                                    payload_bytes: int = 512) -> Dict[str, Any]:
+    """
+    Measure broadcast throughput and receive latency for one runtime profile.
+    
+    Starts a manager on an ephemeral port, connects the given number of local
+    clients and times how long every client takes to receive every message.
+    Compression is disabled on both ends so frames are measured, not codecs.
+    """
+    manager = LearningWebSocketManager("127.0.0.1", 0, runtime_profile=profile_name,
+                                       publish_shared_metrics=False)
+    manager.deduplication_enabled = False
+    manager.compression_enabled = False
+    manager.max_connections_per_host = manager.max_connections  # All clients are local
+    manager.accept_bucket = TokenBucket(rate=float(clients), burst=clients)
+    await manager.start_server()
+    port = manager.server.sockets[0].getsockname()[1]
+    
+    latencies: List[float] = []
+    
+    async def consume(ws):
+        await ws.recv()  # welcome
+        received = 0
+        while received < messages:
+            frame = json.loads(await ws.recv())
+            # Clients in a coalescing lane receive batches
+            batch = frame["messages"] if frame.get("type") == "batch" else [frame]
+            for message in batch:
+                latencies.append((time.time() - message["sent_at"]) * 1000)
+            received += len(batch)
+    
+    sockets = [await websockets.connect(f"ws://127.0.0.1:{port}", compression=None)
+               for _ in range(clients)]
+    consumers = [asyncio.create_task(consume(ws)) for ws in sockets]
+    while len(manager.connections) < clients:
+        await asyncio.sleep(0.01)
+    
+    padding = "x" * payload_bytes
+    started = time.perf_counter()
+    for sequence in range(messages):
+        await manager.broadcast_with_learning({"type": "benchmark", "seq": sequence,
+                                               "sent_at": time.time(), "padding": padding})
+    await asyncio.gather(*consumers)
+    elapsed = time.perf_counter() - started
+    
+    for ws in sockets:
+        await ws.close()
+    await manager.stop_server()
+    
+    latencies.sort()
+    return {
+        "profile": profile_name,
+        "loop": type(asyncio.get_running_loop()).__module__.split(".")[0],
+        "clients": clients,
+        "messages": messages,
+        "frames_per_second": clients * messages / elapsed,
+        "latency_p50_ms": latencies[len(latencies) // 2],
+        "latency_p99_ms": latencies[int(len(latencies) * 0.99)]
+    }
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Shared test configuration
+
+The route modules are deployed as the ``api`` package, so backend/src/routes
+is exposed under that name and tests import them exactly as the app does.
+"""
+
+import os
+import sys
+import types
+
+ROUTES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "routes")
+
+package = types.ModuleType("api")
+package.__path__ = [ROUTES_DIR]
+sys.modules["api"] = package
+
+# Keep test processes out of the cross-worker metrics file
+os.environ.setdefault("CALLABO_SHARED_METRICS", "0")
+
+class FakeWebSocket:
+    """Minimal stand-in for a server-side websocket connection"""
+
+    def __init__(self, remote_address=("127.0.0.1", 50000), request_headers=None):
+        self.remote_address = remote_address
+        self.request_headers = request_headers or {}
+        self.sent = []
+        self.closed = False
+        self.close_code = None
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=""):
+        self.closed = True
+        self.close_code = code
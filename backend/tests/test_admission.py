@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import LearningWebSocketManager, TokenBucket
+
+def test_token_bucket_allows_burst_then_refills(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2.0, burst=3)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.seconds_until_available() == pytest.approx(0.5)
+
+    now[0] += 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+    now[0] += 60
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+def test_per_host_limit_uses_trusted_forwarded_for():
+    manager = LearningWebSocketManager(publish_shared_metrics=False, trusted_proxies=["10.0.0.2"])
+    headers = {"X-Forwarded-For": "203.0.113.7, 10.0.0.2"}
+
+    assert manager._client_host(("10.0.0.2", 5000), headers) == "203.0.113.7"
+    # Untrusted peers cannot choose their host by sending the header
+    assert manager._client_host(("198.51.100.1", 5000), headers) == "198.51.100.1"
+    assert manager._client_host(("10.0.0.2", 5000), {}) == "10.0.0.2"
+
+def test_shed_clients_get_503_with_retry_after():
+    async def scenario():
+        manager = LearningWebSocketManager("127.0.0.1", 0, publish_shared_metrics=False,
+                                           max_connections_per_host=2)
+        await manager.start_server()
+        port = manager.server.sockets[0].getsockname()[1]
+
+        admitted = []
+        for _ in range(2):
+            ws = await websockets.connect(f"ws://127.0.0.1:{port}")
+            await ws.recv()  # welcome
+            admitted.append(ws)
+
+        with pytest.raises(websockets.exceptions.InvalidStatusCode) as rejected:
+            await websockets.connect(f"ws://127.0.0.1:{port}")
+
+        # A departed client frees its host slot
+        await admitted.pop().close()
+        await asyncio.sleep(0.1)
+        ws = await websockets.connect(f"ws://127.0.0.1:{port}")
+        await ws.recv()
+        admitted.append(ws)
+
+        stats = manager.get_admission_stats()
+        for ws in admitted:
+            await ws.close()
+        await manager.stop_server()
+        return rejected.value, stats
+
+    rejection, stats = asyncio.run(scenario())
+
+    assert rejection.status_code == 503
+    assert int(rejection.headers["Retry-After"]) >= 60
+    assert stats["rejected"] == {"host_limit": 1}
+    assert stats["admitted"] == 3
+
+def test_accept_rate_limit_sheds_excess_handshakes():
+    async def scenario():
+        manager = LearningWebSocketManager("127.0.0.1", 0, publish_shared_metrics=False)
+        manager.accept_bucket = TokenBucket(rate=0.1, burst=2)
+        await manager.start_server()
+        port = manager.server.sockets[0].getsockname()[1]
+
+        statuses = []
+        sockets = []
+        for _ in range(4):
+            try:
+                ws = await websockets.connect(f"ws://127.0.0.1:{port}")
+                await ws.recv()
+                sockets.append(ws)
+                statuses.append(101)
+            except websockets.exceptions.InvalidStatusCode as e:
+                statuses.append(e.status_code)
+
+        for ws in sockets:
+            await ws.close()
+        await manager.stop_server()
+        return statuses
+
+    assert asyncio.run(scenario()) == [101, 101, 503, 503]
+
+def test_concurrent_handshakes_cannot_exceed_the_global_cap():
+    async def slow_validator(token):
+        await asyncio.sleep(0.2)  # Holds admitted handshakes before they are registered
+        return {"user_id": token}
+
+    async def scenario():
+        manager = LearningWebSocketManager("127.0.0.1", 0, publish_shared_metrics=False,
+                                           token_validator=slow_validator)
+        manager.max_connections = 2
+        await manager.start_server()
+        port = manager.server.sockets[0].getsockname()[1]
+
+        async def connect(i):
+            try:
+                ws = await websockets.connect(f"ws://127.0.0.1:{port}/?token=u{i}")
+                await ws.recv()
+                return ws
+            except websockets.exceptions.InvalidStatusCode as e:
+                return e.status_code
+
+        results = await asyncio.gather(*(connect(i) for i in range(3)))
+        sockets = [result for result in results if not isinstance(result, int)]
+        for ws in sockets:
+            await ws.close()
+        await asyncio.sleep(0.1)
+        stats = manager.get_admission_stats()
+        await manager.stop_server()
+        return results, stats
+
+    results, stats = asyncio.run(scenario())
+
+    assert sorted(result for result in results if isinstance(result, int)) == [503]
+    assert stats["rejected"] == {"server_full": 1}
+    assert stats["admitted_connections"] == 0
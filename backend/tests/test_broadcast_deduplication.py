@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import ConnectionInfo, LearningWebSocketManager
+from conftest import FakeWebSocket
+
+def make_manager(clients: int = 3) -> LearningWebSocketManager:
+    manager = LearningWebSocketManager(publish_shared_metrics=False)
+    for i in range(clients):
+        client_id = f"client-{i}"
+        manager.connections[client_id] = ConnectionInfo(
+            websocket=FakeWebSocket(("10.0.0.1", 40000 + i)), client_id=client_id,
+            connected_at=datetime.now(), last_ping=datetime.now()
+        )
+    return manager
+
+def test_identical_broadcasts_share_one_delivery():
+    async def scenario():
+        manager = make_manager()
+        message = {"type": "update", "value": 1}
+        summaries = await asyncio.gather(*[manager.broadcast_with_learning(message) for _ in range(4)])
+        return manager, summaries
+
+    manager, summaries = asyncio.run(scenario())
+
+    assert len({summary["message_id"] for summary in summaries}) == 1
+    assert sum(1 for summary in summaries if summary.get("deduplicated")) == 3
+    for connection in manager.connections.values():
+        assert len(connection.websocket.sent) == 1
+    assert manager.dedup_cache.get_stats()["hits"] == 3
+
+def test_different_targets_are_not_merged():
+    async def scenario():
+        manager = make_manager()
+        message = {"type": "update", "value": 1}
+        await asyncio.gather(manager.broadcast_with_learning(message, ["client-0"]),
+                             manager.broadcast_with_learning(message, ["client-1"]))
+        return manager
+
+    manager = asyncio.run(scenario())
+
+    assert len(manager.connections["client-0"].websocket.sent) == 1
+    assert len(manager.connections["client-1"].websocket.sent) == 1
+    assert manager.connections["client-2"].websocket.sent == []
+
+def test_cancelled_broadcast_releases_merged_duplicates():
+    async def scenario():
+        manager = make_manager()
+        deliver = manager._broadcast
+        blocked = asyncio.Event()
+
+        async def first_call_hangs(message, clients):
+            if not blocked.is_set():
+                blocked.set()
+                await asyncio.Event().wait()
+            return await deliver(message, clients)
+
+        manager._broadcast = first_call_hangs
+        message = {"type": "update", "value": 2}
+
+        original = asyncio.ensure_future(manager.broadcast_with_learning(message))
+        await blocked.wait()
+        duplicate = asyncio.ensure_future(manager.broadcast_with_learning(message))
+        await asyncio.sleep(0)
+        original.cancel()
+
+        summary = await asyncio.wait_for(duplicate, timeout=2)
+        with pytest.raises(asyncio.CancelledError):
+            await original
+        return manager, summary
+
+    manager, summary = asyncio.run(scenario())
+
+    assert summary["successful_deliveries"] == 3
+    assert not summary.get("deduplicated")
+    # Only the delivery that completed is left in the window
+    assert manager.dedup_cache.get_stats()["entries"] == 1
+
+def test_failed_broadcast_is_not_replayed_to_duplicates():
+    async def scenario():
+        manager = make_manager()
+
+        async def failing(message, clients):
+            raise RuntimeError("delivery failed")
+
+        manager._broadcast = failing
+        with pytest.raises(RuntimeError):
+            await manager.broadcast_with_learning({"type": "update"})
+        return manager
+
+    manager = asyncio.run(scenario())
+
+    assert manager.dedup_cache.get_stats()["entries"] == 0
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import ConnectionInfo, LearningWebSocketManager
+from conftest import FakeWebSocket
+
+def make_manager(*capabilities):
+    manager = LearningWebSocketManager(publish_shared_metrics=False)
+    manager.deduplication_enabled = False
+    for client_id, failure_rate in (("healthy", 0.0), ("weak", 0.9)):
+        manager.connections[client_id] = ConnectionInfo(
+            websocket=FakeWebSocket(), client_id=client_id, connected_at=datetime.now(),
+            last_ping=datetime.now(), failure_ewma=failure_rate, client_capabilities=frozenset(capabilities)
+        )
+    return manager
+
+def test_recipients_are_ordered_by_lane():
+    manager = make_manager()
+
+    ordered = manager._order_by_lane(["weak", "gone", "healthy"])
+
+    assert [(client_id, lane.name if lane else None) for client_id, lane in ordered] == [
+        ("healthy", "realtime"), ("weak", "constrained"), ("gone", None)
+    ]
+
+def test_coalesced_lane_sends_singly_without_batching():
+    manager = make_manager()
+
+    async def scenario():
+        summaries = [await manager.broadcast_with_learning({"type": "update", "value": i}) for i in range(3)]
+        return summaries
+
+    summaries = asyncio.run(scenario())
+
+    sent = manager.connections["weak"].websocket.sent
+    assert [json.loads(frame)["value"] for frame in sent] == [0, 1, 2]
+    assert not manager.coalesce_buffers and not manager.coalesce_tasks
+    assert all(summary["successful_deliveries"] == 2 for summary in summaries)
+
+def test_batching_client_gets_one_batch_and_pending_summaries():
+    manager = make_manager("batching")
+    manager.compression_enabled = False
+    lane_window = manager.delivery_lanes[-1].coalesce_ms / 1000
+
+    async def scenario():
+        summaries = [await manager.broadcast_with_learning({"type": "update", "value": i}) for i in range(3)]
+        assert len(manager.coalesce_tasks) == 1
+        await asyncio.sleep(lane_window + 0.05)
+        return summaries
+
+    summaries = asyncio.run(scenario())
+
+    assert all((summary["successful_deliveries"], summary["pending_deliveries"], summary["failed_deliveries"])
+               == (1, 1, 0) for summary in summaries)
+    batch = json.loads(manager.connections["weak"].websocket.sent[0])
+    assert batch["type"] == "batch"
+    assert [message["value"] for message in batch["messages"]] == [0, 1, 2]
+    assert len(manager.connections["healthy"].websocket.sent) == 3
+    assert not manager.coalesce_tasks
+
+def test_disconnect_cancels_the_pending_flush():
+    manager = make_manager("batching")
+
+    async def scenario():
+        await manager.broadcast_with_learning({"type": "update"}, ["weak"])
+        task, _ = manager.coalesce_tasks["weak"]
+        websocket = manager.connections["weak"].websocket
+        await manager._cleanup_connection("weak")
+        await asyncio.sleep(0)
+        return task, websocket
+
+    task, websocket = asyncio.run(scenario())
+
+    assert task.cancelled()
+    assert websocket.sent == []
+    assert "weak" not in manager.coalesce_buffers and not manager.coalesce_tasks
+
+def test_stop_flushes_buffered_frames():
+    manager = make_manager("batching")
+
+    async def scenario():
+        await manager.broadcast_with_learning({"type": "update"}, ["weak"])
+        await manager.stop_server()
+
+    asyncio.run(scenario())
+
+    assert len(manager.connections["weak"].websocket.sent) == 1
+    assert not manager.coalesce_buffers and not manager.coalesce_tasks
+
+def test_capabilities_come_from_the_handshake():
+    manager = LearningWebSocketManager(publish_shared_metrics=False)
+    header = FakeWebSocket(request_headers={"X-Client-Capabilities": "batching, telepathy"})
+
+    assert manager._extract_client_capabilities(header, "/") == {"batching"}
+    assert manager._extract_client_capabilities(FakeWebSocket(), "/?capabilities=compact_control") == {"compact_control"}
+    assert manager._extract_client_capabilities(FakeWebSocket(), "/") == frozenset()
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import ConnectionInfo, FailureSampler, LearningWebSocketManager
+from conftest import FakeWebSocket
+
+def test_messages_differing_only_in_values_share_a_fingerprint():
+    sampler = FailureSampler()
+
+    first = sampler.fingerprint("message_parsing", ValueError("Expecting value: line 1 column 17 (char 16)"))
+    second = sampler.fingerprint("message_parsing", ValueError("Expecting value: line 3 column 2 (char 40)"))
+
+    assert first == second == "message_parsing:ValueError:Expecting value: line <n> column <n> (char <n>)"
+    assert sampler.normalize("client 'a1' id deadbeef01 failed") == "client <str> id <id> failed"
+    assert sampler.fingerprint("message_handling", ValueError("x")) != sampler.fingerprint(
+        "message_parsing", ValueError("x"))
+
+def test_only_the_first_failures_of_a_window_are_captured(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    sampler = FailureSampler(full_capture_limit=2, window_seconds=60)
+
+    decisions = [sampler.should_capture("message_parsing", ValueError(f"bad frame {i}")) for i in range(5)]
+    now[0] += 61
+    after_window = sampler.should_capture("message_parsing", ValueError("bad frame 99"))
+
+    assert decisions == [True, True, False, False, False]
+    assert after_window
+    stats = sampler.get_stats()
+    assert (stats["captured"], stats["suppressed"]) == (3, 3)
+    assert stats["top_fingerprints"][0]["total"] == 6
+
+def test_fingerprint_table_is_bounded():
+    sampler = FailureSampler(max_fingerprints=2)
+    for error_type in (ValueError, KeyError, TypeError):
+        sampler.should_capture("message_handling", error_type("boom"))
+
+    assert len(sampler.fingerprints) == 2
+    assert not any(key.endswith(":ValueError:boom") for key in sampler.fingerprints)
+
+def test_malformed_json_storm_is_analyzed_a_bounded_number_of_times():
+    manager = LearningWebSocketManager(publish_shared_metrics=False)
+    manager.connections["client-0"] = ConnectionInfo(websocket=FakeWebSocket(), client_id="client-0",
+                                                     connected_at=datetime.now(), last_ping=datetime.now())
+    captures = []
+
+    async def capture_error(error_context):
+        captures.append(error_context)
+        return {"error_id": str(len(captures))}
+
+    manager.learning_system.capture_error = capture_error
+
+    async def scenario():
+        for i in range(50):
+            await manager._handle_message("client-0", "{not json " + str(i))
+
+    asyncio.run(scenario())
+
+    assert len(captures) == manager.failure_sampler.full_capture_limit
+    assert manager.failure_sampler.get_stats()["suppressed"] == 50 - len(captures)
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import LearningWebSocketManager, ValidatedTokenCache
+from conftest import FakeWebSocket
+
+def test_cached_tokens_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ValidatedTokenCache(ttl_seconds=60)
+    cache.put("token", {"user_id": "alice"})
+
+    now[0] += 59
+    assert cache.get("token") == {"user_id": "alice"}
+    now[0] += 1
+    assert cache.get("token") is None
+    assert cache.get_stats() == {"entries": 0, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+def test_least_recently_used_token_is_evicted_first():
+    cache = ValidatedTokenCache(max_entries=2)
+    cache.put("a", {"user_id": "a"})
+    cache.put("b", {"user_id": "b"})
+    cache.get("a")
+    cache.put("c", {"user_id": "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+
+def test_validator_runs_once_per_token_until_expiry():
+    calls = []
+
+    async def validator(token):
+        calls.append(token)
+        return {"user_id": token, "organization_id": "acme"} if token != "bad" else None
+
+    manager = LearningWebSocketManager(publish_shared_metrics=False, token_validator=validator)
+    websocket = FakeWebSocket(request_headers={"Authorization": "Bearer alice"})
+
+    async def scenario():
+        identities = [await manager._authenticate_client(websocket, "/") for _ in range(3)]
+        rejected = [await manager._authenticate_client(FakeWebSocket(), "/?token=bad") for _ in range(2)]
+        return identities, rejected
+
+    identities, rejected = asyncio.run(scenario())
+
+    assert identities == [{"user_id": "alice", "organization_id": "acme"}] * 3
+    # Invalid tokens are never cached, so they are always checked again
+    assert rejected == [None, None]
+    assert calls == ["alice", "bad", "bad"]
+
+def test_welcome_frame_matches_a_fully_serialized_one():
+    manager = LearningWebSocketManager(publish_shared_metrics=False)
+
+    frame = json.loads(manager._welcome_frame('client-"7"', True))
+
+    assert frame == {
+        "type": "welcome",
+        "server_capabilities": manager.server_capabilities,
+        "control_frames": {"ping": "!p", "pong": "!P", "ack": "!a"},
+        "max_message_bytes": manager.max_inbound_message_bytes,
+        "client_id": 'client-"7"',
+        "authenticated": True
+    }
+
+def test_handshake_rate_covers_the_recent_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    manager = LearningWebSocketManager(publish_shared_metrics=False)
+
+    manager._record_handshake(now[0] - 0.004)  # 4 ms
+    now[0] += 20
+    for _ in range(5):
+        manager._record_handshake(now[0] - 0.002)
+
+    stats = manager.get_handshake_stats(window_seconds=10)
+    assert stats["connections_per_second"] == 0.5
+    assert stats["average_handshake_ms"] == pytest.approx(2.0)
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import ConnectionInfo, LearningWebSocketManager, DELIVERY_LANES
+from conftest import FakeWebSocket
+
+def make_manager():
+    manager = LearningWebSocketManager(publish_shared_metrics=False)
+    connection = ConnectionInfo(websocket=FakeWebSocket(), client_id="client-0",
+                                connected_at=datetime.now(), last_ping=datetime.now())
+    manager.connections["client-0"] = connection
+    return manager, connection
+
+def test_unparseable_frames_are_counted_as_invalid():
+    manager, connection = make_manager()
+
+    asyncio.run(manager._handle_message("client-0", "{not json"))
+
+    assert manager.bandwidth_by_type["invalid"] == {
+        "frames_in": 1, "bytes_in": 9, "frames_out": 0, "bytes_out": 0, "raw_bytes_out": 0
+    }
+    assert connection.frames_in == 1
+
+def test_coalesced_batch_counts_one_written_frame():
+    manager, connection = make_manager()
+    connection.client_capabilities = frozenset({"batching"})
+    lane = next(lane for lane in DELIVERY_LANES if lane.coalesce_ms)
+
+    async def scenario():
+        manager._enqueue_coalesced(connection, lane, "m1", "update", '{"type": "update"}')
+        manager._enqueue_coalesced(connection, lane, "m2", "notice", '{"type": "notice"}')
+        manager._enqueue_coalesced(connection, lane, "m3", "update", '{"type": "update"}')
+        await asyncio.sleep(lane.coalesce_ms / 1000 + 0.05)
+
+    asyncio.run(scenario())
+
+    assert len(connection.websocket.sent) == 1
+    assert connection.frames_out == 1
+    frames_out = sum(counters["frames_out"] for counters in manager.bandwidth_by_type.values())
+    assert frames_out == 1
+
+def test_oversized_frame_closes_with_message_too_big():
+    manager, connection = make_manager()
+    # Fewer characters than the limit, but more encoded bytes
+    message = '{"type": "note", "text": "' + "é" * (manager.max_inbound_message_bytes // 2 + 10) + '"}'
+    assert len(message) < manager.max_inbound_message_bytes
+
+    asyncio.run(manager._handle_message("client-0", message))
+
+    assert connection.websocket.close_code == 1009
+    assert manager.performance_metrics["oversized_messages"] == 1
+    assert manager.bandwidth_by_type["oversized"]["bytes_in"] == len(message.encode())
+
+def test_inbound_limit_follows_the_runtime_profile():
+    manager, connection = make_manager()
+    assert manager.max_inbound_message_bytes == manager.runtime_profile.max_size == 1024 * 1024
+
+    asyncio.run(manager._handle_message("client-0", '{"type": "note", "text": "' + "x" * 200 * 1024 + '"}'))
+    assert not connection.websocket.closed
+
+    lean = LearningWebSocketManager(publish_shared_metrics=False, runtime_profile="memory-lean",
+                                    max_inbound_message_bytes=4 * 1024 * 1024)
+    assert lean.max_inbound_message_bytes == 256 * 1024
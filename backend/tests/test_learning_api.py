@@ -0,0 +1,160 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+flask = pytest.importorskip("flask")
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+pytest.importorskip("claude_langgraph_bridge")
+
+from api import learning_api
+from api.learning_api import VersionedResponseCache
+from api.learning_index import ErrorPatternIndex, TimelineIndex
+
+app = flask.Flask(__name__)
+
+def respond(cache, version, build, etag=None):
+    headers = {"If-None-Match": f'"{etag}"'} if etag else {}
+    with app.test_request_context("/", headers=headers):
+        return cache.respond("patterns", version, build)
+
+def test_same_version_is_served_from_cache():
+    cache = VersionedResponseCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"patterns": ["timeout"]}
+
+    first = respond(cache, 1, build)
+    second = respond(cache, 1, build)
+
+    assert len(builds) == 1
+    assert first.status_code == second.status_code == 200
+    assert first.get_data() == second.get_data()
+    assert cache.stats == {"hits": 1, "rebuilds": 1, "not_modified": 0}
+
+def test_unchanged_content_revalidates_across_versions():
+    cache = VersionedResponseCache()
+    first = respond(cache, 1, lambda: {"patterns": ["timeout"]})
+    etag, _ = first.get_etag()
+
+    # A new version with the same content keeps the ETag and the stored body
+    unchanged = respond(cache, 2, lambda: {"patterns": ["timeout"]}, etag)
+    assert unchanged.status_code == 304
+    assert unchanged.get_etag() == (etag, False)
+    assert respond(cache, 2, lambda: {}).get_data() == first.get_data()
+
+    changed = respond(cache, 3, lambda: {"patterns": ["timeout", "quota"]}, etag)
+    assert changed.status_code == 200
+    assert changed.get_etag()[0] != etag
+    assert changed.get_json()["patterns"] == ["timeout", "quota"]
+    assert cache.stats["not_modified"] == 1
+
+def test_failed_injection_reaches_the_ingest_service(monkeypatch):
+    async def capture_error(error_context):
+        raise RuntimeError("analysis failed")
+
+    monkeypatch.setattr(learning_api.learning_system, "capture_error", capture_error)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(learning_api._process_injected_learning({"task": {"scenario": "timeout"}}))
+
+def test_total_occurrences_include_compacted_learnings(monkeypatch):
+    index = ErrorPatternIndex()
+    index.add_rollup(SimpleNamespace(period="week", bucket_start=datetime(2026, 1, 5), error_type="TimeoutError",
+                                     agent_name="planner", template="call <n> failed", count=40, prevented=4))
+    index.add(SimpleNamespace(error_id="e1", timestamp=datetime(2026, 3, 1), error_type="TimeoutError",
+                              agent_name="planner", error_message="call 7 failed", prevented_count=0,
+                              root_cause={}, prevention_rule={}))
+    monkeypatch.setattr(learning_api, "error_pattern_index", index)
+
+    payload = learning_api._build_error_patterns()
+
+    assert payload["total"] == 1
+    assert payload["total_occurrences"] == 41
+
+def test_success_patterns_follow_in_place_updates(monkeypatch):
+    pattern = SimpleNamespace(pattern_name="retry", success_rate=0.5, conditions={"agent": "planner"})
+    monkeypatch.setattr(learning_api.learning_system.db, "success_patterns", {"p1": pattern})
+    monkeypatch.setattr(learning_api, "response_cache", VersionedResponseCache())
+
+    def get():
+        with app.test_request_context("/"):
+            return learning_api.get_success_patterns()
+
+    assert get().get_json()["patterns"][0]["reliability"] == 0.5
+    pattern.success_rate = 0.9  # Updated in place, as a new success is recorded
+    assert get().get_json()["patterns"][0]["reliability"] == 0.9
+
+def stored_learning(i, agent_name="planner"):
+    return SimpleNamespace(error_id=f"e{i}", timestamp=datetime(2026, 3, 1) + timedelta(hours=i),
+                           error_type="TimeoutError", agent_name=agent_name, error_message=f"call {i} failed",
+                           prevented_count=0, root_cause={"description": "slow upstream"},
+                           fix_applied={"successful": True}, prevention_rule={})
+
+def use_learnings(monkeypatch, learnings):
+    timeline = TimelineIndex()
+    for learning in learnings:
+        timeline.add(learning)
+    monkeypatch.setattr(learning_api.learning_system.db, "error_learnings",
+                        {learning.error_id: learning for learning in learnings})
+    monkeypatch.setattr(learning_api, "learning_timeline", timeline)
+
+def get_history(**args):
+    with app.test_request_context("/", query_string=args):
+        return app.make_response(learning_api.get_learning_history())
+
+def test_history_pages_by_cursor_and_offset(monkeypatch):
+    use_learnings(monkeypatch, [stored_learning(i) for i in range(5)])
+
+    first = get_history(limit=2).get_json()
+    second = get_history(limit=2, cursor=first["next_cursor"]).get_json()
+    by_offset = get_history(limit=2, offset=2).get_json()
+
+    assert [row["id"] for row in first["history"]] == ["e4", "e3"]
+    assert [row["id"] for row in second["history"]] == ["e2", "e1"]
+    assert by_offset["history"] == second["history"]
+    assert first["total"] == 5
+    assert get_history(cursor="not a cursor").status_code == 400
+
+def export(**args):
+    with app.test_request_context("/", query_string=args):
+        response = app.make_response(learning_api.export_learnings())
+        streamed = response.is_streamed
+        return response, streamed, response.get_data(as_text=True)
+
+def test_export_streams_filtered_ndjson_in_time_order(monkeypatch):
+    learnings = [stored_learning(i, ["planner", "coder"][i % 2]) for i in range(1200)]
+    use_learnings(monkeypatch, learnings[::-1])
+
+    response, streamed, body = export(agent="planner", since="2026-03-01T10:00:00", until="2026-03-03T00:00:00")
+
+    assert streamed and response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert [row["id"] for row in rows] == [f"e{i}" for i in range(10, 48, 2)]
+    assert rows[0]["fix_applied"] is True
+    # Unfiltered, every learning comes through across several chunks
+    assert len(export()[2].splitlines()) == 1200
+
+def test_export_writes_csv_with_a_header(monkeypatch):
+    use_learnings(monkeypatch, [stored_learning(i) for i in range(3)])
+
+    response, _, body = export(format="csv")
+
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert response.mimetype == "text/csv"
+    assert [row["id"] for row in rows] == ["e0", "e1", "e2"]
+    assert rows[1]["message"] == "call 1 failed"
+
+def test_export_rejects_bad_arguments(monkeypatch):
+    use_learnings(monkeypatch, [])
+
+    assert export(format="xml")[0].status_code == 400
+    assert export(since="yesterday")[0].status_code == 400
@@ -0,0 +1,279 @@
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+agent_learning = pytest.importorskip("agent_learning")
+
+from api.learning_index import (
+    IndexedLearningSystem, LearningAnalytics, LearningIndex, TimelineIndex, ErrorPatternIndex, LearningColumns,
+    message_template
+)
+from api import learning_index
+
+NOW = datetime(2026, 3, 18, 15, 30)
+
+def make_learning(error_id, timestamp, error_type="ValueError", agent_name="planner", prevented=0):
+    return SimpleNamespace(error_id=error_id, timestamp=timestamp, error_type=error_type, agent_name=agent_name,
+                           error_message=f"failed after {error_id} retries", prevented_count=prevented,
+                           root_cause={}, prevention_rule={})
+
+def random_learnings(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        make_learning(f"e{i}", NOW - timedelta(hours=rng.uniform(0, 24 * 60)),
+                      rng.choice(["ValueError", "KeyError", "TimeoutError"]), rng.choice(["planner", "coder"]),
+                      rng.choice([0, 0, 1, 3]))
+        for i in range(count)
+    ]
+
+def brute_force(learnings, rollups):
+    """The analytics payload recomputed by scanning every learning"""
+    current_hour = int(NOW.timestamp() // 3600)
+
+    def hours_ago(learning):
+        return current_hour - int(learning.timestamp.timestamp() // 3600)
+
+    def week_of(timestamp):
+        return (timestamp - timedelta(days=timestamp.weekday())).strftime('%Y-%m-%d')
+
+    types, agents, weeks = Counter(), {}, {}
+    for error_type, agent, week, count, prevented in (
+        [(l.error_type, l.agent_name, week_of(l.timestamp), 1, l.prevented_count) for l in learnings] +
+        [(r.error_type, r.agent_name, week_of(r.bucket_start), r.count, r.prevented) for r in rollups]
+    ):
+        types[error_type] += count
+        stats = agents.setdefault(agent, {"errors": 0, "prevented": 0})
+        stats["errors"] += count
+        stats["prevented"] += prevented
+        totals = weeks.setdefault(week, [0, 0])
+        totals[0] += count
+        totals[1] += prevented
+
+    total = len(learnings) + sum(r.count for r in rollups)
+    prevented_total = sum(l.prevented_count for l in learnings) + sum(r.prevented for r in rollups)
+    days = Counter(l.timestamp.strftime('%Y-%m-%d') for l in learnings)
+    return {
+        "overview": {
+            "total_learnings": total,
+            "last_24h": sum(hours_ago(l) < 24 for l in learnings),
+            "last_week": sum(hours_ago(l) < 168 for l in learnings),
+            "overall_prevention_rate": prevented_total / max(total, 1)
+        },
+        "error_distribution": dict(types),
+        "agent_performance": {
+            agent: {**stats, "prevention_rate": stats["prevented"] / max(stats["errors"] + stats["prevented"], 1)}
+            for agent, stats in agents.items()
+        },
+        "daily_learnings": [
+            {"date": day, "count": days[day]}
+            for day in sorted((NOW - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7))
+        ],
+        "prevention_trend": [
+            {"week": week, "prevention_rate": prevented / max(count, 1)}
+            for week, (count, prevented) in sorted(weeks.items())
+        ][-8:]
+    }
+
+def test_running_totals_match_a_full_recompute():
+    learnings = random_learnings(2000)
+    rollups = [SimpleNamespace(period="day", bucket_start=datetime(2026, 1, 5), error_type="KeyError",
+                               agent_name="reviewer", template="failed after <n> retries", count=40, prevented=9)]
+    analytics = LearningAnalytics()
+    for rollup in rollups:
+        analytics.add_rollup(rollup)
+    for learning in learnings:
+        analytics.add(learning)
+
+    snapshot = analytics.snapshot(NOW)
+    expected = brute_force(learnings, rollups)
+
+    assert snapshot["overview"] == pytest.approx(expected["overview"])
+    assert {row["type"]: row["count"] for row in snapshot["error_distribution"]} == expected["error_distribution"]
+    assert {row.pop("agent"): row for row in snapshot["agent_performance"]} == expected["agent_performance"]
+    assert snapshot["trends"]["daily_learnings"] == expected["daily_learnings"]
+    assert snapshot["trends"]["prevention_trend"] == expected["prevention_trend"]
+
+class HookIndex(LearningIndex):
+    """Counts learnings and runs queued callbacks from inside add"""
+
+    def __init__(self, hooks):
+        super().__init__()
+        self.hooks = hooks
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+
+    def add(self, learning):
+        self.count += 1
+        if self.hooks:
+            self.hooks.pop()()
+
+def make_system(monkeypatch, count=10):
+    captured = []
+
+    async def capture_error(self, error_context):
+        learning = make_learning(f"new{len(captured)}", NOW)
+        self.db.error_learnings[learning.error_id] = learning
+        captured.append(learning)
+        error_context.get("after_write", lambda: None)()
+        return {"error_id": learning.error_id}
+
+    monkeypatch.setattr(agent_learning.AgentLearningSystem, "capture_error", capture_error)
+    system = IndexedLearningSystem()
+    system.db.error_learnings = {learning.error_id: learning for learning in random_learnings(count)}
+    return system
+
+def test_capture_during_rebuild_is_counted_once(monkeypatch):
+    system = make_system(monkeypatch)
+    hooks = []
+    analytics = system.add_index(LearningAnalytics())
+    system.add_index(HookIndex(hooks))
+    results = []
+
+    def capture_mid_rebuild():
+        results.append(system.reindex(blocking=False))  # A second rebuild is refused, not run concurrently
+        asyncio.run(system.capture_error({}))
+
+    hooks.append(capture_mid_rebuild)
+    assert system.reindex()
+
+    assert results == [False]
+    assert analytics.total == system.indexed_count == len(system.db.error_learnings) == 11
+
+def test_capture_written_before_snapshot_is_not_indexed_twice(monkeypatch):
+    system = make_system(monkeypatch)
+    analytics = system.add_index(LearningAnalytics())
+
+    # The rebuild runs between the capture's database write and its indexing
+    asyncio.run(system.capture_error({"after_write": system.reindex}))
+
+    assert analytics.total == system.indexed_count == len(system.db.error_learnings) == 11
+    asyncio.run(system.capture_error({}))
+    assert analytics.total == 12
+
+def test_readers_keep_old_indexes_until_the_swap(monkeypatch):
+    system = make_system(monkeypatch)
+    hooks = []
+    analytics = system.add_index(LearningAnalytics())
+    system.add_index(HookIndex(hooks))
+    seen = []
+    hooks.append(lambda: seen.append(analytics.snapshot(NOW)["overview"]["total_learnings"]))
+
+    system.reindex()
+
+    assert seen == [10]
+    assert analytics.total == 10
+
+def test_timeline_pages_match_a_full_sort():
+    learnings = random_learnings(250)
+    # Ties on the timestamp are ordered by error id
+    learnings += [make_learning(f"tie{i}", NOW - timedelta(days=3)) for i in range(4)]
+    timeline = TimelineIndex()
+    for learning in learnings:  # Mostly out of time order
+        timeline.add(learning)
+    newest_first = [l.error_id for l in sorted(learnings, key=lambda l: (l.timestamp, l.error_id), reverse=True)]
+
+    paged, cursor = [], None
+    while True:
+        page, cursor = timeline.page(40, cursor=cursor)
+        paged += page
+        if cursor is None:
+            break
+
+    assert paged == newest_first
+    assert timeline.page(40, offset=80)[0] == newest_first[80:120]
+    assert timeline.page(40, offset=1000) == ([], None)
+
+def test_timeline_cursor_is_stable_across_inserts():
+    timeline = TimelineIndex()
+    for i in range(10):
+        timeline.add(make_learning(f"e{i}", NOW - timedelta(hours=i)))
+
+    first, cursor = timeline.page(3)
+    timeline.add(make_learning("newest", NOW + timedelta(hours=1)))
+    second, _ = timeline.page(3, cursor=cursor)
+
+    assert first == ["e0", "e1", "e2"]
+    assert second == ["e3", "e4", "e5"]
+    with pytest.raises(ValueError):
+        timeline.page(3, cursor="%%%")
+
+def test_message_template_masks_variable_parts():
+    message = ("request 4f1c2a9e-77b0-4c55-9d7e-0123456789ab to 10.0.3.7 failed after 2.5s "
+               "(handle 0x7ffe12, trace deadbeef42)")
+
+    assert message_template(message) == "request <uuid> to <ip> failed after <n>s (handle <hex>, trace <id>)"
+    # Plain words made of hex letters are not IDs
+    assert message_template("facade deadbeef") == "facade deadbeef"
+
+def test_error_patterns_group_repeated_failures():
+    index = ErrorPatternIndex()
+    for hours in (5, 1, 3):
+        learning = make_learning(f"e{hours}", NOW - timedelta(hours=hours), prevented=1)
+        learning.error_message = f"call {hours * 17} timed out"
+        learning.root_cause = {"description": f"cause {hours}"}
+        index.add(learning)
+    index.add(make_learning("other", NOW, agent_name="coder"))
+
+    rows = {row["agent"]: row for row in index.patterns()}
+
+    assert len(index) == 2
+    planner = rows["planner"]
+    assert (planner["template"], planner["occurrences"]) == ("call <n> timed out", 3)
+    assert planner["firstSeen"] == (NOW - timedelta(hours=5)).isoformat()
+    assert planner["lastSeen"] == (NOW - timedelta(hours=1)).isoformat()
+    assert planner["rootCause"] == "cause 1"  # From the latest learning
+    assert planner["effectiveness"] == 50.0
+
+def brute_force_histogram(learnings, rollups, since, until, bucket):
+    """Histogram buckets and distributions recomputed from the rich objects"""
+    buckets, types, agents = {}, Counter(), {}
+    for timestamp, error_type, agent, count, prevented in (
+        [(l.timestamp, l.error_type, l.agent_name, 1, l.prevented_count) for l in learnings] +
+        [(r.bucket_start, r.error_type, r.agent_name, r.count, r.prevented) for r in rollups]
+    ):
+        if not since <= timestamp < until:
+            continue
+        day = timestamp.date()
+        if bucket == "week":
+            day -= timedelta(days=day.weekday())
+        buckets[day.isoformat()] = buckets.get(day.isoformat(), 0) + count
+        types[error_type] += count
+        totals = agents.setdefault(agent, [0, 0])
+        totals[0] += count
+        totals[1] += prevented
+    return sorted(buckets.items()), dict(types), agents
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+@pytest.mark.parametrize("bucket", ["day", "week"])
+def test_column_histogram_matches_a_full_recompute(monkeypatch, use_numpy, bucket):
+    if use_numpy and learning_index.np is None:
+        pytest.skip("NumPy is not installed")
+    if not use_numpy:
+        monkeypatch.setattr(learning_index, "np", None)
+    learnings = random_learnings(2000)
+    rollups = [SimpleNamespace(bucket_start=datetime(2026, 2, 20), error_type="KeyError", agent_name="coder",
+                               count=25, prevented=5)]
+    columns = LearningColumns()
+    for learning in learnings:
+        columns.add(learning)
+    for rollup in rollups:
+        columns.add_rollup(rollup)
+    since, until = NOW - timedelta(days=45), NOW - timedelta(days=3)
+
+    payload = columns.histogram(since, until, bucket)
+
+    expected_buckets, expected_types, expected_agents = brute_force_histogram(learnings, rollups, since, until, bucket)
+    assert [(b["start"], b["count"]) for b in payload["trends"]["buckets"]] == expected_buckets
+    assert {row["type"]: row["count"] for row in payload["error_distribution"]} == expected_types
+    assert {row["agent"]: [row["errors"], row["prevented"]] for row in payload["agent_performance"]} == expected_agents
+    assert payload["overview"]["total_learnings"] == sum(expected_types.values())
+
+def test_column_histogram_rejects_unknown_buckets():
+    with pytest.raises(ValueError):
+        LearningColumns().histogram(NOW - timedelta(days=1), NOW, "month")
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import pytest
+
+from api.learning_ingest import LearningIngestService, IngestQueueFull
+
+def make_service(max_queue=3):
+    started = threading.Event()
+    gate = threading.Event()
+
+    async def process(item):
+        started.set()
+        await asyncio.get_running_loop().run_in_executor(None, gate.wait)
+        if item.get("fail"):
+            raise ValueError(f"cannot learn from {item['id']}")
+        return item["id"]
+
+    service = LearningIngestService(process, max_queue=max_queue, concurrency=1)
+    return service, started, gate
+
+def test_full_queue_rejects_whole_batches():
+    service, started, gate = make_service(max_queue=3)
+    try:
+        first = service.submit({"id": 0})
+        assert started.wait(5)  # The only worker holds item 0, so the queue is empty
+
+        queued = service.submit_many([{"id": 1}, {"id": 2}])
+        with pytest.raises(IngestQueueFull):
+            service.submit_many([{"id": 3}, {"id": 4}])
+        # Nothing from the rejected batch was queued
+        assert service.queue.qsize() == 2
+        last = service.submit({"id": 5})
+        with pytest.raises(IngestQueueFull):
+            service.submit({"id": 6})
+
+        gate.set()
+        assert [future.result(5) for future in [first, *queued, last]] == [0, 1, 2, 5]
+        stats = service.get_stats()
+        assert (stats["submitted"], stats["rejected"], stats["processed"]) == (4, 3, 4)
+    finally:
+        gate.set()
+        service.stop()
+
+def test_failed_items_are_counted_and_reported():
+    service, _, gate = make_service()
+    gate.set()
+    try:
+        ok, failed = service.submit_many([{"id": 1}, {"id": 2, "fail": True}])
+
+        assert ok.result(5) == 1
+        assert isinstance(failed.exception(5), ValueError)
+        stats = service.get_stats()
+        assert (stats["processed"], stats["failed"]) == (1, 1)
+    finally:
+        service.stop()
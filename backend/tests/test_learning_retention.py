@@ -0,0 +1,87 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("agent_learning")
+
+from api.learning_index import IndexedLearningSystem, LearningAnalytics, ErrorPatternIndex
+from api.learning_retention import LearningRollups, LearningRetentionJob, compact_learnings
+from api.learning_store import SQLiteLearningStore
+
+NOW = datetime(2026, 6, 15, 12, 0)
+
+def make_system(store=None, count=600):
+    system = IndexedLearningSystem()
+    if store is not None:
+        system.db.error_learnings = store.error_learnings
+    else:
+        system.db.error_learnings = {}
+    rng = random.Random(3)
+    for i in range(count):
+        system.db.error_learnings[f"e{i}"] = SimpleNamespace(
+            error_id=f"e{i}", timestamp=NOW - timedelta(days=rng.uniform(0, 120)),
+            error_type=rng.choice(["TimeoutError", "KeyError"]), agent_name=rng.choice(["planner", "coder"]),
+            error_message=f"call {i} failed", prevented_count=rng.choice([0, 1]), root_cause={}, prevention_rule={}
+        )
+    system.rollups = LearningRollups(store)
+    analytics = system.add_index(LearningAnalytics())
+    patterns = system.add_index(ErrorPatternIndex())
+    return system, analytics, patterns
+
+def totals(analytics, patterns):
+    snapshot = analytics.snapshot(NOW)
+    rows = patterns.patterns()
+    return (snapshot["overview"], snapshot["error_distribution"], snapshot["trends"]["prevention_trend"],
+            sum(row["occurrences"] for row in rows), len(rows))
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_compaction_preserves_totals(tmp_path, backend):
+    store = SQLiteLearningStore(str(tmp_path / "learning.db")) if backend == "sqlite" else None
+    system, analytics, patterns = make_system(store)
+    before = totals(analytics, patterns)
+
+    result = compact_learnings(system, system.rollups, raw_retention=timedelta(days=14),
+                               daily_retention=timedelta(days=60), now=NOW)
+    system.reindex()
+
+    assert result["compacted"] > 0 and result["merged_daily_rows"] > 0
+    assert len(system.db.error_learnings) == 600 - result["compacted"]
+    assert system.rollups.total_count() == result["compacted"]
+    assert totals(analytics, patterns) == before
+    assert before[3] == 600
+
+    # A second pass finds nothing new to compact
+    again = compact_learnings(system, system.rollups, raw_retention=timedelta(days=14),
+                              daily_retention=timedelta(days=60), now=NOW)
+    assert again["compacted"] == 0
+
+def test_compaction_lock_lives_next_to_the_database(tmp_path):
+    store = SQLiteLearningStore(str(tmp_path / "learning.db"))
+    system, _, _ = make_system(store, count=10)
+
+    job = LearningRetentionJob(system, system.rollups, timedelta(days=14), timedelta(days=60))
+    in_memory = LearningRetentionJob(system, LearningRollups(), timedelta(days=14), timedelta(days=60))
+
+    assert job.lock_path == str(tmp_path / "learning.db.compact.lock")
+    assert in_memory.lock_path is None
+
+def test_failed_run_does_not_stop_the_job(tmp_path, monkeypatch):
+    system, _, _ = make_system(count=10)
+    job = LearningRetentionJob(system, system.rollups, timedelta(days=14), timedelta(days=60), interval=0.01,
+                               lock_path=str(tmp_path / "missing" / "compact.lock"))
+    runs = []
+
+    def run_once():
+        runs.append(1)
+        if len(runs) == 1:
+            return LearningRetentionJob.run_once(job)  # Cannot open the lock file
+        raise SystemExit
+
+    monkeypatch.setattr(job, "run_once", run_once)
+    with pytest.raises(SystemExit):
+        job._run()
+
+    assert len(runs) == 2
+    assert "missing" in job.stats["last_error"]
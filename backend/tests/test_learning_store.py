@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from api.learning_store import SQLiteLearningStore, RecordView, attach_sqlite_store
+
+START = datetime(2026, 3, 2, 9, 0)
+
+class Learning:
+    def __init__(self, error_id, timestamp, error_type="TimeoutError", agent_name="planner", prevented_count=0):
+        self.error_id = error_id
+        self.error_type = error_type
+        self.agent_name = agent_name
+        self.timestamp = timestamp
+        self.prevented_count = prevented_count
+        self.error_message = f"request {error_id} timed out"
+        self.root_cause = {"description": "slow upstream", "seen_at": timestamp}
+
+def fill(store, count):
+    for i in range(count):
+        store.error_learnings[f"e{i:04d}"] = Learning(f"e{i:04d}", START + timedelta(hours=i))
+
+def count_statements(store):
+    statements = []
+    store.conn.set_trace_callback(statements.append)
+    return statements
+
+def test_records_round_trip_through_a_reopened_store(tmp_path):
+    path = str(tmp_path / "learning.db")
+    db = SimpleNamespace(error_learnings={"e1": Learning("e1", START, prevented_count=2)},
+                         success_patterns={"p1": SimpleNamespace(pattern_id="p1", uses=3)})
+    attach_sqlite_store(db, path).close()
+
+    store = SQLiteLearningStore(path)
+    learning = store.error_learnings["e1"]
+    assert isinstance(learning, RecordView)
+    assert (learning.error_type, learning.timestamp, learning.prevented_count) == ("TimeoutError", START, 2)
+    assert learning.root_cause == {"description": "slow upstream", "seen_at": START}
+    assert store.success_patterns["p1"].uses == 3
+
+    learning.prevented_count = 5
+    store.close()
+    assert SQLiteLearningStore(path).error_learnings["e1"].prevented_count == 5
+
+def test_length_is_maintained_without_scanning(tmp_path):
+    store = SQLiteLearningStore(str(tmp_path / "learning.db"), batch_size=10)
+    fill(store, 25)
+    assert len(store.error_learnings) == 25  # Five of them are still pending
+
+    store.error_learnings["e0003"] = Learning("e0003", START)  # An update, not a new row
+    del store.error_learnings["e0004"]
+    store.apply_compaction([], [], ["e0005", "e0006", "missing"])
+
+    statements = count_statements(store)
+    assert len(store.error_learnings) == 22
+    assert "SELECT COUNT(*) FROM error_learnings" not in statements
+    store.flush()
+    assert store.conn.execute("SELECT COUNT(*) FROM error_learnings").fetchone()[0] == 22
+
+def test_length_follows_writes_from_other_connections(tmp_path):
+    path = str(tmp_path / "learning.db")
+    store = SQLiteLearningStore(path)
+    fill(store, 3)
+    assert len(store.error_learnings) == 3
+
+    other = SQLiteLearningStore(path)
+    other.error_learnings["x"] = Learning("x", START)
+    other.flush()
+
+    assert len(store.error_learnings) == 4
+
+def test_snapshot_excludes_later_inserts(tmp_path):
+    store = SQLiteLearningStore(str(tmp_path / "learning.db"))
+    fill(store, 3)
+    learnings, contains = store.error_learnings.snapshot()
+    store.error_learnings["late"] = Learning("late", START)
+
+    assert [learning.error_id for learning in learnings] == ["e0000", "e0001", "e0002"]
+    assert contains("e0001") and not contains("late")
+
+def test_timeline_pages_newest_first(tmp_path):
+    store = SQLiteLearningStore(str(tmp_path / "learning.db"))
+    fill(store, 7)
+
+    first, cursor = store.timeline.page(3)
+    second, cursor = store.timeline.page(3, cursor=cursor)
+    third, cursor = store.timeline.page(3, cursor=cursor)
+
+    assert first + second + third == [f"e{i:04d}" for i in range(6, -1, -1)]
+    assert cursor is None
+    with pytest.raises(ValueError):
+        store.timeline.page(3, cursor="not a cursor")
+
+def test_histogram_matches_the_column_store(tmp_path):
+    pytest.importorskip("agent_learning")
+    from api.learning_index import LearningColumns, StoreColumns
+
+    store = SQLiteLearningStore(str(tmp_path / "learning.db"))
+    columns = LearningColumns()
+    for i in range(200):
+        learning = Learning(f"e{i}", START + timedelta(hours=7 * i), ["TimeoutError", "KeyError"][i % 2],
+                            ["planner", "coder", "reviewer"][i % 3], i % 4)
+        store.error_learnings[learning.error_id] = learning
+        columns.add(learning)
+    rollup = SimpleNamespace(period="day", bucket_start=datetime(2026, 2, 20), error_type="KeyError",
+                             agent_name="planner", template="t", count=12, prevented=3)
+    store.apply_compaction([("day", rollup.bucket_start, "KeyError", "planner", "t", 12, 3)], [], [])
+    columns.add_rollup(rollup)
+
+    for bucket in ("day", "week"):
+        since, until = datetime(2026, 2, 1), START + timedelta(days=40)
+        assert StoreColumns(store).histogram(since, until, bucket) == columns.histogram(since, until, bucket)
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import ConnectionInfo, LearningWebSocketManager, MessageDeliveryRecord
+from conftest import FakeWebSocket
+
+def delivery_failure(error: str) -> MessageDeliveryRecord:
+    return MessageDeliveryRecord(message_id="m1", client_id="gone", timestamp=datetime.now(),
+                                 success=False, error=error)
+
+def count_captures(manager: LearningWebSocketManager) -> list:
+    calls = []
+    capture_error = manager.learning_system.capture_error
+
+    async def counting(error_context):
+        calls.append(error_context)
+        return await capture_error(error_context)
+
+    manager.learning_system.capture_error = counting
+    return calls
+
+def test_repeated_failure_reuses_its_pattern():
+    async def scenario():
+        manager = LearningWebSocketManager(publish_shared_metrics=False)
+        calls = count_captures(manager)
+        await manager._learn_from_delivery_failures([delivery_failure("timeout after 31 ms")], {"type": "x"})
+        await manager._learn_from_delivery_failures([delivery_failure("timeout after 47 ms")], {"type": "x"})
+        return manager, calls
+
+    manager, calls = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert len(manager.failure_patterns) == 1
+    assert manager.performance_metrics["patterns_reused"] == 1
+
+def test_warm_restart_restores_patterns_and_sampler(tmp_path):
+    state_path = str(tmp_path / "manager-state.db")
+
+    async def first_run():
+        manager = LearningWebSocketManager(state_path=state_path, publish_shared_metrics=False)
+        await manager._learn_from_delivery_failures([delivery_failure("reset by peer 10.0.0.7")], {"type": "x"})
+        manager.failure_sampler.should_capture("message_parsing", ValueError("bad frame 12"))
+        await manager._persist_state()
+        return manager.failure_sampler.get_stats()["fingerprints"]
+
+    async def second_run():
+        manager = LearningWebSocketManager(state_path=state_path, publish_shared_metrics=False)
+        await manager._load_persisted_state()
+        calls = count_captures(manager)
+        await manager._learn_from_delivery_failures([delivery_failure("reset by peer 10.0.0.9")], {"type": "x"})
+        return manager, calls
+
+    fingerprints = asyncio.run(first_run())
+    manager, calls = asyncio.run(second_run())
+
+    assert calls == []
+    assert manager.failure_sampler.get_stats()["fingerprints"] == fingerprints
+    entry = manager.failure_sampler.fingerprints[
+        manager.failure_sampler.fingerprint("message_parsing", ValueError("bad frame 99"))]
+    assert entry["total"] == 1
+
+def connect(manager, client_id, user_id=None):
+    connection = ConnectionInfo(websocket=FakeWebSocket(("203.0.113.5", 40000)), client_id=client_id,
+                                connected_at=datetime.now(), last_ping=datetime.now(), user_id=user_id)
+    manager.connections[client_id] = connection
+    manager._restore_peer_state(connection)
+    return connection
+
+def test_open_breakers_are_only_restored_for_users():
+    manager = LearningWebSocketManager(publish_shared_metrics=False)
+    for client_id, user_id in (("anonymous", None), ("alice-1", "alice")):
+        connect(manager, client_id, user_id)
+        for _ in range(5):
+            manager._update_circuit_breaker(client_id, False)
+        manager._remember_peer(manager.connections.pop(client_id))
+    manager.circuit_breakers.clear()
+
+    # A neighbour behind the same address starts with a closed breaker
+    connect(manager, "neighbour")
+    connect(manager, "alice-2", "alice")
+
+    assert not manager._is_circuit_breaker_open("neighbour")
+    assert manager._is_circuit_breaker_open("alice-2")
+
+def test_stop_persists_state_learned_since_the_last_snapshot(tmp_path):
+    state_path = str(tmp_path / "manager-state.db")
+
+    async def first_run():
+        manager = LearningWebSocketManager("127.0.0.1", 0, state_path=state_path, publish_shared_metrics=False)
+        await manager.start_server()
+        await manager._learn_from_delivery_failures([delivery_failure("reset by peer 10.0.0.7")], {"type": "x"})
+        await manager.stop_server()
+
+    async def second_run():
+        manager = LearningWebSocketManager(state_path=state_path, publish_shared_metrics=False)
+        await manager._load_persisted_state()
+        return manager
+
+    asyncio.run(first_run())
+
+    assert len(asyncio.run(second_run()).failure_patterns) == 1
+
+def test_status_from_another_thread_is_collected_on_the_loop():
+    async def scenario():
+        manager = LearningWebSocketManager("127.0.0.1", 0, publish_shared_metrics=False)
+        await manager.start_server()
+        threads = []
+        lane_distribution = manager._get_lane_distribution
+
+        def recording():
+            threads.append(threading.current_thread())
+            return lane_distribution()
+
+        manager._get_lane_distribution = recording
+        status = await asyncio.get_running_loop().run_in_executor(None, manager.get_manager_status_threadsafe, 2.0)
+        await manager.stop_server()
+        return status, threads
+
+    status, threads = asyncio.run(scenario())
+
+    assert status["server_running"]
+    assert threads == [threading.main_thread()]
@@ -0,0 +1,60 @@
+import time
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import ConnectionInfo, LearningWebSocketManager
+from conftest import FakeWebSocket
+
+def make_manager(**kwargs):
+    manager = LearningWebSocketManager(publish_shared_metrics=False, **kwargs)
+    manager.connections["live"] = ConnectionInfo(websocket=FakeWebSocket(), client_id="live",
+                                                 connected_at=datetime.now(), last_ping=datetime.now())
+    return manager
+
+def add_state(manager, client_id):
+    manager.circuit_breakers[client_id] = {"state": "closed"}
+    manager.message_buffer[client_id].append({"type": "update"})
+    manager.coalesce_buffers[client_id] = [("m1", "update", "{}")]
+
+def test_orphaned_state_is_evicted_once_per_client():
+    manager = make_manager()
+    add_state(manager, "live")
+    add_state(manager, "orphan")
+
+    manager._evict_departed_client_state()
+
+    assert "orphan" not in manager.circuit_breakers and "live" in manager.circuit_breakers
+    assert manager.get_memory_report()["evictions"] == {
+        "circuit_breakers": 1, "message_buffer": 1, "coalesce_buffers": 1, "clients": 1
+    }
+
+def test_departed_clients_expire_after_their_grace_period():
+    manager = make_manager()
+    for client_id in ("old", "recent"):
+        add_state(manager, client_id)
+    now = time.monotonic()
+    manager.departed_clients["old"] = now - manager.departed_client_ttl - 1
+    manager.departed_clients["recent"] = now
+
+    manager._evict_departed_client_state()
+
+    assert list(manager.departed_clients) == ["recent"]
+    assert "recent" in manager.circuit_breakers and "old" not in manager.circuit_breakers
+    assert manager.eviction_counts["clients"] == 1
+
+def test_memory_budget_evicts_all_departed_state():
+    manager = make_manager(memory_budget_bytes=1)
+    for client_id in ("a", "b"):
+        add_state(manager, client_id)
+        manager.departed_clients[client_id] = time.monotonic()
+
+    manager._evict_departed_client_state()
+
+    assert not manager.departed_clients
+    assert set(manager.circuit_breakers) == set()
+    assert manager.eviction_counts["clients"] == 2
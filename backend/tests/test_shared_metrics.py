@@ -0,0 +1,95 @@
+import os
+import struct
+import threading
+import time
+
+import pytest
+
+from api.shared_metrics import SharedMetricsDict, SharedMetricsRegistry, _process_start_time
+
+def make_registry(path, **kwargs):
+    return SharedMetricsRegistry(str(path), max_workers=4, counters=["messages"],
+                                 gauges=["connections"], histograms={"latency_ms": [1, 10]}, **kwargs)
+
+def test_rows_sum_into_cluster_totals(tmp_path):
+    first = make_registry(tmp_path / "metrics")
+    second = make_registry(tmp_path / "metrics")
+    metrics = SharedMetricsDict(first, {"messages": 0, "connections": 0})
+
+    metrics["messages"] += 5
+    metrics["connections"] = 2
+    second.increment("messages", 3)
+    second.observe("latency_ms", 4)
+
+    snapshot = first.snapshot()
+    assert snapshot["workers"] == 2
+    assert snapshot["counters"]["messages"] == 8
+    assert snapshot["gauges"]["connections"] == {"sum": 2.0, "max": 2.0}
+    assert snapshot["histograms"]["latency_ms"]["buckets"] == {"le_1": 0, "le_10": 1, "le_inf": 0}
+
+def test_layouts_use_separate_files(tmp_path):
+    first = make_registry(tmp_path / "metrics")
+    other = SharedMetricsRegistry(str(tmp_path / "metrics"), max_workers=4, counters=["messages", "errors"],
+                                  gauges=[], histograms={})
+
+    assert first.path != other.path
+    first.increment("messages")
+    assert first.snapshot()["counters"]["messages"] == 1
+
+def test_row_of_reused_pid_is_reclaimed(tmp_path):
+    if not _process_start_time(os.getpid()):
+        pytest.skip("process start times are not available on this platform")
+    stale = make_registry(tmp_path / "metrics")
+    stale.increment("messages", 7)
+    # Pretend the row belongs to an earlier process that had the same pid
+    stale._slots[stale._base + 1] -= 1
+
+    fresh = make_registry(tmp_path / "metrics")
+
+    assert fresh.row == stale.row
+    assert fresh.snapshot()["workers"] == 1
+    assert fresh.snapshot()["counters"]["messages"] == 7  # Inherited, so totals stay monotonic
+
+def test_refuses_to_reset_a_file_in_use(tmp_path):
+    live = make_registry(tmp_path / "metrics")
+    # Corrupt the layout hash while a live worker still has the file mapped
+    os.pwrite(live._fd, struct.pack("<Q", 1), 8)
+
+    with pytest.raises(RuntimeError):
+        make_registry(tmp_path / "metrics")
+    assert os.fstat(live._fd).st_size > 0
+
+class YieldingSlots:
+    """Slot view that yields to other threads between a read and the following write"""
+
+    def __init__(self, slots):
+        self.slots = slots
+
+    def __getitem__(self, index):
+        value = self.slots[index]
+        time.sleep(0)
+        return value
+
+    def __setitem__(self, index, value):
+        self.slots[index] = value
+
+def test_concurrent_thread_updates_are_not_lost(tmp_path):
+    registry = make_registry(tmp_path / "metrics")
+    slots = registry._slots
+    registry._slots = YieldingSlots(slots)
+
+    def update():
+        for _ in range(500):
+            registry.increment("messages")
+            registry.observe("latency_ms", 4)
+
+    threads = [threading.Thread(target=update) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    registry._slots = slots
+    snapshot = registry.snapshot()
+    assert snapshot["counters"]["messages"] == 2000
+    assert snapshot["histograms"]["latency_ms"]["count"] == 2000
@@ -0,0 +1,79 @@
+import asyncio
+import concurrent.futures
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import ConnectionInfo, LearningWebSocketManager, SubmissionQueueFull
+from conftest import FakeWebSocket
+
+async def start_manager(**kwargs):
+    manager = LearningWebSocketManager("127.0.0.1", 0, publish_shared_metrics=False, **kwargs)
+    await manager.start_server()
+    for client_id, organization_id in (("a1", "acme"), ("g1", "globex")):
+        manager.connections[client_id] = ConnectionInfo(
+            websocket=FakeWebSocket(), client_id=client_id, connected_at=datetime.now(),
+            last_ping=datetime.now(), organization_id=organization_id
+        )
+        manager._index_connection(manager.connections[client_id])
+    return manager
+
+def in_thread(function, *args):
+    return asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+def test_thread_submissions_run_on_the_loop():
+    async def scenario():
+        manager = await start_manager()
+        future = await in_thread(manager.submit_broadcast, {"type": "notice"}, None, "acme")
+        summary = await in_thread(future.result, 5)
+        await manager.stop_server()
+        return manager, summary
+
+    manager, summary = asyncio.run(scenario())
+
+    assert summary["successful_deliveries"] == 1
+    assert len(manager.connections["a1"].websocket.sent) == 1
+    assert manager.get_submission_backpressure()["processed"] == 1
+
+def test_full_queue_rejects_submissions():
+    async def scenario():
+        manager = await start_manager()
+        manager.submission_queue.maxsize = 1
+        # Submitting from the loop thread keeps the processor from draining in between
+        manager.submit_broadcast({"type": "notice"})
+        with pytest.raises(SubmissionQueueFull):
+            manager.submit_broadcast({"type": "notice"})
+        await manager.stop_server()
+        return manager.get_submission_backpressure()
+
+    stats = asyncio.run(scenario())
+
+    assert (stats["submitted"], stats["rejected"]) == (1, 1)
+
+def test_stop_resolves_running_and_queued_submissions():
+    async def scenario():
+        manager = await start_manager()
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        running = manager.submit_coroutine(hang)
+        await started.wait()
+        queued = manager.submit_coroutine(hang)  # Waits behind the running batch
+        await manager.stop_server()
+        with pytest.raises(RuntimeError):
+            manager.submit_coroutine(hang)
+        return manager, running, queued
+
+    manager, running, queued = asyncio.run(scenario())
+
+    for future in (running, queued):
+        with pytest.raises(concurrent.futures.CancelledError):
+            future.result(0)
+    assert manager.get_submission_backpressure()["cancelled"] == 2
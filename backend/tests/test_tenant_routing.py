@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import LearningWebSocketManager
+
+IDENTITIES = {
+    "alice-token": {"user_id": "alice", "organization_id": "acme"},
+    "bob-token": {"user_id": "bob", "organization_id": "acme"},
+    "carol-token": {"user_id": "carol", "organization_id": "globex"},
+}
+
+async def connect_clients(**kwargs):
+    manager = LearningWebSocketManager("127.0.0.1", 0, publish_shared_metrics=False,
+                                       token_validator=IDENTITIES.get, **kwargs)
+    await manager.start_server()
+    port = manager.server.sockets[0].getsockname()[1]
+
+    clients = {}
+    for name in ("alice", "alice", "bob", "carol"):
+        ws = await websockets.connect(f"ws://127.0.0.1:{port}",
+                                      extra_headers={"Authorization": f"Bearer {name}-token"})
+        welcome = json.loads(await ws.recv())
+        assert welcome["authenticated"]
+        clients.setdefault(name, []).append(ws)
+    return manager, clients
+
+async def received(ws, timeout=0.2):
+    frames = []
+    try:
+        while True:
+            frames.append(json.loads(await asyncio.wait_for(ws.recv(), timeout)))
+    except asyncio.TimeoutError:
+        return frames
+
+async def close_all(manager, clients):
+    for sockets in clients.values():
+        for ws in sockets:
+            await ws.close()
+    await manager.stop_server()
+
+def test_organization_broadcast_reaches_only_its_members():
+    async def scenario():
+        manager, clients = await connect_clients()
+        summary = await manager.broadcast_to_organization("acme", {"type": "notice", "text": "hello acme"})
+        inboxes = {name: [await received(ws) for ws in sockets] for name, sockets in clients.items()}
+        await close_all(manager, clients)
+        return summary, inboxes
+
+    summary, inboxes = asyncio.run(scenario())
+
+    assert summary["total_clients"] == summary["successful_deliveries"] == 3
+    assert all(len(inbox) == 1 and inbox[0]["text"] == "hello acme"
+               for inbox in inboxes["alice"] + inboxes["bob"])
+    assert inboxes["carol"] == [[]]
+
+def test_user_messages_reach_every_connection_of_the_user():
+    async def scenario():
+        manager, clients = await connect_clients()
+        summary = await manager.send_to_user("alice", {"type": "notice"})
+        missing = await manager.send_to_user("dave", {"type": "notice"})
+        inboxes = {name: [len(await received(ws)) for ws in sockets] for name, sockets in clients.items()}
+        await close_all(manager, clients)
+        return summary, missing, inboxes
+
+    summary, missing, inboxes = asyncio.run(scenario())
+
+    assert summary["successful_deliveries"] == 2
+    assert missing["total_clients"] == 0
+    assert inboxes == {"alice": [1, 1], "bob": [0], "carol": [0]}
+
+def test_indexes_forget_disconnected_clients():
+    async def scenario():
+        manager, clients = await connect_clients()
+        for ws in clients.pop("carol"):
+            await ws.close()
+        await asyncio.sleep(0.1)
+        indexes = ({org: len(ids) for org, ids in manager.organization_clients.items()},
+                   {user: len(ids) for user, ids in manager.user_clients.items()})
+        await close_all(manager, clients)
+        return indexes
+
+    organizations, users = asyncio.run(scenario())
+
+    assert organizations == {"acme": 3}
+    assert users == {"alice": 2, "bob": 1}
+
+def test_required_authentication_rejects_unknown_tokens():
+    async def scenario():
+        manager = LearningWebSocketManager("127.0.0.1", 0, publish_shared_metrics=False,
+                                           token_validator=IDENTITIES.get, require_authentication=True)
+        await manager.start_server()
+        port = manager.server.sockets[0].getsockname()[1]
+        ws = await websockets.connect(f"ws://127.0.0.1:{port}/?token=forged")
+        with pytest.raises(websockets.exceptions.ConnectionClosed):
+            await ws.recv()
+        code = ws.close_code
+        connected = len(manager.connections)
+        await manager.stop_server()
+        return code, connected
+
+    assert asyncio.run(scenario()) == (4001, 0)
@@ -0,0 +1,64 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("agent_learning")
+pytest.importorskip("monitoring")
+
+from api.websocket_manager import BroadcastTracer, ConnectionInfo, LearningWebSocketManager
+from conftest import FakeWebSocket
+
+def make_manager(sample_rate):
+    manager = LearningWebSocketManager(publish_shared_metrics=False, trace_sample_rate=sample_rate)
+    manager.connections["client-0"] = ConnectionInfo(websocket=FakeWebSocket(), client_id="client-0",
+                                                     connected_at=datetime.now(), last_ping=datetime.now())
+    return manager
+
+def test_unsampled_broadcasts_record_nothing():
+    manager = make_manager(0.0)
+
+    asyncio.run(manager.broadcast_with_learning({"type": "update"}))
+
+    assert manager.tracer.get_stats() == {"sample_rate": 0.0, "traces_started": 0, "buffered_spans": 0}
+
+def test_sampled_broadcast_spans_every_stage_through_the_ack():
+    manager = make_manager(1.0)
+
+    async def scenario():
+        summary = await manager.broadcast_with_learning({"type": "update"})
+        await manager._handle_message("client-0", json.dumps({"type": "ack", "message_id": summary["message_id"]}))
+
+    asyncio.run(scenario())
+
+    spans = list(manager.tracer.spans)
+    root = next(span for span in spans if span["parent_span_id"] is None)
+    assert root["name"] == "broadcast" and root["attributes"]["successful_deliveries"] == 1
+    children = [span["name"] for span in spans if span["parent_span_id"] == root["span_id"]]
+    assert {"optimize", "serialize", "socket_write", "ack_wait"} <= set(children)
+    assert all(span["trace_id"] == root["trace_id"] and span["end_ns"] >= span["start_ns"] for span in spans)
+
+def test_ring_buffer_keeps_the_newest_spans():
+    tracer = BroadcastTracer(sample_rate=1.0, max_spans=3)
+    for i in range(5):
+        tracer.finish_trace(tracer.start_trace("broadcast", index=i))
+
+    assert [span["attributes"]["index"] for span in tracer.spans] == [2, 3, 4]
+    assert tracer.get_stats()["traces_started"] == 5
+
+def test_otlp_export_links_children_to_their_root(tmp_path):
+    tracer = BroadcastTracer(sample_rate=1.0)
+    trace = tracer.start_trace("broadcast", clients=2)
+    with tracer.span(trace, "serialize", compressed=False):
+        pass
+    tracer.finish_trace(trace, ratio=0.5)
+
+    assert tracer.export_otlp(str(tmp_path / "spans.otlp.json")) == 2
+    exported = json.loads((tmp_path / "spans.otlp.json").read_text())
+    child, root = exported["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert child["parentSpanId"] == root["spanId"] and "parentSpanId" not in root
+    assert {"key": "compressed", "value": {"boolValue": False}} in child["attributes"]
+    assert {"key": "clients", "value": {"intValue": "2"}} in root["attributes"]
+    assert {"key": "ratio", "value": {"doubleValue": 0.5}} in root["attributes"]
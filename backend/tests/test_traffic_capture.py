@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("websockets")
+
+from api.traffic_capture import (
+    TrafficCapture, DIRECTION_INBOUND, DIRECTION_OUTBOUND, read_capture, summarize_capture
+)
+
+def write_capture(path: str, clients: int = 3, broadcasts: int = 5):
+    capture = TrafficCapture(path)
+    for client in range(clients):
+        capture.record(DIRECTION_OUTBOUND, f"client-{client}", "welcome", 250)
+    for sequence in range(broadcasts):
+        capture.record(DIRECTION_INBOUND, "client-0", "ping", 20)
+        for client in range(clients):
+            capture.record(DIRECTION_OUTBOUND, f"client-{client}", "update", 300 + sequence)
+    capture.close()
+
+def test_capture_round_trip_anonymizes_clients(tmp_path):
+    path = str(tmp_path / "traffic.bin")
+    write_capture(path)
+
+    frames = list(read_capture(path))
+
+    assert len(frames) == 3 + 5 * 4
+    assert {frame.msg_type for frame in frames} == {"welcome", "ping", "update"}
+    assert len({frame.client for frame in frames}) == 3
+    assert all(isinstance(frame.client, int) for frame in frames)
+
+    summary = summarize_capture(path)
+    assert summary["clients"] == 3
+    assert summary["mix"]["out:update"] == {"frames": 15, "bytes": 3 * (300 + 301 + 302 + 303 + 304)}
+    assert summary["mix"]["in:ping"]["frames"] == 5
+
+def test_rejects_files_that_are_not_captures(tmp_path):
+    path = tmp_path / "not-a-capture.bin"
+    path.write_bytes(b"hello")
+
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+
+def test_replay_delivers_every_captured_broadcast(tmp_path):
+    pytest.importorskip("agent_learning")
+    pytest.importorskip("monitoring")
+    from api.traffic_capture import replay_capture
+
+    path = str(tmp_path / "traffic.bin")
+    write_capture(path)
+
+    report = asyncio.run(replay_capture(path, speed=0))
+
+    assert report["clients"] == 3
+    assert report["frames_sent"] == 5 + 15  # pings and grouped broadcasts
+    assert report["frames_received"] >= 15
+    assert report["latency_p50_ms"] is not None